@@ -0,0 +1,5 @@
+# Copyright 2021, Joseph P McAnulty
+
+# Benchmarks for httpglue. These are not part of the httpglue
+# distribution (only httpglue.py is); they are for comparing changes to
+# the framework objectively. See DEVELOPMENT.md for how to run them.
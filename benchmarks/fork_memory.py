@@ -0,0 +1,190 @@
+# Copyright 2021, Joseph P McAnulty
+
+# Pre-fork memory benchmark.
+#
+# Builds an app from a synthetic route table (see route_tables.py) in a
+# master process, forks workers from it the way a pre-forking wsgi
+# server does, has each worker handle a workload and run a full garbage
+# collection, and reports how much memory each worker ended up not
+# sharing with the others (its unique set size, or USS). It compares
+# apps left as they are ('none'), frozen ('freeze') and prepared with
+# WsgiApp.prepare_for_fork ('prepare_for_fork'). Run it from the repo
+# root with
+#
+#   PYTHONPATH=. python -m benchmarks.fork_memory --output report.json
+#
+# It needs os.fork and /proc/<pid>/smaps_rollup, so it only runs on
+# linux.
+
+import argparse
+import gc
+import json
+import os
+import sys
+
+from httpglue import Request
+
+from benchmarks.route_tables import ROUTE_TABLE_SHAPES
+from benchmarks.route_tables import make_workload
+from benchmarks.routing import make_app
+from benchmarks.routing import make_report
+
+
+MODES = ['none', 'freeze', 'prepare_for_fork']
+
+
+def supported():
+    return hasattr(os, 'fork') and os.path.exists('/proc/self/smaps_rollup')
+
+
+def memory_kb():
+    """
+    Return the rss and the uss (private clean plus private dirty
+    memory) of this process in kB, from /proc/self/smaps_rollup.
+    """
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            name, _, value = line.partition(':')
+            if value.strip().endswith('kB'):
+                fields[name] = int(value.split()[0])
+    return {
+        'rss_kb': fields['Rss'],
+        'uss_kb': fields['Private_Clean'] + fields['Private_Dirty']
+    }
+
+
+def _in_child(f):
+    # run f in a forked child and return what it returned, which must
+    # be json serializable
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        status = 0
+        try:
+            with os.fdopen(write_fd, 'w') as out:
+                json.dump(f(), out)
+        except BaseException:
+            status = 1
+        finally:
+            os._exit(status)
+
+    os.close(write_fd)
+    with os.fdopen(read_fd) as results:
+        output = results.read()
+    _, status = os.waitpid(pid, 0)
+    if status != 0 or not output:
+        raise RuntimeError('a benchmark process failed')
+    return json.loads(output)
+
+
+def _serve(app, workload):
+    # what each worker does: handle the workload, then collect garbage
+    # the way a long running worker eventually does
+    for method, path, headers in workload:
+        app.handle_request(Request(method, path, dict(headers), b''))
+    gc.collect()
+    return memory_kb()
+
+
+def _master(shape, size, n_requests, n_workers, mode):
+    routes, workload = make_workload(shape, size, n_requests)
+    app = make_app(routes, 'linear')
+    if mode == 'freeze':
+        app.freeze()
+    elif mode == 'prepare_for_fork':
+        app.prepare_for_fork()
+
+    master_memory = memory_kb()
+    workers = [
+        _in_child(lambda: _serve(app, workload))
+        for _ in range(n_workers)
+    ]
+    return {
+        'master_rss_kb': master_memory['rss_kb'],
+        'worker_uss_kb': [worker['uss_kb'] for worker in workers]
+    }
+
+
+def run(shapes, sizes, modes, n_requests, n_workers):
+    """
+    Measure every combination of shape, size and mode, each in a fresh
+    master process, and return the results as a list of dicts.
+    """
+    results = []
+    for shape in shapes:
+        for size in sizes:
+            for mode in modes:
+                measured = _in_child(
+                    lambda: _master(shape, size, n_requests, n_workers, mode))
+                worker_uss_kb = measured['worker_uss_kb']
+                results.append({
+                    'shape': shape,
+                    'size': size,
+                    'mode': mode,
+                    'master_rss_kb': measured['master_rss_kb'],
+                    'mean_worker_uss_kb': sum(worker_uss_kb) / len(
+                        worker_uss_kb),
+                    'max_worker_uss_kb': max(worker_uss_kb)
+                })
+    return results
+
+
+def format_table(results):
+    lines = ['%-8s %6s  %-16s %12s %12s' % (
+        'shape', 'size', 'mode', 'master rss', 'worker uss')]
+    for result in results:
+        lines.append('%-8s %6d  %-16s %10dkB %10dkB' % (
+            result['shape'],
+            result['size'],
+            result['mode'],
+            result['master_rss_kb'],
+            result['mean_worker_uss_kb']
+        ))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.fork_memory',
+        description='measure the memory pre-forked httpglue workers '
+                    'stop sharing')
+    parser.add_argument(
+        '--shapes', nargs='+', choices=sorted(ROUTE_TABLE_SHAPES),
+        default=['mixed'])
+    parser.add_argument(
+        '--sizes', nargs='+', type=int, default=[1000, 10000])
+    parser.add_argument(
+        '--modes', nargs='+', choices=MODES, default=MODES)
+    parser.add_argument(
+        '--requests', type=int, default=1000,
+        help='requests each worker handles (default 1000)')
+    parser.add_argument(
+        '--workers', type=int, default=4,
+        help='workers forked from each master (default 4)')
+    parser.add_argument(
+        '--output', metavar='PATH',
+        help='write the json report here rather than to stdout')
+    args = parser.parse_args(argv)
+
+    if not supported():
+        parser.exit(1, 'this benchmark needs os.fork and '
+                       '/proc/self/smaps_rollup (linux)\n')
+
+    results = run(
+        args.shapes, args.sizes, args.modes, args.requests, args.workers)
+    report = make_report(results, vars(args))
+    report['benchmark'] = 'fork_memory'
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(format_table(results))
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
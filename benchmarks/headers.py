@@ -0,0 +1,207 @@
+# Copyright 2021, Joseph P McAnulty
+
+# Request header benchmark.
+#
+# Measures what building the headers of a request costs, per request,
+# for requests with a given number of headers: making a Headers from a
+# dict the checked way ('headers_from_dict') and the trusted way the
+# framework itself uses ('headers_from_trusted'), and turning a whole
+# wsgi environ into a Request and a Response through WsgiApp.__call__,
+# with a request handler that reads no headers ('wsgi_call') and one
+# that reads two, like most do ('wsgi_call_reading_2'). Run it from
+# the repo root with
+#
+#   PYTHONPATH=. python -m benchmarks.headers --output report.json
+#
+# and on two versions of httpglue to compare them.
+
+import argparse
+import io
+import json
+import sys
+import time
+
+from httpglue import Headers
+from httpglue import Response
+
+from benchmarks.routing import make_app
+from benchmarks.routing import make_report
+
+
+DEFAULT_HEADER_COUNTS = [10, 30]
+
+# the headers a browser sends, then made up ones to make up the numbers
+REALISTIC_HEADERS = [
+    ('Host', 'api.example.com'),
+    ('User-Agent', 'Mozilla/5.0 (X11; Linux x86_64; rv:128.0) '
+                   'Gecko/20100101 Firefox/128.0'),
+    ('Accept', 'text/html,application/xhtml+xml,application/xml;q=0.9,'
+               '*/*;q=0.8'),
+    ('Accept-Language', 'en-US,en;q=0.5'),
+    ('Accept-Encoding', 'gzip, deflate, br, zstd'),
+    ('Connection', 'keep-alive'),
+    ('Cookie', 'session=8c4f1e2d9b7a6f3e; theme=dark; consent=yes'),
+    ('Upgrade-Insecure-Requests', '1'),
+    ('Sec-Fetch-Dest', 'document'),
+    ('Sec-Fetch-Mode', 'navigate'),
+    ('Sec-Fetch-Site', 'none'),
+    ('Sec-Fetch-User', '?1'),
+    ('Priority', 'u=0, i'),
+    ('Cache-Control', 'max-age=0'),
+    ('X-Forwarded-For', '203.0.113.7, 198.51.100.2'),
+    ('X-Forwarded-Proto', 'https'),
+    ('X-Forwarded-Host', 'api.example.com'),
+    ('X-Request-Id', 'f2a9c1d0-7b3e-4c55-9a1f-0e6d2b8c4a71'),
+    ('Traceparent',
+     '00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01'),
+    ('Referer', 'https://www.example.com/widgets?page=2'),
+]
+
+
+def make_headers(count):
+    """
+    Return a list of count (name, value) pairs of request headers.
+    """
+    headers = REALISTIC_HEADERS[:count]
+    headers += [
+        (f'X-Custom-Header-{i}', f'custom value {i}')
+        for i in range(count - len(headers))
+    ]
+    return headers
+
+
+def make_environ(headers):
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': '/resource0/items',
+        'QUERY_STRING': '',
+        'SERVER_NAME': 'api.example.com',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'wsgi.url_scheme': 'http',
+    }
+    for name, value in headers:
+        environ['HTTP_' + name.upper().replace('-', '_')] = value
+    return environ
+
+
+def _start_response(status, headers):
+    pass
+
+
+def make_targets(headers):
+    """
+    Return a dict of the benchmark's targets, each a function of no
+    arguments doing what one request would, for requests with headers.
+    """
+    headers_dict = dict(headers)
+    environ = make_environ(headers)
+    app = make_app([(['GET'], '/resource0/items', None)], 'linear')
+    app.freeze()
+
+    reading_app = make_app([], 'linear')
+
+    def reading_req_handler(app, req):
+        req.headers.get('Host')
+        req.headers.get('Authorization')
+        return Response(200, {}, b'')
+
+    reading_app.register_endpoint(
+        ['GET'], '/resource0/items', reading_req_handler)
+    reading_app.freeze()
+
+    def headers_from_dict():
+        Headers(headers_dict)
+
+    def headers_from_trusted():
+        Headers._from_trusted(list(headers))
+
+    def wsgi_call():
+        environ['wsgi.input'] = io.BytesIO(b'')
+        app(environ, _start_response)
+
+    def wsgi_call_reading_2():
+        environ['wsgi.input'] = io.BytesIO(b'')
+        reading_app(environ, _start_response)
+
+    return {
+        'headers_from_dict': headers_from_dict,
+        'headers_from_trusted': headers_from_trusted,
+        'wsgi_call': wsgi_call,
+        'wsgi_call_reading_2': wsgi_call_reading_2
+    }
+
+
+def measure(f, n_requests, repeat):
+    """
+    Call f n_requests times, repeat times over, and return the fastest
+    pass's time per call in microseconds.
+    """
+    f()
+    fastest = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(n_requests):
+            f()
+        elapsed = time.perf_counter() - start
+        fastest = elapsed if fastest is None else min(fastest, elapsed)
+    return fastest / n_requests * 1e6
+
+
+def run(header_counts, n_requests, repeat):
+    """
+    Measure every target for every header count, and return the
+    results as a list of dicts.
+    """
+    results = []
+    for count in header_counts:
+        for target, f in make_targets(make_headers(count)).items():
+            results.append({
+                'headers': count,
+                'target': target,
+                'us_per_request': measure(f, n_requests, repeat)
+            })
+    return results
+
+
+def format_table(results):
+    lines = ['%7s  %-20s %10s' % ('headers', 'target', 'us/request')]
+    for result in results:
+        lines.append('%7d  %-20s %10.2f' % (
+            result['headers'], result['target'], result['us_per_request']))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.headers',
+        description='benchmark building httpglue request headers')
+    parser.add_argument(
+        '--headers', nargs='+', type=int, default=DEFAULT_HEADER_COUNTS,
+        help='header counts to measure (default 10 30)')
+    parser.add_argument(
+        '--requests', type=int, default=10000,
+        help='requests in each measured pass (default 10000)')
+    parser.add_argument(
+        '--repeat', type=int, default=5,
+        help='measured passes, the fastest is kept (default 5)')
+    parser.add_argument(
+        '--output', metavar='PATH',
+        help='write the json report here rather than to stdout')
+    args = parser.parse_args(argv)
+
+    results = run(args.headers, args.requests, args.repeat)
+    report = make_report(results, vars(args))
+    report['benchmark'] = 'headers'
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(format_table(results))
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
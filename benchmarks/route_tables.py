@@ -0,0 +1,162 @@
+# Copyright 2021, Joseph P McAnulty
+
+# Generators for synthetic route tables of a given shape and size, and
+# for the requests to route through them.
+#
+# Each generator takes a number of routes and returns a list of
+# (method_spec, path_spec, pred) tuples ready for
+# WsgiApp.register_endpoint, along with a function that makes a
+# (method, path, headers) request aimed at the route with a given index.
+
+import random
+
+from httpglue import PathTemplate
+
+
+def literal_routes(size):
+    # plain paths, like most health checks and collection endpoints
+    routes = [
+        (['GET'], f'/resource{i}/items', None)
+        for i in range(size)
+    ]
+
+    def make_request(i):
+        return 'GET', f'/resource{i}/items', {}
+
+    return routes, make_request
+
+
+def regex_routes(size):
+    # a path variable in every path_spec
+    routes = [
+        (['GET'], fr'/resource{i}/items/(?P<id>\d+)', None)
+        for i in range(size)
+    ]
+
+    def make_request(i):
+        return 'GET', f'/resource{i}/items/{i * 7}', {}
+
+    return routes, make_request
+
+
+def mixed_routes(size):
+    # literal, regex and PathTemplate path_specs taking turns, with a
+    # few method_specs shared between paths
+    routes = []
+    for i in range(size):
+        kind = i % 3
+        if kind == 0:
+            path_spec = f'/resource{i}'
+        elif kind == 1:
+            path_spec = fr'/resource{i}/(?P<id>\d+)'
+        else:
+            path_spec = PathTemplate(f'/resource{i}/{{id:int}}/parts/{{part}}')
+        routes.append((['GET', 'POST'] if i % 2 else ['GET'], path_spec, None))
+
+    def make_request(i):
+        kind = i % 3
+        if kind == 0:
+            return 'GET', f'/resource{i}', {}
+        elif kind == 1:
+            return 'GET', f'/resource{i}/{i}', {}
+        else:
+            return 'GET', f'/resource{i}/{i}/parts/gear', {}
+
+    return routes, make_request
+
+
+# how many endpoints share each path_spec in pred_routes
+PRED_VARIANTS = 4
+
+
+def _make_variant_pred(variant):
+    def pred(req):
+        return req.headers.get('X-Variant') == variant
+    pred.__name__ = f'is_variant_{variant}'
+    return pred
+
+
+def pred_routes(size):
+    # groups of endpoints that share a path_spec and are told apart by
+    # preds looking at a header, like versioned or content negotiated
+    # apis. The last variant of each group is the one requests want,
+    # so every other pred in the group runs first
+    preds = [_make_variant_pred(str(v)) for v in range(PRED_VARIANTS)]
+    routes = [
+        (
+            ['GET'],
+            fr'/resource{i // PRED_VARIANTS}/(?P<id>\d+)',
+            preds[i % PRED_VARIANTS]
+        )
+        for i in range(size)
+    ]
+
+    def make_request(i):
+        group = i // PRED_VARIANTS
+        variant = min(PRED_VARIANTS, size - group * PRED_VARIANTS) - 1
+        return (
+            'GET',
+            f'/resource{group}/{i}',
+            {'X-Variant': str(variant)}
+        )
+
+    return routes, make_request
+
+
+def deep_routes(size):
+    # long paths that only differ near their ends, so every path_spec
+    # shares a long prefix with every other
+    routes = [
+        (
+            ['GET'],
+            PathTemplate(
+                '/api/v1/orgs/{org}/teams/{team:int}/projects/{project}'
+                f'/resources/resource{i}/{{id:int}}'
+            ) if i % 2 else
+            fr'/api/v1/orgs/(?P<org>[^/]+)/teams/(?P<team>\d+)/projects'
+            fr'/(?P<project>[^/]+)/resources/resource{i}/(?P<id>\d+)',
+            None
+        )
+        for i in range(size)
+    ]
+
+    def make_request(i):
+        return (
+            'GET',
+            f'/api/v1/orgs/acme/teams/{i}/projects/glue'
+            f'/resources/resource{i}/{i}',
+            {}
+        )
+
+    return routes, make_request
+
+
+ROUTE_TABLE_SHAPES = {
+    'literal': literal_routes,
+    'regex': regex_routes,
+    'mixed': mixed_routes,
+    'pred': pred_routes,
+    'deep': deep_routes
+}
+
+
+def make_workload(shape, size, n_requests, miss_ratio=0.1, seed=0):
+    """
+    Make a route table of the given shape and size, and a list of
+    n_requests (method, path, headers) requests for it.
+
+    Requests are spread evenly over the route table at random, except
+    that about miss_ratio of them are for paths no route matches. The
+    same arguments always make the same workload.
+    """
+    routes, make_request = ROUTE_TABLE_SHAPES[shape](size)
+    rng = random.Random(seed)
+
+    requests = []
+    for _ in range(n_requests):
+        if rng.random() < miss_ratio:
+            requests.append(('GET', f'/missing/{rng.randrange(size)}', {}))
+        else:
+            requests.append(make_request(rng.randrange(size)))
+
+    return routes, requests
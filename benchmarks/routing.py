@@ -0,0 +1,254 @@
+# Copyright 2021, Joseph P McAnulty
+
+# Router scaling benchmark.
+#
+# Routes synthetic workloads (see route_tables.py) through
+# WsgiApp._choose_endpoint and WsgiApp.handle_request with every router
+# engine, at several route table sizes, and reports the p50 and p99
+# latency and the throughput of each. Run it from the repo root with
+#
+#   PYTHONPATH=. python -m benchmarks.routing --output report.json
+#
+# The json report is meant for comparing two versions of httpglue
+# side by side; the scaling curves printed to stdout are for people.
+
+import argparse
+import json
+import logging
+import math
+import platform
+import sys
+import time
+
+import httpglue
+from httpglue import NoMatchingMethodError
+from httpglue import NoMatchingPathError
+from httpglue import NoMatchingPredError
+from httpglue import Request
+from httpglue import Response
+from httpglue import WsgiApp
+
+from benchmarks.route_tables import ROUTE_TABLE_SHAPES
+from benchmarks.route_tables import make_workload
+
+
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+
+ROUTING_ERRORS = (NoMatchingPathError, NoMatchingMethodError,
+                  NoMatchingPredError)
+
+TARGETS = ['choose_endpoint', 'handle_request']
+
+
+def make_app(routes, router_engine, **app_options):
+    logger = logging.getLogger('httpglue.benchmarks')
+    logger.addHandler(logging.NullHandler())
+    logger.setLevel(logging.WARNING)
+    logger.propagate = False
+
+    app = WsgiApp(
+        logger=logger,
+        default_fallback_err_res=Response(500, {}, b''),
+        router_engine=router_engine,
+        **app_options
+    )
+
+    def req_handler(app, req):
+        return Response(200, {}, b'')
+
+    def routing_err_handler(app, e, req):
+        return Response(404, {}, b'')
+
+    for method_spec, path_spec, pred in routes:
+        app.register_endpoint(method_spec, path_spec, req_handler, pred=pred)
+    app.register_err_handler(list(ROUTING_ERRORS), routing_err_handler)
+
+    return app
+
+
+def _route_once(app, req):
+    try:
+        app._choose_endpoint(req)
+    except ROUTING_ERRORS:
+        pass
+
+
+def _handle_once(app, req):
+    app.handle_request(req)
+
+
+def _percentile(sorted_samples, fraction):
+    index = min(len(sorted_samples) - 1,
+                int(math.ceil(fraction * len(sorted_samples))) - 1)
+    return sorted_samples[max(index, 0)]
+
+
+def measure(app, reqs, target, repeat):
+    """
+    Run every request in reqs through the target (one of TARGETS) of
+    app, repeat times over, and return a dict of the p50 and p99
+    latency in microseconds and the throughput in requests per second.
+
+    The first pass over reqs is a warm up and is not measured, so that
+    lazily built routing state is not counted against the first few
+    requests.
+    """
+    run_once = _route_once if target == 'choose_endpoint' else _handle_once
+
+    for req in reqs:
+        run_once(app, req)
+
+    # latency, timing each request on its own
+    perf_counter_ns = time.perf_counter_ns
+    samples = []
+    for _ in range(repeat):
+        for req in reqs:
+            start = perf_counter_ns()
+            run_once(app, req)
+            samples.append(perf_counter_ns() - start)
+    samples.sort()
+
+    # throughput, timing whole passes so the timer isn't counted
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for req in reqs:
+            run_once(app, req)
+    elapsed = time.perf_counter() - start
+
+    return {
+        'p50_us': _percentile(samples, 0.50) / 1000,
+        'p99_us': _percentile(samples, 0.99) / 1000,
+        'throughput_rps': (len(reqs) * repeat) / elapsed if elapsed else None
+    }
+
+
+def run(shapes, sizes, engines, n_requests, repeat, freeze=False):
+    """
+    Benchmark every combination of shape, size and engine, and return
+    the results as a list of dicts, one per combination and target.
+    Apps are frozen before being measured if freeze is True.
+    """
+    results = []
+    for shape in shapes:
+        for size in sizes:
+            routes, workload = make_workload(shape, size, n_requests)
+            for engine in engines:
+                app = make_app(routes, engine)
+                if freeze:
+                    app.freeze()
+                for target in TARGETS:
+                    # Requests are made afresh for each target, since
+                    # handle_request may mutate them
+                    reqs = [
+                        Request(method, path, headers, b'')
+                        for method, path, headers in workload
+                    ]
+                    result = {
+                        'shape': shape,
+                        'size': size,
+                        'engine': engine,
+                        'target': target
+                    }
+                    result.update(measure(app, reqs, target, repeat))
+                    results.append(result)
+    return results
+
+
+def make_report(results, args):
+    return {
+        'benchmark': 'routing',
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'httpglue': getattr(httpglue, '__version__', None),
+        'settings': args,
+        'results': results
+    }
+
+
+def format_scaling_curves(results, width=40):
+    """
+    Draw the p50 latency of each engine against route table size as
+    text, one chart per shape and target. Bars are on a log scale, so
+    that 10 routes and 10k routes fit on the same chart; a bar twice as
+    long is ten times as slow.
+    """
+    if not results:
+        return ''
+
+    slowest = max(result['p50_us'] for result in results)
+    fastest = min(result['p50_us'] for result in results)
+    low = math.log10(max(fastest, 0.01)) - 0.5
+    high = max(math.log10(max(slowest, 0.01)), low + 1)
+
+    def bar(p50_us):
+        scaled = (math.log10(max(p50_us, 0.01)) - low) / (high - low)
+        return '#' * max(1, int(round(scaled * width)))
+
+    lines = []
+    charts = []
+    for result in results:
+        chart = (result['shape'], result['target'])
+        if chart not in charts:
+            charts.append(chart)
+
+    for shape, target in charts:
+        lines.append(f'{shape} routes, {target} (p50 latency)')
+        for result in results:
+            if (result['shape'], result['target']) != (shape, target):
+                continue
+            lines.append(
+                '  %-15s %6d  %10.2fus  %s' % (
+                    result['engine'],
+                    result['size'],
+                    result['p50_us'],
+                    bar(result['p50_us'])
+                )
+            )
+        lines.append('')
+
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.routing',
+        description='benchmark httpglue routing as route tables grow')
+    parser.add_argument(
+        '--shapes', nargs='+', choices=sorted(ROUTE_TABLE_SHAPES),
+        default=list(ROUTE_TABLE_SHAPES))
+    parser.add_argument(
+        '--sizes', nargs='+', type=int, default=DEFAULT_SIZES)
+    parser.add_argument(
+        '--engines', nargs='+', choices=sorted(httpglue._ROUTER_ENGINES),
+        default=sorted(httpglue._ROUTER_ENGINES))
+    parser.add_argument(
+        '--requests', type=int, default=1000,
+        help='distinct requests in each workload (default 1000)')
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help='measured passes over each workload (default 3)')
+    parser.add_argument(
+        '--freeze', action='store_true',
+        help='freeze each app before measuring it')
+    parser.add_argument(
+        '--output', metavar='PATH',
+        help='write the json report here rather than to stdout')
+    args = parser.parse_args(argv)
+
+    results = run(
+        args.shapes, args.sizes, args.engines, args.requests, args.repeat,
+        freeze=args.freeze)
+    report = make_report(results, vars(args))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(format_scaling_curves(results))
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -6,6 +6,7 @@ import psycopg
 import psycopg_pool
 from httpglue import Request, Response
 from httpglue import WsgiApp
+from httpglue import PathTemplate
 from httpglue import NoMatchingPathError, NoMatchingMethodError
 
 from handlers import widget_handlers
@@ -65,15 +66,15 @@ def make_app():
         widgets_handlers.del_widgets
     )
     app.register_endpoint(
-        ['GET'], r'/widgets/(?P<id>\d*)',
+        ['GET'], PathTemplate('/widgets/{id:int}'),
         widget_handlers.get_widget
     )
     app.register_endpoint(
-        ['PUT'], r'/widgets/(?P<id>\d*)',
+        ['PUT'], PathTemplate('/widgets/{id:int}'),
         widget_handlers.put_widget
     )
     app.register_endpoint(
-        ['DELETE'], r'/widgets/(?P<id>\d*)',
+        ['DELETE'], PathTemplate('/widgets/{id:int}'),
         widget_handlers.del_widget
     )
 
@@ -99,7 +100,7 @@ def make_app():
         handle_unexpected_errors
     )
 
-    return app
+    return app.freeze()
 
 
 def handle_no_matching_path(app, e, req):
@@ -121,7 +122,7 @@ def handle_no_matching_method(app, e, req):
         status=405,
         headers={
             'Content-Type': 'application/json',
-            'Allow': ','.join(e.allowed_methods)
+            'Allow': e.allow_header
         },
         data={
             "error": "method not allowed",
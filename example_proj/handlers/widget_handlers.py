@@ -6,7 +6,7 @@ from models.widgets import Widget
 def get_widget(app, req):
     app.basic_auth.authenticate(req)
 
-    widget_id = int(req.path_vars['id'])
+    widget_id = req.path_vars['id']
     try:
         widget = app.widget_store.get_widget(widget_id)
     except LookupError:
@@ -40,7 +40,7 @@ def put_widget(app, req):
     )
 
     widget = Widget.fromdict(widget_data)
-    if int(req.path_vars['id']) != widget.id:
+    if req.path_vars['id'] != widget.id:
         return app.content_types.create_response(
             status=400,
             headers={
@@ -65,7 +65,7 @@ def put_widget(app, req):
 def del_widget(app, req):
     app.basic_auth.authenticate(req)
 
-    widget_id = int(req.path_vars['id'])
+    widget_id = req.path_vars['id']
     try:
         app.widget_store.del_widget(widget_id)
     except LookupError:
@@ -1,8 +1,13 @@
 # Copyright 2021 Joseph P McAnulty. All rights reserved.
+import bisect as _bisect
+import collections as _collections
 import datetime as _datetime
-import inspect as _inspect
-import logging as _logging
+import gc as _gc
+import heapq as _heapq
 import re as _re
+import sys as _sys
+import threading as _threading
+import time as _time
 
 # TODO
 # 2. finish up unit tests, add default reason phrases
@@ -34,6 +39,80 @@ _VALID_RFC_2616_TOKEN_CHARS = \
 _VALID_RFC_2616_TEXT_CHARS = \
     (_ASCII_CHARS - _CTL_CHARS) | {' ', '\t'}
 
+
+def _invalid_char_finder(valid_chars):
+    # the search method of a regex finding the first char that isn't
+    # one of valid_chars. It checks a str several times faster than
+    # taking a set difference, and allocates nothing when the str is
+    # valid. Runs of consecutive chars become ranges, like [^\t -~]
+    codes = sorted(ord(char) for char in valid_chars)
+    runs = []
+    for code in codes:
+        if runs and runs[-1][1] == code - 1:
+            runs[-1][1] = code
+        else:
+            runs.append([code, code])
+    return _re.compile('[^%s]' % ''.join(
+        _re.escape(chr(start)) if start == end
+        else '%s-%s' % (_re.escape(chr(start)), _re.escape(chr(end)))
+        for start, end in runs
+    )).search
+
+
+_find_invalid_token_char = _invalid_char_finder(_VALID_RFC_2616_TOKEN_CHARS)
+_find_invalid_text_char = _invalid_char_finder(_VALID_RFC_2616_TEXT_CHARS)
+
+# wsgi servers refuse response header values with these in them
+_WSGI_FORBIDDEN_CHARS = '\t\r\n\0\a\b\v\f'
+_find_wsgi_forbidden_char = _re.compile(
+    '[%s]' % _re.escape(_WSGI_FORBIDDEN_CHARS)).search
+
+# a path_spec with none of these chars in it is a plain literal
+# path, and can be routed with a dict lookup instead of a regex
+_REGEX_META_CHARS = frozenset('.^$*+?{}[]\\|()')
+
+# the converters usable in PathTemplate placeholders, as
+# (regex a path segment must fully match, callable applied to it)
+_PATH_TEMPLATE_CONVERTERS = {
+    'str': ('[^/]+', str),
+    'int': ('[0-9]+', int)
+}
+
+_ERR_HANDLER_CACHE_MAXSIZE = 256
+
+# bounds how many distinct sets of matching path_specs a _DispatchPlan
+# remembers an _AllowAnswer for; single path_specs don't count
+_ALLOW_ANSWER_CACHE_MAXSIZE = 256
+
+# the policies for path_specs outside the subset _linear_time_pattern
+# accepts (see WsgiApp's path_spec_policy)
+_PATH_SPEC_POLICIES = ('permissive', 'warn', 'strict')
+
+# possessive quantifiers (like '[0-9]++') are in the re module from 3.11
+_HAS_POSSESSIVE_QUANTIFIERS = _sys.version_info >= (3, 11)
+
+# the ascii chars the escapes allowed by _linear_time_pattern stand for.
+# each also stands for some non-ascii chars
+_ASCII_DIGIT_CHARS = frozenset('0123456789')
+_ASCII_WORD_CHARS = frozenset(
+    'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_')
+_ASCII_SPACE_CHARS = frozenset(' \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f')
+_ALL_ASCII_CHARS = frozenset(chr(val) for val in range(128))
+_BRACES_QUANTIFIER_RE = _re.compile(r'\{([0-9]+)(?:(,)([0-9]*))?\}')
+_CHAR_CLASS_ESCAPES = {
+    'd': _ASCII_DIGIT_CHARS,
+    'D': _ALL_ASCII_CHARS - _ASCII_DIGIT_CHARS,
+    'w': _ASCII_WORD_CHARS,
+    'W': _ALL_ASCII_CHARS - _ASCII_WORD_CHARS,
+    's': _ASCII_SPACE_CHARS,
+    'S': _ALL_ASCII_CHARS - _ASCII_SPACE_CHARS
+}
+
+# bounds how many pairs of path_specs _AdaptiveRouteOrder will compare
+# when working out which could overlap. Past this it gives up and
+# leaves the registration order alone
+_ROUTE_ORDER_MAX_COMPARISONS = 1000000
+
 _DEFAULT_REASON_PHRASE_MAPPING = {
     200: 'OK'
 }
@@ -46,9 +125,19 @@ class NoMatchingPathError(Exception):
             'not match any of {path_specs}'
         )
         self.path = path
-        self.path_specs = path_specs
+        # path_specs may also be a callable returning them, in which
+        # case it is only called if the path_specs attribute is
+        # actually read. The framework raises this error for every
+        # unroutable request, and most err handlers never look.
+        self._path_specs = path_specs
         super().__init__(message)
 
+    @property
+    def path_specs(self):
+        if callable(self._path_specs):
+            self._path_specs = self._path_specs()
+        return self._path_specs
+
 
 class NoMatchingMethodError(Exception):
     def __init__(
@@ -56,7 +145,8 @@ class NoMatchingMethodError(Exception):
         method,
         path,
         allowed_methods,
-        matching_path_specs
+        matching_path_specs,
+        allow_header=None
     ):
         message = (
             f'The \'{method}\' method is not one '
@@ -69,6 +159,15 @@ class NoMatchingMethodError(Exception):
         self.path = path
         self.allowed_methods = allowed_methods
         self.matching_path_specs = matching_path_specs
+        # the value for the Allow header of a 405 response. The
+        # framework passes in one it worked out ahead of time
+        self._allow_header = allow_header
+
+    @property
+    def allow_header(self):
+        if self._allow_header is None:
+            self._allow_header = _format_allow_header(self.allowed_methods)
+        return self._allow_header
 
 
 class NoMatchingPredError(Exception):
@@ -112,56 +211,220 @@ class WSGIResponseMAppingError(Exception):
         super().__init__(message)
 
 
+# header names a request is likely to have, in the canonical form
+# Headers keys them by. The header name tables below start out knowing
+# them, in every spelling they are likely to arrive in
+_COMMON_HEADER_NAMES = (
+    'Accept', 'Accept-Charset', 'Accept-Encoding', 'Accept-Language',
+    'Authorization', 'Cache-Control', 'Connection', 'Content-Encoding',
+    'Content-Length', 'Content-Type', 'Cookie', 'Date', 'Dnt', 'Expect',
+    'Forwarded', 'From', 'Host', 'If-Match', 'If-Modified-Since',
+    'If-None-Match', 'If-Range', 'If-Unmodified-Since', 'Keep-Alive',
+    'Max-Forwards', 'Origin', 'Pragma', 'Priority', 'Proxy-Authorization',
+    'Range', 'Referer', 'Sec-Ch-Ua', 'Sec-Ch-Ua-Mobile',
+    'Sec-Ch-Ua-Platform', 'Sec-Fetch-Dest', 'Sec-Fetch-Mode',
+    'Sec-Fetch-Site', 'Sec-Fetch-User', 'Te', 'Traceparent', 'Tracestate',
+    'Transfer-Encoding', 'Upgrade', 'Upgrade-Insecure-Requests',
+    'User-Agent', 'Via', 'X-Correlation-Id', 'X-Forwarded-For',
+    'X-Forwarded-Host', 'X-Forwarded-Port', 'X-Forwarded-Proto',
+    'X-Real-Ip', 'X-Request-Id', 'X-Requested-With'
+)
+
+# how many spellings a header name table remembers beyond the common
+# ones, so that requests full of made up header names can't grow it
+# without bound
+_HEADER_NAME_TABLE_MAXSIZE = 1024
+
+
+def _camel_dash_header_name(key):
+    key_parts = key.split('-')
+    key_parts = [
+        val[0].upper() + val[1:].lower()
+        for val in key_parts]
+    key = '-'.join(key_parts)
+    return key
+
+
+def _environ_key_header_name(wsgi_environ_key):
+    # remove HTTP_ prefix
+    wsgi_environ_key = wsgi_environ_key[5:]
+    # lowecase the whole thing
+    wsgi_environ_key = wsgi_environ_key.lower()
+    # replace _ with -
+    wsgi_environ_key = wsgi_environ_key.replace('_', '-')
+    # uppercase first letter of each part
+    wsgi_environ_key = '-'.join(
+        f'{x[0].upper()}{x[1:]}'
+        for x in wsgi_environ_key.split('-'))
+
+    return wsgi_environ_key
+
+
+class _HeaderNameTable:
+    # Maps spellings of header names, like 'content-type' or the wsgi
+    # environ key 'HTTP_CONTENT_TYPE', to the canonical form of the
+    # name, 'Content-Type', so that translating a name is one dict
+    # lookup rather than splitting and rebuilding it. The canonical
+    # names are interned, so every Headers holding a given name holds
+    # the same str. Spellings not seen before are remembered until the
+    # table is full, after which they are worked out every time, but
+    # only those the application's own code looks up: spellings read out
+    # of requests are looked up with remember=False, so that clients
+    # sending made up header names cannot fill the table with them and
+    # push the application's own custom headers off the fast path for
+    # good. Two threads adding the same spelling at once just both work
+    # it out; whichever dict assignment lands last wins, with the same
+    # value.
+
+    __slots__ = ('names', '_canonicalize', '_maxsize')
+
+    def __init__(self, canonicalize, spellings, maxsize):
+        self._canonicalize = canonicalize
+        self.names = {
+            spelling: _sys.intern(canonicalize(spelling))
+            for spelling in spellings
+        }
+        self._maxsize = len(self.names) + maxsize
+
+    def lookup(self, spelling, remember=True):
+        try:
+            return self.names[spelling]
+        except KeyError:
+            pass
+
+        name = self._canonicalize(spelling)
+        if remember and len(self.names) < self._maxsize:
+            name = _sys.intern(name)
+            self.names[spelling] = name
+        return name
+
+
+# for Headers keys, spelled any which way. Headers only adds keys it
+# has validated, so every spelling in here is a valid one
+_HEADER_NAMES = _HeaderNameTable(
+    _camel_dash_header_name,
+    [
+        spelling
+        for name in _COMMON_HEADER_NAMES
+        for spelling in (name, name.lower())
+    ],
+    _HEADER_NAME_TABLE_MAXSIZE
+)
+
+# for the HTTP_ keys of wsgi environs
+_ENVIRON_HEADER_NAMES = _HeaderNameTable(
+    _environ_key_header_name,
+    [
+        'HTTP_' + name.upper().replace('-', '_')
+        for name in _COMMON_HEADER_NAMES
+    ],
+    _HEADER_NAME_TABLE_MAXSIZE
+)
+
+
+def _header_name_environ_key(name):
+    # where a wsgi server following the cgi rules puts the header
+    # with the canonical name in the environ
+    if name in ('Content-Type', 'Content-Length'):
+        return name.upper().replace('-', '_')
+    return 'HTTP_' + name.upper().replace('-', '_')
+
+
+# for finding canonical header names in wsgi environs
+_ENVIRON_KEYS = _HeaderNameTable(
+    _header_name_environ_key,
+    _COMMON_HEADER_NAMES,
+    _HEADER_NAME_TABLE_MAXSIZE
+)
+
+
 class Headers:
+    # Headers are kept as a list of (name, value) pairs, in order and
+    # with names in canonical form, which is what wsgi wants response
+    # headers as, so that a name can be repeated, like Set-Cookie. An
+    # index dict maps each name to the value of its last pair, which
+    # is always the same as dict(self._pairs), and serves lookups and
+    # the mapping interface. Every method keeps the two in step.
 
     def __init__(self, *args, **kwargs):
         if len(args) == 0:
-            self._impl_dict = dict()
+            pairs = []
         elif len(args) == 1 and self._looks_like_a_mapping(args[0]):
             provisional_impl_dict = dict(args[0])
             self._validate_mapping(provisional_impl_dict)
-            provisional_impl_dict = {
+            # keys only differing in case are one header, the last
+            # value winning, as a mapping has each key once
+            impl_dict = {
                 self._convert_key_to_camel_dash_form(k): v
                 for k, v in provisional_impl_dict.items()
             }
-            self._impl_dict = provisional_impl_dict
+            pairs = list(impl_dict.items())
         elif len(args) == 1:  # assume an iterable of two, tuples
-            provisional_impl_dict = dict(args[0])
-            self._validate_mapping(provisional_impl_dict)
-            provisional_impl_dict = {
-                self._convert_key_to_camel_dash_form(k): v
-                for k, v in provisional_impl_dict.items()
-            }
-            self._impl_dict = provisional_impl_dict
+            pairs = []
+            for k, v in args[0]:
+                k = self._canonical_key(k)
+                self._validate_value(v)
+                pairs.append((k, v))
         else:
             raise TypeError(
                 f'Headers expected at most 1 '
                 f'arguments, got {len(args)}'
             )
 
+        self._pairs = pairs
+        self._impl_dict = dict(pairs)
+
         # support kwargs
         for k, v in kwargs.items():
-            self._validate_key(k)
-            k = self._convert_key_to_camel_dash_form(k)
-            self._validate_value(v)
-            self._impl_dict[k] = v
+            self[k] = v
 
     @classmethod
     def fromkeys(cls, keys, val=''):
         return cls((k, val) for k in keys)
 
+    @classmethod
+    def _from_trusted(cls, pairs):
+        # Make a Headers straight from a list of (name, value) tuples,
+        # without checking or copying anything: the names must already
+        # be in canonical form (as _HEADER_NAMES gives them), every
+        # name and value must already be valid, and the Headers takes
+        # the list over, so nothing else may hold on to it. This is for
+        # the framework's own hot paths, which build such lists
+        # themselves; anything else should call Headers(...)
+        headers = cls.__new__(cls)
+        headers._pairs = pairs
+        headers._impl_dict = dict(pairs)
+        return headers
+
     def _normalize_header_val(self, val):
         val = val.lstrip().rstrip()
         val = ' '.join(val.split())
         return val
 
     def _convert_key_to_camel_dash_form(self, key):
-        key_parts = key.split('-')
-        key_parts = [
-            val[0].upper() + val[1:].lower()
-            for val in key_parts]
-        key = '-'.join(key_parts)
-        return key
+        return _HEADER_NAMES.lookup(key)
+
+    def _canonical_key(self, key):
+        # validates key and returns it in camel dash form. Only valid
+        # keys ever make it into _HEADER_NAMES, so finding key there
+        # does both at once, and a lookup like headers['Authorization']
+        # costs one dict hit
+        try:
+            return _HEADER_NAMES.names[key]
+        except (KeyError, TypeError):
+            pass
+        self._validate_key(key)
+        return _HEADER_NAMES.lookup(key)
+
+    def _canonical_request_key(self, key):
+        # _canonical_key for names read out of requests, which are
+        # only found in _HEADER_NAMES, never added to it
+        try:
+            return _HEADER_NAMES.names[key]
+        except (KeyError, TypeError):
+            pass
+        self._validate_key(key)
+        return _HEADER_NAMES.lookup(key, remember=False)
 
     def _validate_key(self, key):
         if type(key) != str:
@@ -175,9 +438,8 @@ class Headers:
                 'Headers key must be at least one char long'
             )
 
-        inappropriate_chars = set(key) - _VALID_RFC_2616_TOKEN_CHARS
-
-        if len(inappropriate_chars) != 0:
+        if _find_invalid_token_char(key) is not None:
+            inappropriate_chars = set(key) - _VALID_RFC_2616_TOKEN_CHARS
             raise ValueError(
                 'Headers key %s is not a valid rfc2616 token. '
                 'It had %s chars in it which are not allowed. '
@@ -194,9 +456,8 @@ class Headers:
                 f'{type(val)}'
             )
 
-        inappropriate_chars = set(val) - _VALID_RFC_2616_TEXT_CHARS
-
-        if len(inappropriate_chars) != 0:
+        if _find_invalid_text_char(val) is not None:
+            inappropriate_chars = set(val) - _VALID_RFC_2616_TEXT_CHARS
             raise ValueError(
                 'Headers value %s is not a valid rfc2616 text. '
                 'It had %s chars in it which are not allowed. '
@@ -229,47 +490,92 @@ class Headers:
 
     def _validate_mapping(self, mapping):
         for key in mapping:
-            self._validate_key(key)
+            self._canonical_key(key)
             self._validate_value(mapping[key])
 
     def __contains__(self, key):
-        self._validate_key(key)
-        key = self._convert_key_to_camel_dash_form(key)
+        key = self._canonical_key(key)
         return key in self._impl_dict
 
     def __getitem__(self, key):
-        self._validate_key(key)
-        key = self._convert_key_to_camel_dash_form(key)
+        key = self._canonical_key(key)
         try:
             return self._impl_dict[key]
         except KeyError:
             raise KeyError(key)
 
     def __setitem__(self, key, val):
-        self._validate_key(key)
-        key = self._convert_key_to_camel_dash_form(key)
+        key = self._canonical_key(key)
         self._validate_value(val)
+        pairs = self._pairs
+        if key in self._impl_dict:
+            # the new value takes the place of the first pair with this
+            # name, and any later ones go
+            kept = []
+            replaced = False
+            for pair in pairs:
+                if pair[0] != key:
+                    kept.append(pair)
+                elif not replaced:
+                    kept.append((key, val))
+                    replaced = True
+            pairs[:] = kept
+        else:
+            pairs.append((key, val))
         self._impl_dict[key] = val
 
     def __delitem__(self, key):
-        self._validate_key(key)
-        key = self._convert_key_to_camel_dash_form(key)
+        key = self._canonical_key(key)
         try:
             del self._impl_dict[key]
         except KeyError:
             raise KeyError(key)
+        self._remove_pairs(key)
+
+    def _remove_pairs(self, key):
+        # drop every pair named key, in place, since the list may be a
+        # property of a subclass rather than an attribute
+        pairs = self._pairs
+        pairs[:] = [pair for pair in pairs if pair[0] != key]
+
+    def add(self, key, val):
+        """
+        Add a header, keeping any others with the same name, as
+        headers like Set-Cookie need. Lookups by that name then give
+        the value added last.
+
+        :param key: the name of the header
+        :param val: the value of the header
+        """
+        key = self._canonical_key(key)
+        self._validate_value(val)
+        self._pairs.append((key, val))
+        self._impl_dict[key] = val
+
+    def get_all(self, key):
+        """
+        Return the values of every header with a name, in the order
+        they were set or added, or an empty list if there are none.
+
+        :param key: the name of the headers
+        """
+        key = self._canonical_key(key)
+        if key not in self._impl_dict:
+            return []
+        return [val for name, val in self._pairs if name == key]
 
     def __eq__(self, other):
-        if type(other) != Headers:
+        if not isinstance(other, Headers):
             return False
 
         key_diff = set(self.keys()) ^ set(other.keys())
         if key_diff != set():
             return False
 
+        normalize = self._normalize_header_val
         for k in self.keys():
-            if (self._normalize_header_val(self[k]) !=
-                self._normalize_header_val(other[k])
+            if ([normalize(v) for v in self.get_all(k)] !=
+                [normalize(v) for v in other.get_all(k)]
             ):
                 return False
 
@@ -293,55 +599,201 @@ class Headers:
         return self._impl_dict.values()
 
     def copy(self):
-        return Headers(self)
+        return Headers._from_trusted(list(self._pairs))
 
     def __len__(self):
         return len(self._impl_dict)
 
     def __repr__(self):
+        # a dict when every name is there once, which is the usual
+        # case, and the pairs otherwise
+        if len(self._pairs) == len(self._impl_dict):
+            contents = self._impl_dict
+        else:
+            contents = self._pairs
         return ''.join([
             'Headers(',
-            repr(self._impl_dict),
+            repr(contents),
             ')'
         ])
     
     def __str__(self):
         return '\r\n'.join([
             ': '.join([name, self._normalize_header_val(value)])
-            for name, value in self.items()
+            for name, value in self._pairs
         ])
 
     def get(self, key, default=None):
-        self._validate_key(key)
-        key = self._convert_key_to_camel_dash_form(key)
+        key = self._canonical_key(key)
         return self._impl_dict.get(key, default)
 
     def setdefault(self, key, default=''):
-        self._validate_key(key)
+        key = self._canonical_key(key)
         self._validate_value(default)
-        key = self._convert_key_to_camel_dash_form(key)
-        return self._impl_dict.setdefault(key, default)
+        impl_dict = self._impl_dict
+        if key not in impl_dict:
+            self._pairs.append((key, default))
+            impl_dict[key] = default
+        return impl_dict[key]
 
     def pop(self, key, default=None):
-        self._validate_key(key)
-        key = self._convert_key_to_camel_dash_form(key)
-        return self._impl_dict.pop(key, default)
+        key = self._canonical_key(key)
+        if key not in self._impl_dict:
+            return default
+        self._remove_pairs(key)
+        return self._impl_dict.pop(key)
 
     def popitem(self):
         try:
-            return self._impl_dict.popitem()
+            key, val = self._impl_dict.popitem()
         except KeyError:
             raise KeyError('popitem(): Headers is empty')
+        self._remove_pairs(key)
+        return key, val
 
     def clear(self):
+        self._pairs.clear()
         self._impl_dict.clear()
 
     def update(self, other):
         self._validate_mapping(other)
-        self._impl_dict.update(other)
+        for key in other:
+            self[key] = other[key]
+
+
+class _EnvironHeaders(Headers):
+    # The Headers of a request WsgiApp.__call__ makes, read straight
+    # from the wsgi environ rather than copied out of it up front, since
+    # most handlers only ever look at a few of the headers a request
+    # comes with. Looking a header up translates just its name to an
+    # environ key (through _ENVIRON_KEYS) and validates just its value;
+    # a header that isn't there costs one look over the environ's keys,
+    # the first time, to make sure the server didn't put it somewhere
+    # other than its cgi environ key. Anything else, like iterating,
+    # comparing or changing the headers, first turns the whole environ
+    # into the pairs and index a Headers would have held all along,
+    # once, as does looking up a missing header when the server did put
+    # some somewhere unusual. Either way the answers are the ones the
+    # copied out Headers would give.
+
+    def __init__(self, environ):
+        self._environ = environ
+        self._materialized = None
+        self._materialized_pairs = None
+        self._only_cgi_keys = None
+
+    @property
+    def _impl_dict(self):
+        impl_dict = self._materialized
+        if impl_dict is None:
+            impl_dict = self._materialize()
+        return impl_dict
+
+    @property
+    def _pairs(self):
+        if self._materialized is None:
+            self._materialize()
+        return self._materialized_pairs
+
+    def _materialize(self):
+        environ = self._environ
+        header_name = _ENVIRON_HEADER_NAMES.lookup
+        impl_dict = {
+            header_name(key, remember=False): str(val)
+            for (key, val) in environ.items()
+            if key.startswith('HTTP_')
+        }
+        if 'CONTENT_TYPE' in environ:
+            impl_dict['Content-Type'] = str(environ['CONTENT_TYPE'])
+        if 'CONTENT_LENGTH' in environ:
+            impl_dict['Content-Length'] = str(environ['CONTENT_LENGTH'])
+        for key, val in impl_dict.items():
+            self._canonical_request_key(key)
+            self._validate_value(val)
+        self._materialized_pairs = list(impl_dict.items())
+        self._materialized = impl_dict
+        return impl_dict
+
+    def _environ_value(self, key):
+        # the validated value of the header with the canonical name
+        # key under its cgi environ key, or None if it isn't there
+        val = self._environ.get(_ENVIRON_KEYS.lookup(key))
+        if val is None:
+            return None
+        val = str(val)
+        self._validate_value(val)
+        return val
+
+    def _surely_missing(self):
+        # whether every header in the environ is under its cgi environ
+        # key, so that a header not found there isn't anywhere
+        only_cgi_keys = self._only_cgi_keys
+        if only_cgi_keys is None:
+            header_name = _ENVIRON_HEADER_NAMES.lookup
+            environ_key = _ENVIRON_KEYS.lookup
+            only_cgi_keys = all(
+                environ_key(
+                    header_name(key, remember=False), remember=False
+                ) == key
+                for key in self._environ
+                if key.startswith('HTTP_')
+            )
+            self._only_cgi_keys = only_cgi_keys
+        return only_cgi_keys
+
+    def __contains__(self, key):
+        key = self._canonical_key(key)
+        if self._materialized is None:
+            if self._environ_value(key) is not None:
+                return True
+            if self._surely_missing():
+                return False
+        return key in self._impl_dict
+
+    def __getitem__(self, key):
+        key = self._canonical_key(key)
+        if self._materialized is None:
+            val = self._environ_value(key)
+            if val is not None:
+                return val
+            if self._surely_missing():
+                raise KeyError(key)
+        try:
+            return self._impl_dict[key]
+        except KeyError:
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        key = self._canonical_key(key)
+        if self._materialized is None:
+            val = self._environ_value(key)
+            if val is not None:
+                return val
+            if self._surely_missing():
+                return default
+        return self._impl_dict.get(key, default)
 
 
 class Request:
+    # Requests only hold what their properties store, so they use
+    # __slots__, which makes them smaller and quicker to make. Being
+    # made for every request, they are also made by WsgiApp.__call__
+    # through _from_trusted, which skips the property setters' checks.
+
+    __slots__ = (
+        '_http_version',
+        '_method',
+        '_path',
+        '_path_vars',
+        '_query_str',
+        '_headers',
+        '_body',
+        '_start_time',
+        '_host',
+        '_port',
+        '_proto'
+    )
+
     def __init__(
         self,
         method,
@@ -369,6 +821,41 @@ class Request:
         self.port = port
         self.proto = proto
 
+    @classmethod
+    def _from_trusted(
+        cls,
+        method,
+        path,
+        headers,
+        body,
+        host,
+        port,
+        proto,
+        http_version,
+        path_vars,
+        query_str,
+        start_time
+    ):
+        # Make a Request without checking any of its attributes, so they
+        # must already be what the property setters would accept
+        # (headers a Headers, path_vars a dict, no '?' in path and so
+        # on). This is for the framework's own hot paths, whose values
+        # come from the server with the types the server spec
+        # guarantees; anything else should call Request(...)
+        req = cls.__new__(cls)
+        req._method = method
+        req._path = path
+        req._headers = headers
+        req._body = body
+        req._host = host
+        req._port = port
+        req._proto = proto
+        req._http_version = http_version
+        req._path_vars = path_vars
+        req._query_str = query_str
+        req._start_time = start_time
+        return req
+
     @property
     def http_version(self):
         return self._http_version
@@ -401,9 +888,8 @@ class Request:
                 'must be at least one character long.'
             )
 
-        inappropriate_chars = set(value) - _VALID_RFC_2616_TOKEN_CHARS
-
-        if len(inappropriate_chars) != 0:
+        if _find_invalid_token_char(value) is not None:
+            inappropriate_chars = set(value) - _VALID_RFC_2616_TOKEN_CHARS
             raise ValueError(
                 'httpglue.Request.method \'%s\' is not a valid rfc2616 token. '
                 'It had %s chars in it which are not allowed. '
@@ -472,13 +958,13 @@ class Request:
 
     @headers.setter
     def headers(self, value):
-        if type(value) not in (dict, Headers):
+        if not isinstance(value, (dict, Headers)):
             raise TypeError(
-                'headers attribute of httpglue.Response object '
+                'headers attribute of httpglue.Request object '
                 'must be of type dict or httpglue.Headers, '
                 'got %s' % type(value)
             )
-        self._headers = Headers(value) if type(value) else value
+        self._headers = value if isinstance(value, Headers) else Headers(value)
 
     @property
     def body(self):
@@ -631,9 +1117,8 @@ class Response:
                 'must be of type \'str\', got \'%s\'' % type(value)
             )
 
-        inappropriate_chars = set(value) - _VALID_RFC_2616_TOKEN_CHARS
-
-        if len(inappropriate_chars) != 0:
+        if _find_invalid_token_char(value) is not None:
+            inappropriate_chars = set(value) - _VALID_RFC_2616_TOKEN_CHARS
             raise ValueError(
                 'Response.reason \'%s\' is not a valid rfc2616 token. '
                 'It had %s chars in it which are not allowed. '
@@ -650,14 +1135,14 @@ class Response:
 
     @headers.setter
     def headers(self, value):
-        if type(value) not in (dict, Headers):
+        if not isinstance(value, (dict, Headers)):
             raise TypeError(
                 'headers attribute of Response object '
                 'must be of type \'dict\' or \'Headers\', '
                 'got \'%s\'' % type(value)
             )
         
-        self._headers = Headers(value) if type(value) == dict else value
+        self._headers = value if isinstance(value, Headers) else Headers(value)
 
     @property
     def body(self):
@@ -688,12 +1173,1378 @@ class Response:
         return f'{status_part}\r\n{headers_part}\r\n\r\n{self.body}'
 
 
+class PathTemplate:
+
+    _placeholder_re = _re.compile(
+        r'\{(?P<name>[A-Za-z_][A-Za-z0-9_]*)(?::(?P<converter>[a-z]+))?\}')
+
+    def __init__(self, template):
+        """
+        Creates a PathTemplate object, an alternative to a regex
+        path_spec that can be passed to register_endpoint.
+
+        A template is a path whose segments are either literal text or
+        a placeholder filling the whole segment, like
+        '/widgets/{id:int}'. A placeholder is a name and, optionally,
+        a converter: 'str' (the default) matches any non empty segment,
+        'int' matches a segment of digits 0-9. The converted values are
+        put in the path_vars property of the httpglue.Request object
+        under their names, so '/widgets/7' gives {'id': 7}.
+
+        Endpoints registered with templates are routed with a trie of
+        path segments, so their routing cost grows with the depth of
+        the path rather than with the number of endpoints.
+
+        :param str template: the path template
+
+        :rtype httpglue.PathTemplate: the newly constructed PathTemplate
+        """
+        if type(template) is not str:
+            raise TypeError(
+                'expected template to be of type str. '
+                'got %s' % type(template))
+
+        if not template.startswith('/'):
+            raise ValueError(
+                'The path template %r must start with /' % template)
+
+        segments = []
+        regex_parts = []
+        names = []
+        for raw_segment in template.split('/')[1:]:
+            placeholder_match = self._placeholder_re.fullmatch(raw_segment)
+            if placeholder_match is not None:
+                name = placeholder_match.group('name')
+                converter = placeholder_match.group('converter') or 'str'
+                if converter not in _PATH_TEMPLATE_CONVERTERS:
+                    raise ValueError(
+                        'The path template %r uses the unknown converter '
+                        '%r. Known converters are %s' % (
+                            template, converter,
+                            sorted(_PATH_TEMPLATE_CONVERTERS)))
+                if name in names:
+                    raise ValueError(
+                        'The path template %r uses the name %r '
+                        'more than once' % (template, name))
+                names.append(name)
+                segments.append((name, converter))
+                regex_parts.append(
+                    f'(?P<{name}>{_PATH_TEMPLATE_CONVERTERS[converter][0]})')
+            elif '{' in raw_segment or '}' in raw_segment:
+                raise ValueError(
+                    'The path template %r has a malformed segment %r. '
+                    'Placeholders like {name} or {name:converter} must '
+                    'fill a whole segment' % (template, raw_segment))
+            else:
+                segments.append(raw_segment)
+                regex_parts.append(_re.escape(raw_segment))
+
+        self._template = template
+        # each segment is either a literal str or a (name, converter)
+        # tuple for a placeholder
+        self._segments = tuple(segments)
+        # an equivalent regex, used where a template endpoint has to be
+        # matched on its own (\Z rather than $, a template never
+        # matches a path with a trailing newline)
+        self._regex = _re.compile('^/' + '/'.join(regex_parts) + '\\Z')
+
+    @property
+    def template(self):
+        return self._template
+
+    def _path_vars_from_match(self, path_match):
+        # None if a converter can't convert its segment after all,
+        # like an int too long for int() to parse, which means the
+        # template doesn't match
+        try:
+            return {
+                name: _PATH_TEMPLATE_CONVERTERS[converter][1](
+                    path_match.group(name))
+                for name, converter in (
+                    segment for segment in self._segments
+                    if type(segment) is tuple
+                )
+            }
+        except ValueError:
+            return None
+
+    def __eq__(self, other):
+        if type(other) != PathTemplate:
+            return False
+        return self._template == other._template
+
+    def __ne__(self, other):
+        return not (self == other)
+
+    def __hash__(self):
+        return hash((PathTemplate, self._template))
+
+    def __repr__(self):
+        return f'PathTemplate({self._template!r})'
+
+    def __str__(self):
+        return self._template
+
+
+def _signature(f):
+    # inspect takes longer to import than the rest of httpglue put
+    # together, and signatures are only checked while registering, so
+    # it is imported the first time one is, rather than with httpglue
+    import inspect
+    return inspect.signature(f)
+
+
+def _format_allow_header(methods):
+    # the value of an Allow header listing methods, in a stable order
+    return ', '.join(sorted(methods))
+
+
+def _normalize_host(host):
+    # the form hosts are compared in: lowercased, without a port or a
+    # trailing dot. Works on Host header values, like 'Example.com:80'
+    # or '[::1]:8080', and on the hosts passed to register_endpoint
+    host = host.lower()
+    if host.startswith('['):
+        # an ipv6 address, keep the brackets but lose the port
+        host = host[:host.find(']') + 1] or host
+    else:
+        name, colon, port = host.rpartition(':')
+        if colon and port.isdigit():
+            host = name
+    return host.rstrip('.')
+
+
+# bumped whenever the layout of route snapshots (see
+# WsgiApp.save_routes) or the way path_specs are compiled changes, so
+# that old snapshots stop matching rather than being trusted
+_ROUTE_SNAPSHOT_FORMAT = 1
+
+
+def _import_path(obj):
+    # 'module:qualname' for a function or class that can be imported
+    # back from it, as route snapshots refer to handlers, preds and
+    # exception types
+    module = getattr(obj, '__module__', None)
+    qualname = getattr(obj, '__qualname__', None)
+    if module is None or qualname is None or '<' in qualname:
+        raise ValueError(
+            'only module level functions and classes can be saved in a '
+            'route snapshot. %r cannot be imported by name' % (obj,))
+
+    import_path = f'{module}:{qualname}'
+    try:
+        same_obj = _import_object(import_path) is obj
+    except (ImportError, AttributeError):
+        same_obj = False
+    if not same_obj:
+        raise ValueError(
+            'only module level functions and classes can be saved in a '
+            'route snapshot. %r is not what %r imports' % (
+                obj, import_path))
+    return import_path
+
+
+def _import_object(import_path):
+    import importlib
+    module, _, qualname = import_path.partition(':')
+    obj = importlib.import_module(module)
+    for attr in qualname.split('.'):
+        obj = getattr(obj, attr)
+    return obj
+
+
+def _snapshot_object_fingerprint(obj):
+    # what validating a handler, pred or exception type a route
+    # snapshot names depends on besides its import path: the
+    # signature of a function, the classes a class derives from
+    if isinstance(obj, type):
+        return [f'{cls.__module__}:{cls.__qualname__}' for cls in obj.__mro__]
+    return str(_signature(obj))
+
+
+def _route_snapshot_fingerprint(routes, objects, path_spec_policy):
+    # a hash of a snapshot's routes and of everything else their
+    # validation and compiled path_regexes depend on: the handlers,
+    # preds and exception types they name (objects maps their import
+    # paths to them), this very httpglue, the python version and the
+    # path_spec_policy
+    import hashlib
+    import json
+    with open(__file__, 'rb') as f:
+        httpglue_digest = hashlib.sha256(f.read()).hexdigest()
+    return hashlib.sha256(
+        json.dumps(
+            [
+                _ROUTE_SNAPSHOT_FORMAT,
+                httpglue_digest,
+                list(_sys.version_info[:2]),
+                path_spec_policy,
+                routes,
+                {
+                    import_path: _snapshot_object_fingerprint(obj)
+                    for import_path, obj in objects.items()
+                }
+            ],
+            sort_keys=True
+        ).encode()
+    ).hexdigest()
+
+
+def _literal_affixes(path_regex):
+    # The literal text that every path a precompiled regex path_spec
+    # matches must start with, and must end with (ignoring the one
+    # trailing newline '$' allows). Either is '' when it can't be
+    # worked out simply. This is deliberately conservative: it stops
+    # at the first regex special char, and gives up entirely on
+    # alternations and on case insensitive or verbose patterns.
+    pattern = path_regex.pattern[1:-1]
+    if ('|' in pattern
+            or path_regex.flags & (_re.IGNORECASE | _re.VERBOSE)):
+        return '', ''
+
+    prefix = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\':
+            escaped = pattern[i + 1:i + 2]
+            if not escaped or escaped.isalnum():
+                break
+            prefix.append(escaped)
+            i += 2
+        elif char in _REGEX_META_CHARS:
+            break
+        else:
+            prefix.append(char)
+            i += 1
+    if prefix and pattern[i:i + 1] in ('*', '?', '{'):
+        # the last char may be repeated zero times
+        prefix.pop()
+
+    suffix = []
+    i = len(pattern) - 1
+    while i >= 0:
+        char = pattern[i]
+        backslashes = len(pattern[:i]) - len(pattern[:i].rstrip('\\'))
+        if backslashes % 2:
+            if char.isalnum():
+                break
+            suffix.append(char)
+            i -= 2
+        elif char in _REGEX_META_CHARS:
+            break
+        else:
+            suffix.append(char)
+            i -= 1
+
+    return ''.join(prefix), ''.join(reversed(suffix))
+
+
+def _linear_time_pattern(path_spec):
+    # Decide whether a regex path_spec is in the subset httpglue knows
+    # can be matched in time linear in the length of the path: literal
+    # chars, '.', char classes ([a-z0-9_], [^/], \d, \w, \s and
+    # their negations) each optionally followed by one of the
+    # quantifiers * + ? {m} {m,} {m,n}, and groups (plain, named or
+    # non capturing) of those, without quantifiers of their own or
+    # alternation. On top of that, the subset must be deterministic:
+    # whatever a quantified item can match, what can come right after
+    # it can't start with, so a match never has to give chars back.
+    #
+    # Returns None for path_specs outside the subset. For those inside
+    # it returns the path_spec with its quantifiers made possessive
+    # (where the re module has them), which matches exactly the same
+    # paths with exactly the same groups, but never backtracks.
+    #
+    # Char sets are modeled as (ascii chars, may have non-ascii chars)
+    # pairs, which overlap when they share an ascii char or could both
+    # have non-ascii ones. That is conservative, never wrong.
+    items = []  # [source text, char set, min count, max count or None]
+    i = 0
+    length = len(path_spec)
+    while i < length:
+        char = path_spec[i]
+        if char == '(':
+            if path_spec.startswith('(?P<', i):
+                end = path_spec.find('>', i)
+                if end == -1:
+                    return None
+                items.append([path_spec[i:end + 1], None, 0, 0])
+                i = end + 1
+            elif path_spec.startswith('(?:', i):
+                items.append(['(?:', None, 0, 0])
+                i += 3
+            elif path_spec.startswith('(?', i):
+                return None
+            else:
+                items.append(['(', None, 0, 0])
+                i += 1
+            continue
+        elif char == ')':
+            if path_spec[i + 1:i + 2] in ('*', '+', '?', '{'):
+                return None
+            items.append([')', None, 0, 0])
+            i += 1
+            continue
+        elif char == '\\':
+            escaped = path_spec[i + 1:i + 2]
+            if escaped in _CHAR_CLASS_ESCAPES:
+                char_set = (_CHAR_CLASS_ESCAPES[escaped], True)
+            elif escaped and not escaped.isalnum() and ord(escaped) < 128:
+                char_set = (frozenset(escaped), False)
+            else:
+                return None
+            start = i
+            i += 2
+        elif char == '[':
+            char_set, end = _parse_char_class(path_spec, i)
+            if char_set is None:
+                return None
+            start = i
+            i = end
+        elif char == '.':
+            char_set = (_ALL_ASCII_CHARS - {'\n'}, True)
+            start = i
+            i += 1
+        elif char in _REGEX_META_CHARS:
+            return None
+        else:
+            char_set = (
+                (frozenset(char), False) if ord(char) < 128
+                else (frozenset(), True)
+            )
+            start = i
+            i += 1
+
+        # an optional quantifier, which must be greedy
+        min_count, max_count = 1, 1
+        quantifier = path_spec[i:i + 1]
+        if quantifier in ('*', '+', '?'):
+            min_count, max_count = {
+                '*': (0, None), '+': (1, None), '?': (0, 1)}[quantifier]
+            quantifier_end = i + 1
+        elif quantifier == '{':
+            quantifier_match = _BRACES_QUANTIFIER_RE.match(path_spec, i)
+            if quantifier_match is None:
+                return None
+            min_count = int(quantifier_match.group(1))
+            if quantifier_match.group(2) is None:
+                max_count = min_count
+            elif quantifier_match.group(3):
+                max_count = int(quantifier_match.group(3))
+            else:
+                max_count = None
+            quantifier_end = quantifier_match.end()
+        else:
+            quantifier_end = i
+        if path_spec[quantifier_end:quantifier_end + 1] in ('?', '+'):
+            # lazy or already possessive
+            return None
+        items.append([
+            path_spec[start:quantifier_end], char_set, min_count, max_count])
+        i = quantifier_end
+
+    depth = 0
+    for source, char_set, _, _ in items:
+        if char_set is None:
+            depth += -1 if source == ')' else 1
+            if depth < 0:
+                return None
+    if depth:
+        return None
+
+    # walk backwards keeping the set of chars the rest of the path
+    # could start with, checking each variably repeated item against it
+    follow_ascii, follow_non_ascii = set(), False
+    for item in reversed(items):
+        source, char_set, min_count, max_count = item
+        if char_set is None:
+            continue
+        ascii_chars, non_ascii = char_set
+        if min_count != max_count:
+            if ((ascii_chars & follow_ascii)
+                    or (non_ascii and follow_non_ascii)):
+                return None
+            if _HAS_POSSESSIVE_QUANTIFIERS:
+                item[0] = source + '+'
+        if min_count:
+            follow_ascii, follow_non_ascii = set(), False
+        follow_ascii |= ascii_chars
+        follow_non_ascii = follow_non_ascii or non_ascii
+
+    return ''.join(item[0] for item in items)
+
+
+def _parse_char_class(path_spec, start):
+    # parse the [...] char class starting at start in path_spec into a
+    # (char set, end) pair, where end is just after its closing ']'.
+    # The char set is None for classes _linear_time_pattern doesn't
+    # handle (like ones starting with ']' or containing '[')
+    i = start + 1
+    negated = path_spec.startswith('^', i)
+    if negated:
+        i += 1
+    ascii_chars = set()
+    non_ascii = False
+    first = True
+    while True:
+        char = path_spec[i:i + 1]
+        if not char or char == '[' or (char == ']' and first):
+            return None, i
+        if char == ']':
+            break
+        first = False
+        if char == '\\':
+            escaped = path_spec[i + 1:i + 2]
+            if escaped in _CHAR_CLASS_ESCAPES:
+                ascii_chars |= _CHAR_CLASS_ESCAPES[escaped]
+                non_ascii = True
+                i += 2
+                continue
+            elif escaped and not escaped.isalnum() and ord(escaped) < 128:
+                low = escaped
+                i += 2
+            else:
+                return None, i
+        else:
+            low = char
+            i += 1
+        if path_spec.startswith('-', i) and path_spec[i + 1:i + 2] not in (
+                ']', '', '\\', '['):
+            high = path_spec[i + 1]
+            i += 2
+        else:
+            high = low
+        if ord(high) < ord(low):
+            return None, i
+        ascii_chars.update(
+            chr(val) for val in range(ord(low), min(ord(high), 127) + 1))
+        if ord(high) > 127:
+            non_ascii = True
+    end = i + 1
+
+    if negated:
+        return (_ALL_ASCII_CHARS - ascii_chars, True), end
+    return (frozenset(ascii_chars), non_ascii), end
+
+
+def _extract_path_vars(path_match):
+    path_vars = {}
+    path_vars.update(enumerate(path_match.groups()))
+    path_vars.update(path_match.groupdict())
+    return path_vars
+
+
+class _Route:
+    # The compiled form of an _endpoint_table entry, which is what the
+    # router engines and WsgiApp._choose_endpoint work with. position
+    # is the endpoint's place in registration order.
+
+    __slots__ = (
+        'position',
+        'path_spec',
+        'path_regex',
+        'path_template',
+        'is_literal',
+        'method_spec',
+        'methods',
+        'any_method',
+        'pred',
+        'pred_key',
+        'host',
+        'req_handler'
+    )
+
+    def __init__(self, position, endpoint):
+        self.position = position
+        self.path_spec = endpoint['path_spec']
+        self.path_regex = endpoint['path_regex']
+        self.path_template = (
+            endpoint['path_spec']
+            if type(endpoint['path_spec']) is PathTemplate else None
+        )
+        self.is_literal = endpoint['is_literal']
+        # the original list is kept for the routing error diagnostics
+        self.method_spec = endpoint['method_spec']
+        self.methods = frozenset(endpoint['method_spec'])
+        self.any_method = '*' in self.methods
+        self.pred = endpoint['pred']
+        self.pred_key = endpoint['pred_key']
+        self.host = endpoint['host']
+        self.req_handler = endpoint['req_handler']
+
+
+class _ErrHandler:
+    # The compiled form of an _err_handler_table entry
+
+    __slots__ = ('exceptions_list', 'err_handler')
+
+    def __init__(self, err_handler_entry):
+        self.exceptions_list = err_handler_entry['exceptions_list']
+        self.err_handler = err_handler_entry['err_handler']
+
+
+class _LinearPathMatcher:
+    # The 'linear' router engine. It tries every endpoint's
+    # precompiled path_spec regex, one at a time, in registration
+    # order and yields the (route, path_vars) pairs that match.
+    # Method and pred filtering is left to WsgiApp._choose_endpoint
+
+    def __init__(self, routes):
+        self.routes = tuple(routes)
+        self._routes = tuple(
+            (route, route.path_regex.match, route.path_template)
+            for route in self.routes
+        )
+
+    def candidates(self, path):
+        for route, match_path, path_template in self._routes:
+            path_match = match_path(path)
+            if path_match is None:
+                continue
+            if path_template is None:
+                yield route, _extract_path_vars(path_match)
+                continue
+            path_vars = path_template._path_vars_from_match(path_match)
+            if path_vars is not None:
+                yield route, path_vars
+
+
+class _SegmentTrie:
+    # Holds the endpoints registered with PathTemplate path_specs.
+    # Each node is keyed by literal path segments, with one more
+    # child per placeholder converter, so looking a path up walks
+    # one level per path segment no matter how many endpoints there
+    # are. The walk only checks segments against the converters'
+    # regexes; the converters themselves run once a whole path has
+    # reached an endpoint, so int placeholders are ints in the
+    # path_vars that come out. A segment a converter can't convert
+    # after all (like an int too long for int() to parse) means the
+    # endpoint doesn't match.
+
+    def __init__(self, routes):
+        self._root = self._new_node()
+        for route in routes:
+            node = self._root
+            names = []
+            converts = []
+            for segment in route.path_template._segments:
+                if type(segment) is tuple:
+                    name, converter = segment
+                    names.append(name)
+                    converts.append(_PATH_TEMPLATE_CONVERTERS[converter][1])
+                    node = node['params'].setdefault(
+                        converter, self._new_node())
+                else:
+                    node = node['literals'].setdefault(
+                        segment, self._new_node())
+            node['routes'].append((route, tuple(names), tuple(converts)))
+        self._fullmatches = {
+            converter: _re.compile(regex).fullmatch
+            for converter, (regex, _) in _PATH_TEMPLATE_CONVERTERS.items()
+        }
+
+    def _new_node(self):
+        return {'literals': {}, 'params': {}, 'routes': []}
+
+    def _walk(self, node, segments, depth, values, found):
+        if depth == len(segments):
+            for route, names, converts in node['routes']:
+                try:
+                    path_vars = {
+                        name: convert(value)
+                        for name, convert, value
+                        in zip(names, converts, values)
+                    }
+                except ValueError:
+                    continue
+                found.append((route, path_vars))
+            return
+
+        segment = segments[depth]
+        literal_child = node['literals'].get(segment)
+        if literal_child is not None:
+            self._walk(literal_child, segments, depth + 1, values, found)
+
+        if segment:
+            for converter, param_child in node['params'].items():
+                if self._fullmatches[converter](segment):
+                    self._walk(
+                        param_child, segments, depth + 1,
+                        values + [segment], found)
+
+    def candidates(self, path):
+        if not path.startswith('/'):
+            return ()
+        found = []
+        self._walk(self._root, path.split('/')[1:], 0, [], found)
+        # a path can reach more than one endpoint through different
+        # branches, so put them back into registration order
+        found.sort(key=lambda candidate: candidate[0].position)
+        return found
+
+
+class _CombinedRegexPathMatcher:
+    # The 'combined_regex' router engine. Runs of endpoints are merged
+    # into one alternation regex, with one named marker group
+    # wrapping each endpoint's path_spec:
+    #
+    #     (?P<_r0>^/widgets$)|(?P<_r1>^/widgets/(\d*)$)|...
+    #
+    # so a single scan finds the first endpoint (in registration
+    # order) whose path_spec matches. Its path_vars come from the
+    # slice of groups belonging to its marker group. If that endpoint
+    # is later rejected on method or pred, the rest of the run is
+    # tried one endpoint at a time, exactly like the linear engine.
+    #
+    # The names of named groups are stripped inside the combined
+    # regex (two path_specs may well use the same name), and mapped
+    # back using each endpoint's own compiled regex. path_specs that
+    # can't safely be merged (backreferences, conditionals, global
+    # inline flags) are kept as standalone blocks in the same order.
+    #
+    # Runs are cut into blocks of at most _max_alternatives endpoints.
+    # The re module slows down much faster than linearly as groups are
+    # added to one alternation (a 10k endpoint regex is some 20x slower
+    # than trying 10k regexes one by one), and blocks of about this
+    # size were the fastest in benchmarks/routing.py.
+
+    _max_alternatives = 16
+
+    _unmergeable_re = _re.compile(
+        r'\\[1-9]|\(\?P=|\(\?\(|\(\?[aiLmsux]+\)'
+    )
+    _named_group_re = _re.compile(r'\(\?P<[^>]*>')
+
+    def __init__(self, routes):
+        self.routes = tuple(routes)
+        # each block is a (combined_regex, endpoints, markers) tuple.
+        # standalone blocks have no combined_regex and one endpoint
+        self._blocks = []
+        run = []
+        for route in routes:
+            alternative = self._make_alternative(route)
+            if alternative is None:
+                self._add_run(run)
+                run = []
+                self._blocks.append((None, (route,), None))
+            else:
+                run.append((route, alternative))
+                if len(run) == self._max_alternatives:
+                    self._add_run(run)
+                    run = []
+        self._add_run(run)
+        self._blocks = tuple(self._blocks)
+
+    def _make_alternative(self, route):
+        pattern = route.path_regex.pattern
+        if self._unmergeable_re.search(pattern):
+            return None
+
+        alternative = self._named_group_re.sub('(', pattern)
+        try:
+            compiled_alternative = _re.compile(alternative)
+        except _re.error:
+            return None
+        # make sure stripping the group names didn't change the
+        # group structure of the path_spec (it could, in principle,
+        # for odd specs like ones with a literal '(?P<' in them)
+        if (compiled_alternative.groups != route.path_regex.groups
+                or compiled_alternative.groupindex):
+            return None
+
+        return alternative
+
+    def _add_run(self, run):
+        if not run:
+            return
+
+        combined_pattern = '|'.join(
+            f'(?P<_r{position}>{alternative})'
+            for position, (route, alternative) in enumerate(run)
+        )
+        combined_regex = _re.compile(combined_pattern)
+        markers = {
+            f'_r{position}': (
+                position,
+                combined_regex.groupindex[f'_r{position}'] + 1
+            )
+            for position in range(len(run))
+        }
+        self._blocks.append((
+            combined_regex,
+            tuple(route for route, alternative in run),
+            markers
+        ))
+
+    def _slice_path_vars(self, route, combined_match, first_group):
+        path_regex = route.path_regex
+        groups = [
+            combined_match.group(group)
+            for group in range(first_group, first_group + path_regex.groups)
+        ]
+        path_vars = {}
+        path_vars.update(enumerate(groups))
+        path_vars.update(
+            (name, groups[group - 1])
+            for name, group in path_regex.groupindex.items()
+        )
+        return path_vars
+
+    def candidates(self, path):
+        for combined_regex, routes, markers in self._blocks:
+            if combined_regex is None:
+                route = routes[0]
+                path_match = route.path_regex.match(path)
+                if path_match is not None:
+                    yield route, _extract_path_vars(path_match)
+                continue
+
+            combined_match = combined_regex.match(path)
+            if combined_match is None:
+                continue
+
+            position, first_group = markers[combined_match.lastgroup]
+            yield routes[position], self._slice_path_vars(
+                routes[position], combined_match, first_group)
+
+            # only reached when routing fell through the endpoint
+            # above on its method_spec or pred
+            for route in routes[position + 1:]:
+                path_match = route.path_regex.match(path)
+                if path_match is not None:
+                    yield route, _extract_path_vars(path_match)
+
+
+class _LiteralPathLane:
+    # Sits in front of whichever router engine was chosen. Endpoints
+    # with literal path_specs (like '/widgets') are kept out of the
+    # engine and indexed by their path instead, so a request for a
+    # literal path is routed with one dict lookup and never touches
+    # the regex table. Endpoints with PathTemplate path_specs are
+    # kept out of the engine too, and go in a _SegmentTrie.
+    #
+    # To keep registration order semantics, the candidates for a
+    # literal path are *every* endpoint that matches it, literal or
+    # regex, in registration order. That list is worked out with one
+    # linear scan the first time the path is requested, and reused
+    # after that. Any other path can't match a literal path_spec, so
+    # it goes straight to the trie and the engine, whose candidates
+    # are merged back into registration order.
+
+    def __init__(self, routes, router_engine):
+        self._routes = tuple(routes)
+        self._literal_candidates = {
+            route.path_spec: None
+            for route in self._routes
+            if route.is_literal
+        }
+        template_routes = [
+            route
+            for route in self._routes
+            if route.path_template is not None
+        ]
+        regex_routes = [
+            route
+            for route in self._routes
+            if not route.is_literal
+            and route.path_template is None
+        ]
+        self._trie = (
+            _SegmentTrie(template_routes)
+            if template_routes else None
+        )
+        self._engine_routes = tuple(regex_routes)
+        self._engine = (
+            router_engine(regex_routes)
+            if regex_routes or not template_routes else None
+        )
+        self._linear = _LinearPathMatcher(self._routes)
+
+    def prepare(self):
+        # work out the candidates for every literal path up front,
+        # rather than on the first request for each
+        for path in self._literal_candidates:
+            if self._literal_candidates[path] is None:
+                self._literal_candidates[path] = tuple(
+                    self._linear.candidates(path))
+
+    def candidates(self, path):
+        if path in self._literal_candidates:
+            literal_candidates = self._literal_candidates[path]
+            if literal_candidates is None:
+                literal_candidates = tuple(self._linear.candidates(path))
+                self._literal_candidates[path] = literal_candidates
+            # hand out copies, the chosen path_vars end up on the
+            # Request object where handlers are free to modify them
+            return (
+                (route, dict(path_vars))
+                for route, path_vars in literal_candidates
+            )
+        elif path.endswith('\n'):
+            # '$' also matches just before a trailing newline, so this
+            # path may match a literal path_spec without equaling it.
+            # rare enough to simply fall back to the linear scan
+            return self._linear.candidates(path)
+        elif self._trie is None:
+            return self._engine.candidates(path)
+        elif self._engine is None:
+            return self._trie.candidates(path)
+        else:
+            return _heapq.merge(
+                self._trie.candidates(path),
+                self._engine.candidates(path),
+                key=lambda candidate: candidate[0].position
+            )
+
+
+class _AdaptiveRouteOrder:
+    # Opt-in (see WsgiApp's route_reorder_interval). Counts how often
+    # each endpoint is routed to and, every interval routed requests,
+    # rebuilds the router engine of a _LiteralPathLane with its
+    # endpoints hottest first, so that hot endpoints registered late
+    # stop paying for a scan of every endpoint before them.
+    #
+    # Only endpoints whose path_specs can never both match one path
+    # are ever reordered relative to each other. Endpoints that might
+    # overlap keep their registration order, so, for any path, the
+    # matching endpoints still come out of the engine in registration
+    # order, and routing decisions are exactly those of the
+    # registration order. Whether two path_specs can overlap is
+    # decided by _literal_affixes: they are known to be disjoint if
+    # their literal prefixes differ, or their literal suffixes do.
+    #
+    # The new engine is swapped in with a single attribute assignment,
+    # so requests being routed at the same time see either the old
+    # order or the new one. The hit counts themselves are only
+    # approximate when threads race to update them, which is fine.
+
+    def __init__(self, lane, router_engine, interval):
+        self._lane = lane
+        self._router_engine = router_engine
+        self._interval = interval
+        self._routes = lane._engine_routes
+        # by route position, which counts every route of the app, not
+        # just this lane's, once there are per host tables
+        self._hits = dict.fromkeys(
+            (route.position for route in lane._routes), 0)
+        self._until_reorder = interval
+        self._reorder_lock = _threading.Lock()
+        # for each engine route (by index into _routes), the indexes
+        # of the later ones it might overlap; worked out on the first
+        # reorder, since many apps never get that far
+        self._must_precede = None
+        self.gave_up = False
+        self.reorders = 0
+        self.conflicts = None
+
+    def record(self, route):
+        if route.position is None:
+            return
+        self._hits[route.position] += 1
+        self._until_reorder -= 1
+        if self._until_reorder <= 0 and not self.gave_up:
+            self._until_reorder = self._interval
+            self.reorder()
+
+    def reorder(self):
+        # only one thread needs to do this; others just carry on
+        if not self._reorder_lock.acquire(blocking=False):
+            return
+        try:
+            if self._must_precede is None:
+                self._must_precede = self._find_conflicts()
+                if self._must_precede is None:
+                    self.gave_up = True
+                    return
+
+            order = self._hottest_first_order()
+            # older traffic counts for less and less
+            self._hits = {
+                position: hits // 2
+                for position, hits in self._hits.items()
+            }
+
+            routes = tuple(self._routes[index] for index in order)
+            if routes != self._lane._engine.routes:
+                self._lane._engine = self._router_engine(routes)
+                self.reorders += 1
+        finally:
+            self._reorder_lock.release()
+
+    def _find_conflicts(self):
+        # pairs of routes whose prefixes are compatible (one is a
+        # prefix of the other) are found with a sorted list of the
+        # prefixes; only those are checked for compatible suffixes
+        affixes = [
+            _literal_affixes(route.path_regex) for route in self._routes
+        ]
+        by_prefix = sorted(
+            range(len(self._routes)), key=lambda index: affixes[index][0])
+        sorted_prefixes = [affixes[index][0] for index in by_prefix]
+
+        must_precede = [[] for _ in self._routes]
+        comparisons = 0
+        conflicts = 0
+        for index, (prefix, suffix) in enumerate(affixes):
+            start = _bisect.bisect_left(sorted_prefixes, prefix)
+            stop = _bisect.bisect_left(sorted_prefixes, prefix + '\U0010ffff')
+            comparisons += stop - start
+            if comparisons > _ROUTE_ORDER_MAX_COMPARISONS:
+                return None
+            for other in by_prefix[start:stop]:
+                other_prefix, other_suffix = affixes[other]
+                if other == index or (
+                        other_prefix == prefix and other < index):
+                    # each pair of equal prefixes is seen twice
+                    continue
+                if (suffix.endswith(other_suffix)
+                        or other_suffix.endswith(suffix)):
+                    conflicts += 1
+                    must_precede[min(index, other)].append(
+                        max(index, other))
+
+        self.conflicts = conflicts
+        return must_precede
+
+    def _hottest_first_order(self):
+        # a topological sort of the routes (Kahn's algorithm) taking
+        # the hottest available route each time, and the earliest
+        # registered one on ties
+        must_precede = self._must_precede
+        waiting_on = [0] * len(self._routes)
+        for later_indexes in must_precede:
+            for later in later_indexes:
+                waiting_on[later] += 1
+
+        hits = self._hits
+        positions = [route.position for route in self._routes]
+        ready = [
+            (-hits[positions[index]], index)
+            for index in range(len(self._routes))
+            if not waiting_on[index]
+        ]
+        _heapq.heapify(ready)
+
+        order = []
+        while ready:
+            _, index = _heapq.heappop(ready)
+            order.append(index)
+            for later in must_precede[index]:
+                waiting_on[later] -= 1
+                if not waiting_on[later]:
+                    _heapq.heappush(
+                        ready, (-hits[positions[later]], later))
+
+        return order
+
+
+class _LRUCache:
+    # A bounded mapping that evicts its least recently used entry
+    # once it holds maxsize entries, and counts its hits, misses and
+    # evictions. It is shared by every request a wsgi server is
+    # handling at the same time, hence the lock.
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = _collections.OrderedDict()
+        self._lock = _threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def info(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'maxsize': self.maxsize
+            }
+
+
+class _PredProfiler:
+    # Opt-in (see WsgiApp's profile_preds). Counts and times every call
+    # routing makes to each endpoint's pred, and counts the calls a
+    # pred_key saved. It is shared by every request a wsgi server is
+    # handling at the same time, hence the lock.
+
+    def __init__(self):
+        # maps preds to [calls, passed, total_seconds, max_seconds,
+        # memo_hits]
+        self._stats = {}
+        self._lock = _threading.Lock()
+
+    def _stats_for(self, pred):
+        stats = self._stats.get(pred)
+        if stats is None:
+            stats = self._stats[pred] = [0, 0, 0.0, 0.0, 0]
+        return stats
+
+    def record_call(self, pred, passed, seconds):
+        with self._lock:
+            stats = self._stats_for(pred)
+            stats[0] += 1
+            if passed:
+                stats[1] += 1
+            stats[2] += seconds
+            if seconds > stats[3]:
+                stats[3] = seconds
+
+    def record_memo_hit(self, pred):
+        with self._lock:
+            self._stats_for(pred)[4] += 1
+
+    def info(self):
+        with self._lock:
+            return {
+                pred: {
+                    'calls': calls,
+                    'passed': passed,
+                    'total_seconds': total_seconds,
+                    'max_seconds': max_seconds,
+                    'memo_hits': memo_hits
+                }
+                for pred, (calls, passed, total_seconds, max_seconds,
+                           memo_hits) in self._stats.items()
+            }
+
+
+_ROUTER_ENGINES = {
+    'linear': _LinearPathMatcher,
+    'combined_regex': _CombinedRegexPathMatcher
+}
+
+
+class _OptionsRoute:
+    # Stands in for a _Route when WsgiApp's auto_options answers an
+    # OPTIONS request no endpoint allowed, and has the attributes
+    # WsgiApp.handle_request reads from the route it is given.
+
+    __slots__ = ('position', 'path_spec', 'method_spec', 'pred', 'req_handler')
+
+    def __init__(self, path_specs, allow_header):
+        self.position = None
+        self.path_spec = path_specs
+        self.method_spec = ['OPTIONS']
+        self.pred = None
+
+        def handle_options(app, req):
+            return Response(204, {'Allow': allow_header}, b'')
+
+        self.req_handler = handle_options
+
+
+class _AllowAnswer:
+    # What a set of path_specs that all matched a request allow:
+    # the methods registered on them, the Allow header value naming
+    # those methods (plus OPTIONS, if WsgiApp's auto_options is on),
+    # and the _OptionsRoute that answers OPTIONS requests for them.
+
+    __slots__ = ('allowed_methods', 'allow_header', 'options_route')
+
+    def __init__(self, path_specs, allowed_methods, auto_options):
+        self.allowed_methods = allowed_methods
+        self.allow_header = _format_allow_header(
+            allowed_methods | {'OPTIONS'} if auto_options
+            else allowed_methods
+        )
+        self.options_route = (
+            _OptionsRoute(path_specs, self.allow_header)
+            if auto_options else None
+        )
+
+
+class _RouteTable:
+    # The endpoints routing picks between for a request: all of them,
+    # in an app that doesn't use register_endpoint's host argument, or
+    # else those registered for one host (or for no host in particular,
+    # in the default table). Each has its own path matcher, route
+    # order and Allow answers, so routing in one never scans the
+    # endpoints of another.
+
+    __slots__ = (
+        'host',
+        'routes',
+        'path_matcher',
+        'route_order',
+        'allowed_methods',
+        'auto_options',
+        'single_allow_answers',
+        'allow_answers'
+    )
+
+    def __init__(
+        self,
+        host,
+        routes,
+        router_engine,
+        auto_options,
+        route_reorder_interval
+    ):
+        self.host = host
+        self.routes = tuple(routes)
+        self.path_matcher = _LiteralPathLane(self.routes, router_engine)
+        self.route_order = (
+            _AdaptiveRouteOrder(
+                self.path_matcher, router_engine, route_reorder_interval)
+            if route_reorder_interval and self.path_matcher._engine_routes
+            else None
+        )
+
+        allowed_methods = {}
+        for route in self.routes:
+            allowed_methods.setdefault(
+                route.path_spec, set()).update(route.methods)
+        self.allowed_methods = {
+            path_spec: frozenset(methods)
+            for path_spec, methods in allowed_methods.items()
+        }
+
+        # maps frozensets of path_specs that all matched some path to
+        # their _AllowAnswer. Sets of one path_spec are done up front,
+        # since paths nearly always match just one, and are kept apart
+        # in single_allow_answers too, which is never changed
+        self.auto_options = auto_options
+        self.single_allow_answers = {
+            frozenset([path_spec]): _AllowAnswer(
+                [path_spec], methods, auto_options)
+            for path_spec, methods in self.allowed_methods.items()
+        }
+        self.allow_answers = dict(self.single_allow_answers)
+
+    def allow_answer(self, matching_path_specs):
+        path_specs = frozenset(matching_path_specs)
+        allow_answers = self.allow_answers
+        try:
+            return allow_answers[path_specs]
+        except KeyError:
+            pass
+
+        allowed_methods = frozenset().union(*(
+            self.allowed_methods[path_spec] for path_spec in path_specs
+        ))
+        allow_answer = _AllowAnswer(
+            list(matching_path_specs), allowed_methods, self.auto_options)
+
+        # keep the single path_spec answers, and a bounded number of
+        # the rest. Other threads may be adding to allow_answers, so
+        # rather than being emptied out in place, it is replaced with
+        # a fresh copy of the single path_spec answers, in a single
+        # assignment
+        if len(allow_answers) >= (
+                len(self.allowed_methods) + _ALLOW_ANSWER_CACHE_MAXSIZE):
+            allow_answers = dict(self.single_allow_answers)
+            allow_answers[path_specs] = allow_answer
+            self.allow_answers = allow_answers
+        else:
+            allow_answers[path_specs] = allow_answer
+
+        return allow_answer
+
+    def list_path_specs(self):
+        return [route.path_spec for route in self.routes]
+
+
+class _MountTrie:
+    # Holds the WsgiApps mounted under path prefixes, keyed one path
+    # segment per level, so finding the app a path belongs to walks
+    # one level per segment of the path no matter how many apps are
+    # mounted. The longest mounted prefix wins, and prefixes only
+    # match whole segments: '/v1' matches '/v1' and '/v1/widgets',
+    # but not '/v10'.
+
+    def __init__(self, mount_table):
+        self._root = self._new_node()
+        for mount in mount_table:
+            node = self._root
+            for segment in mount['prefix'].split('/')[1:]:
+                node = node['children'].setdefault(segment, self._new_node())
+            node['mount'] = (mount['prefix'], mount['app'])
+
+    def _new_node(self):
+        return {'children': {}, 'mount': None}
+
+    def find(self, path):
+        # the (prefix, app) mounted at the longest prefix of path, or
+        # None if path is under no mounted prefix
+        if not path.startswith('/'):
+            return None
+        found = None
+        node = self._root
+        for segment in path.split('/')[1:]:
+            node = node['children'].get(segment)
+            if node is None:
+                break
+            if node['mount'] is not None:
+                found = node['mount']
+        return found
+
+
+class _DispatchPlan:
+    # Everything WsgiApp needs to route a request and choose an err
+    # handler, compiled from its _endpoint_table and _err_handler_table
+    # into tuples and __slots__ objects: precompiled path_specs, method
+    # sets rather than method_spec lists, and the set of methods
+    # allowed on each distinct path_spec, in one _RouteTable per host
+    # endpoints were registered for plus the default one. An unfrozen
+    # WsgiApp builds a plan lazily and throws it away whenever
+    # something is registered; WsgiApp.freeze builds the final one up
+    # front. Which endpoints, err handlers and mounts a plan has never
+    # changes, but a few things worked out from them are filled in or
+    # swapped while requests are being handled:
+    #
+    # - the engine a table's route_order (if any) swaps in, with its
+    #   hit counts;
+    # - each table's allow_answers, for sets of path_specs that
+    #   matched together;
+    # - err_handler_cache, for exception classes seen;
+    # - the candidates of each literal path in a table's path_matcher,
+    #   unless prepare has already worked them all out.
+    #
+    # Each is either added to a key at a time, with a value any thread
+    # would work out the same, or replaced whole with one assignment,
+    # so threads routing at the same time never need a lock (the hit
+    # counts are only approximate when threads race; see
+    # _AdaptiveRouteOrder).
+
+    __slots__ = (
+        'routes',
+        'default_table',
+        'host_tables',
+        'mounts',
+        'err_handlers',
+        'err_handler_cache'
+    )
+
+    def __init__(
+        self,
+        endpoint_table,
+        err_handler_table,
+        router_engine,
+        auto_options,
+        route_reorder_interval,
+        mount_table=()
+    ):
+        self.routes = tuple(
+            _Route(position, endpoint)
+            for position, endpoint in enumerate(endpoint_table)
+        )
+
+        routes_by_host = {None: []}
+        for route in self.routes:
+            routes_by_host.setdefault(route.host, []).append(route)
+        tables = {
+            host: _RouteTable(
+                host, routes, router_engine, auto_options,
+                route_reorder_interval)
+            for host, routes in routes_by_host.items()
+        }
+        self.default_table = tables.pop(None)
+        # maps exact hosts ('api.example.com') and wildcard ones
+        # ('*.example.com') to their tables. Empty unless register_endpoint
+        # was given a host, in which case routing looks here first
+        self.host_tables = tables
+
+        # None unless some WsgiApp has been mounted (see WsgiApp.mount),
+        # so that apps without any pay nothing for them
+        self.mounts = _MountTrie(mount_table) if mount_table else None
+
+        self.err_handlers = tuple(
+            _ErrHandler(err_handler_entry)
+            for err_handler_entry in err_handler_table
+        )
+        # maps exception classes to the _ErrHandler (or None)
+        # WsgiApp._choose_err_handler picked for them
+        self.err_handler_cache = {}
+
+    def table_for(self, host):
+        # the table for a normalized host: an exact match, else the
+        # wildcard host with the longest suffix matching, else default
+        host_tables = self.host_tables
+        if host is None or not host_tables:
+            return self.default_table
+
+        table = host_tables.get(host)
+        if table is not None:
+            return table
+
+        dot = host.find('.')
+        while dot != -1:
+            table = host_tables.get('*' + host[dot:])
+            if table is not None:
+                return table
+            dot = host.find('.', dot + 1)
+
+        return self.default_table
+
+    def tables(self):
+        return [self.default_table] + list(self.host_tables.values())
+
+    def match_err_handler(self, exc_type):
+        # the first _ErrHandler whose exceptions_list exc_type is a
+        # subclass of, or None
+        for err_handler in self.err_handlers:
+            if issubclass(exc_type, err_handler.exceptions_list):
+                return err_handler
+        return None
+
+    def prepare(self):
+        # finish anything that would otherwise be built lazily
+        # while handling requests
+        for table in self.tables():
+            table.path_matcher.prepare()
+
+        # and choose err handlers for the exceptions routing raises and
+        # the ones err handlers were registered for, which are the
+        # exceptions most requests that fail will fail with
+        exc_types = [NoMatchingPathError, NoMatchingMethodError,
+                     NoMatchingPredError]
+        for err_handler in self.err_handlers:
+            exc_types.extend(err_handler.exceptions_list)
+        for exc_type in exc_types[:_ERR_HANDLER_CACHE_MAXSIZE]:
+            self.err_handler_cache[exc_type] = self.match_err_handler(
+                exc_type)
+
+
 class WsgiApp:
 
     def __init__(
         self,
         logger,
-        default_fallback_err_res
+        default_fallback_err_res,
+        router_engine='linear',
+        route_cache_size=0,
+        not_found_cache_size=0,
+        auto_options=False,
+        route_reorder_interval=0,
+        profile_preds=False,
+        pred_cache_size=1024,
+        path_spec_policy='warn'
     ):
         """
         Creates the WsgiApp object. The WsgiApp
@@ -718,12 +2569,88 @@ class WsgiApp:
         :param httpglue.Response default_fallback_err_res: the response
            to send back in the case of unhandled errors
 
+        :param str router_engine: how the path_specs of registered
+           endpoints are matched against incoming request paths.
+           'linear' (the default) tries each path_spec in turn.
+           'combined_regex' merges consecutive path_specs, up to 16 at
+           a time, into alternation regexes, so that one scan of each
+           block finds its first matching endpoint, which is faster
+           for apps with many endpoints; path_specs that can't be
+           merged (with backreferences, conditionals or global inline
+           flags) are tried on their own, in their place. With either
+           engine, endpoints with literal path_specs (no regex special
+           chars, like '/widgets') are found with a dict lookup, and
+           those with PathTemplate path_specs with a trie of path
+           segments. Both engines route every request identically;
+           endpoints are always tried in the order that they were
+           registered.
+
+        :param int route_cache_size: if greater than 0, the app
+           remembers the routing decision (endpoint and path_vars) for
+           up to this many (method, path) pairs, evicting the least
+           recently used one when full. Only decisions made without
+           running any endpoint's pred are remembered, and the cache is
+           emptied whenever an endpoint is registered. 0 (the default)
+           turns the cache off. See routing_stats for its hit, miss
+           and eviction counts.
+
+        :param int not_found_cache_size: if greater than 0, the app
+           remembers up to this many recently requested paths that
+           matched no endpoint's path_spec at all, so repeats of them
+           go straight to raising NoMatchingPathError without trying
+           any path_specs. It is emptied whenever an endpoint is
+           registered. 0 (the default) turns the cache off.
+
+        :param bool auto_options: if True, an OPTIONS request to a path
+           that some endpoint's path_spec matches, but whose method_spec
+           doesn't allow OPTIONS, is answered by the framework with a
+           204 response whose Allow header lists the methods allowed on
+           that path (OPTIONS included), rather than raising
+           NoMatchingMethodError. Endpoints registered for OPTIONS still
+           handle it themselves. False (the default) leaves all
+           OPTIONS handling to the app.
+
+        :param int route_reorder_interval: if greater than 0, the app
+           counts how often each endpoint with a regex path_spec is
+           routed to, and after every this many routed requests has its
+           router engine try those endpoints hottest first. Only
+           endpoints whose path_specs provably can never match the same
+           path are reordered relative to each other, so every request
+           is still routed exactly as registration order says it should
+           be; requests for hot endpoints registered late just get
+           there sooner. 0 (the default) keeps the registration order.
+           See routing_stats for how many times the order changed.
+
+        :param bool profile_preds: if True, the app counts and times
+           every call routing makes to each endpoint's pred, so you can
+           see which preds are costing you latency. See routing_stats.
+           False (the default) turns the timing off.
+
+        :param int pred_cache_size: how many results of preds of
+           endpoints registered with a pred_key (see register_endpoint)
+           the app remembers across requests, evicting the least
+           recently used one when full. 0 means such results are only
+           remembered for the rest of the request being routed. The
+           default is 1024.
+
+        :param str path_spec_policy: what register_endpoint does about
+           regex path_specs that may take more than linear time to
+           match against a long, crafted path (see register_endpoint
+           for the subset that is known to be safe). 'warn' (the
+           default) logs a warning with the app's logger, 'strict'
+           rejects them with a ValueError, and 'permissive' accepts
+           them silently.
+
         :rtype httpglue.WsgiApp: the newly constructed httpglue WsgiApp
         """
-        if not isinstance(logger, _logging.Logger):
+        # logging is only imported by the time a WsgiApp is made, as
+        # whoever made its logger has already imported it
+        import logging
+
+        if not isinstance(logger, logging.Logger):
             raise TypeError(
              'expected logger to be of type '
-             '%s. got %s' % (_logging.Logger, type(logger)))
+             '%s. got %s' % (logging.Logger, type(logger)))
 
         self.logger = logger
 
@@ -736,25 +2663,107 @@ class WsgiApp:
         # itself (not the http spec) enforces with regards to header
         # values. Since the default_fallback_err_res should always be
         # able to be sent without error, we must ensure this here
-        for header_val in default_fallback_err_res.headers.values():
-            if not set(header_val) & set('\t\r\n\0\a\b\v\f') == set():
+        for _, header_val in default_fallback_err_res.headers._pairs:
+            if _find_wsgi_forbidden_char(header_val) is not None:
                 raise ValueError(
                     'wsgi has a special stipulation that header values '
                     'must not contain control characters. Control '
                     'characters %s were found in %s' %
-                    (str(set(header_val) & set('\t\r\n\0\a\b\v\f')),
+                    (str(set(header_val) & set(_WSGI_FORBIDDEN_CHARS)),
                     header_val))
 
         self.default_fallback_err_res = default_fallback_err_res
 
+        if router_engine not in _ROUTER_ENGINES:
+            raise ValueError(
+                'expected router_engine to be one of %s. got %r' % (
+                    sorted(_ROUTER_ENGINES), router_engine))
+
+        self.router_engine = router_engine
+
+        if type(route_cache_size) is not int:
+            raise TypeError(
+                'expected route_cache_size to be of type int. '
+                'got %s' % type(route_cache_size))
+        if route_cache_size < 0:
+            raise ValueError(
+                'expected route_cache_size to be 0 or more. '
+                'got %s' % route_cache_size)
+
+        self._route_cache = (
+            _LRUCache(route_cache_size) if route_cache_size else None
+        )
+
+        if type(not_found_cache_size) is not int:
+            raise TypeError(
+                'expected not_found_cache_size to be of type int. '
+                'got %s' % type(not_found_cache_size))
+        if not_found_cache_size < 0:
+            raise ValueError(
+                'expected not_found_cache_size to be 0 or more. '
+                'got %s' % not_found_cache_size)
+
+        self._not_found_cache = (
+            _LRUCache(not_found_cache_size) if not_found_cache_size else None
+        )
+
+        if type(auto_options) is not bool:
+            raise TypeError(
+                'expected auto_options to be of type bool. '
+                'got %s' % type(auto_options))
+
+        self.auto_options = auto_options
+
+        if type(route_reorder_interval) is not int:
+            raise TypeError(
+                'expected route_reorder_interval to be of type int. '
+                'got %s' % type(route_reorder_interval))
+        if route_reorder_interval < 0:
+            raise ValueError(
+                'expected route_reorder_interval to be 0 or more. '
+                'got %s' % route_reorder_interval)
+
+        self.route_reorder_interval = route_reorder_interval
+
+        if type(profile_preds) is not bool:
+            raise TypeError(
+                'expected profile_preds to be of type bool. '
+                'got %s' % type(profile_preds))
+
+        self._pred_profiler = _PredProfiler() if profile_preds else None
+
+        if type(pred_cache_size) is not int:
+            raise TypeError(
+                'expected pred_cache_size to be of type int. '
+                'got %s' % type(pred_cache_size))
+        if pred_cache_size < 0:
+            raise ValueError(
+                'expected pred_cache_size to be 0 or more. '
+                'got %s' % pred_cache_size)
+
+        self._pred_cache = (
+            _LRUCache(pred_cache_size) if pred_cache_size else None
+        )
+
+        if path_spec_policy not in _PATH_SPEC_POLICIES:
+            raise ValueError(
+                'expected path_spec_policy to be one of %s. got %r' % (
+                    list(_PATH_SPEC_POLICIES), path_spec_policy))
+
+        self.path_spec_policy = path_spec_policy
+
         """
         The _endpoint_table attribute below will have a stucture like this:
 
         [
             {
                 'path_spec': '/widgets/(\\d*)',
+                'path_regex': re.compile('^/widgets/(\\d*)$'),
+                'is_literal': False,
                 'method_spec': ['GET', 'POST'],
                 'pred': None,
+                'pred_key': None,
+                'host': None,
                 'req_handler': f
             },
             ...
@@ -762,6 +2771,7 @@ class WsgiApp:
         """
         self._endpoint_table = []
 
+
         """
         The err_routing_table attribute below will have a stucture
         like this:
@@ -776,6 +2786,30 @@ class WsgiApp:
         """
         self._err_handler_table = []
 
+        """
+        The _mount_table attribute below will have a structure like
+        this:
+
+        [
+            {
+                'prefix': '/v1',
+                'app': sub_app
+            }
+        ]
+        """
+        self._mount_table = []
+
+        # the _DispatchPlan compiled from the three tables above. It is
+        # built the first time a request is handled, and thrown away
+        # whenever an endpoint or err handler is registered, unless the
+        # app is frozen (see freeze), in which case it is final
+        self._plan = None
+        self._frozen = False
+
+        # True once any endpoint has been registered for a particular
+        # host, after which routing looks at the host of each request
+        self._routes_by_host = False
+
     def __call__(self, environ, start_response):
         """
         Implements the wsgi application entrypoint. The presence
@@ -797,31 +2831,38 @@ class WsgiApp:
         :rtype list: a list of bytes
         """
         try:
-            req_headers = {
-                self._extract_header_name(key): str(val)
-                for (key, val) in environ.items()
-                if key.startswith('HTTP_')
-            }
-            if 'CONTENT_TYPE' in environ:
-                req_headers['Content-Type'] = str(environ['CONTENT_TYPE'])
-            if 'CONTENT_LENGTH' in environ:
-                req_headers['Content-Length'] = str(environ['CONTENT_LENGTH'])
+            # headers are only read out of the environ as they are
+            # asked for, and validated then
+            req_headers = _EnvironHeaders(environ)
 
             # The usage of the .get(VAR, '') idiom below is due
             # to the stipulations in the wsgi spec stating that
             # some of these keys must be present, but may be absent
             # if their value is the empty str. Leave this idiom alone
-            # for maximum portability amongst wsgi servers.
-            req = Request(
+            # for maximum portability amongst wsgi servers. The
+            # Request is made without the checks of its setters: wsgi
+            # guarantees these are all strs, and the body bytes. Only
+            # the rule that neither path nor query_str has a '?' in it
+            # is left to check, which the rest of the framework (like
+            # mount dispatch, setting req.path) relies on
+            path = environ.get('PATH_INFO', '')
+            query_str = environ.get('QUERY_STRING', '')
+            if '?' in path or '?' in query_str:
+                raise ValueError(
+                    'a ? was in the path %s or the query_str %s '
+                    'of the request' % (path, query_str)
+                )
+            req = Request._from_trusted(
                 method=environ['REQUEST_METHOD'],
-                path=environ.get('PATH_INFO', ''),
-                query_str=environ.get('QUERY_STRING', ''),
+                path=path,
+                query_str=query_str,
                 headers=req_headers,
                 body=environ['wsgi.input'].read(),
                 host=environ['SERVER_NAME'],
                 port=int(environ['SERVER_PORT']),
                 proto=environ['wsgi.url_scheme'],
                 http_version=environ.get('SERVER_PROTOCOL', ''),
+                path_vars={},
                 start_time=_datetime.datetime.now()
             )
 
@@ -851,15 +2892,19 @@ class WsgiApp:
                 else ' '.join([res.status, res.reason])
             )
 
-            for header_val in res.headers.values():
-                if not set(header_val) & set('\t\r\n\0\a\b\v\f') == set():
+            for _, header_val in res.headers._pairs:
+                if _find_wsgi_forbidden_char(header_val) is not None:
                     raise ValueError(
                         'wsgi has a special stipulation that header '
                         'values must not contain control characters. '
                         'Control characters %s were found in %s' %
-                        (str(set(header_val) & set('\t\r\n\0\a\b\v\f')),
+                        (str(set(header_val) & set(_WSGI_FORBIDDEN_CHARS)),
                         header_val))
-            wsgi_res_headers = list(res.headers.items())
+            # the server may add to the list it is given (wsgiref adds
+            # Date and Content-Length), so it gets a copy of the pairs,
+            # which is one flat copy rather than a list built pair by
+            # pair, and the Response's own headers stay as they were
+            wsgi_res_headers = res.headers._pairs.copy()
 
             wsgi_res_body = res.body
 
@@ -880,42 +2925,59 @@ class WsgiApp:
                 if not res.reason
                 else ' '.join([res.status, res.reason])
             )
-            wsgi_res_headers = list(res.headers.items())
+            wsgi_res_headers = res.headers._pairs.copy()
             wsgi_res_body = res.body
 
             start_response(wsgi_res_status_str, wsgi_res_headers)
             return [wsgi_res_body]
 
-    def _extract_header_name(self, wsgi_environ_key):
-        if not wsgi_environ_key.startswith('HTTP_'):
-            raise ValueError('only HTTP_ Vars should be passed in')
-
-        # remove HTTP_ prefix
-        wsgi_environ_key = wsgi_environ_key[5:]
-        # lowecase the whole thing
-        wsgi_environ_key = wsgi_environ_key.lower()
-        # replace _ with -
-        wsgi_environ_key = wsgi_environ_key.replace('_', '-')
-        # uppercase first letter of each part
-        wsgi_environ_key = '-'.join(
-            f'{x[0].upper()}{x[1:]}'
-            for x in wsgi_environ_key.split('-'))
-
-        return wsgi_environ_key
-
-    def _extract_path_vars(self, path_spec, path):
-        pattern = f'^{path_spec}$'
-        path_vars = {}
-        path_vars.update(enumerate(_re.match(pattern, path).groups()))
-        path_vars.update(_re.match(pattern, path).groupdict())
-        return path_vars
+    def _compile_path_spec(self, path_spec):
+        # path_specs are compiled once, here at registration time,
+        # so that routing a request never has to build or look up a
+        # pattern; a bad regex is reported now rather than on the
+        # first request that happens to reach it
+        if isinstance(path_spec, PathTemplate):
+            return path_spec._regex
+
+        try:
+            path_regex = _re.compile(f'^{path_spec}$')
+        except _re.error as e:
+            raise ValueError(
+                'The path_spec %r is not a valid regex: %s' % (
+                    path_spec, e)
+            ) from e
+
+        # path_specs run against attacker controlled paths, so the
+        # ones in the subset known to match in linear time are
+        # compiled so they never backtrack, and the rest are reported
+        # as path_spec_policy says
+        linear_time_pattern = _linear_time_pattern(path_spec)
+        if linear_time_pattern is not None:
+            return _re.compile(f'^{linear_time_pattern}$')
+
+        if self.path_spec_policy == 'strict':
+            raise ValueError(
+                'The path_spec %r is outside the subset of regexes '
+                'httpglue can match in linear time, and the app\'s '
+                'path_spec_policy is strict' % path_spec)
+        elif self.path_spec_policy == 'warn':
+            self.logger.warning(
+                'The path_spec %r is outside the subset of regexes '
+                'httpglue can match in linear time; a long, crafted path '
+                'could make matching it slow', path_spec)
+
+        return path_regex
 
     def _validate_path_spec(self, path_spec):
+        if isinstance(path_spec, PathTemplate):
+            # already validated when the PathTemplate was made
+            return
+
         is_str_type = isinstance(path_spec, str)
         if not is_str_type:
             raise TypeError(
-                'expected path_spec to be of type str. '
-                'got %s' % type(path_spec)
+                'expected path_spec to be of type str or '
+                'httpglue.PathTemplate. got %s' % type(path_spec)
             )
         starts_with_carrot = path_spec.startswith('^')
         if starts_with_carrot:
@@ -957,13 +3019,13 @@ class WsgiApp:
                 'got types %s' % list(e_type for e_type in excs_list))
 
     def _validate_req_handler(self, f):
-        call_signature = _inspect.signature(f)
+        call_signature = _signature(f)
 
         params_right_length = len(call_signature.parameters) == 2
 
         params_right_kind = all(
-            param.kind == _inspect.Parameter.POSITIONAL_OR_KEYWORD
-            and param.default == _inspect.Parameter.empty
+            param.kind == param.POSITIONAL_OR_KEYWORD
+            and param.default == param.empty
             for param in call_signature.parameters.values()
         )
 
@@ -979,14 +3041,14 @@ class WsgiApp:
             )
 
     def _validate_pred(self, f):
-        call_signature = _inspect.signature(f)
+        call_signature = _signature(f)
 
         params_right_length = len(call_signature.parameters) == 1
 
         param = list(call_signature.parameters.values())[0]
         param_right_kind = (
-            param.kind == _inspect.Parameter.POSITIONAL_OR_KEYWORD
-            and param.default == _inspect.Parameter.empty
+            param.kind == param.POSITIONAL_OR_KEYWORD
+            and param.default == param.empty
         )
 
         if not (params_right_length and param_right_kind):
@@ -1000,14 +3062,55 @@ class WsgiApp:
                 )
             )
 
+    def _validate_pred_key(self, f):
+        call_signature = _signature(f)
+
+        params = list(call_signature.parameters.values())
+        params_right = len(params) == 1 and (
+            params[0].kind == params[0].POSITIONAL_OR_KEYWORD
+            and params[0].default == params[0].empty
+        )
+
+        if not params_right:
+            raise ValueError(
+                'a valid pred_key must be a callable '
+                'that takes in a single positional argument, but '
+                'the passed %s callable had a signature of '
+                '%s' % (
+                    getattr(f, '__name__', 'Unnamed'),
+                    call_signature
+                )
+            )
+
+    def _validate_host(self, host):
+        # returns the host normalized
+        if not isinstance(host, str):
+            raise TypeError(
+                'expected host to be of type str. got %s' % type(host))
+
+        normalized_host = _normalize_host(host)
+        name = (
+            normalized_host[2:] if normalized_host.startswith('*.')
+            else normalized_host
+        )
+        if (not name
+                or normalized_host != host.lower().rstrip('.')
+                or set(name) & (_SEP_CHARS - {'[', ']', ':'} | {'*'})):
+            raise ValueError(
+                'expected host to be a host name like api.example.com, '
+                'or a wildcard host like *.example.com, without a port. '
+                'got %r' % host)
+
+        return normalized_host
+
     def _validate_err_handler(self, f):
-        call_signature = _inspect.signature(f)
+        call_signature = _signature(f)
 
         params_right_length = len(call_signature.parameters) == 3
 
         params_right_kind = all(
-            param.kind == _inspect.Parameter.POSITIONAL_OR_KEYWORD
-            and param.default == _inspect.Parameter.empty
+            param.kind == param.POSITIONAL_OR_KEYWORD
+            and param.default == param.empty
             for param in call_signature.parameters.values()
         )
 
@@ -1022,8 +3125,55 @@ class WsgiApp:
                 )
             )
 
+    def _get_plan(self):
+        plan = self._plan
+        if plan is None:
+            plan = self._build_plan()
+            self._plan = plan
+        return plan
+
+    def _build_plan(self):
+        return _DispatchPlan(
+            self._endpoint_table,
+            self._err_handler_table,
+            _ROUTER_ENGINES[self.router_engine],
+            self.auto_options,
+            self.route_reorder_interval,
+            self._mount_table)
+
     def _choose_endpoint(self, req):
+        # only apps with endpoints registered for particular hosts
+        # route on the host at all
+        if self._routes_by_host:
+            host = _normalize_host(
+                req.headers.get('Host') or req.host or '')
+            route_key = (req.method, req.path, host)
+            path_key = (req.path, host)
+        else:
+            host = None
+            route_key = (req.method, req.path)
+            path_key = req.path
+
+        route_cache = self._route_cache
+        if route_cache is not None:
+            cached_route = route_cache.get(route_key)
+            if cached_route is not None:
+                cached_endpoint, cached_path_vars = cached_route
+                return cached_endpoint, dict(cached_path_vars)
+
+        not_found_cache = self._not_found_cache
+        if (not_found_cache is not None
+                and not_found_cache.get(path_key) is not None):
+            raise NoMatchingPathError(
+                req.path, self._path_specs_lister(host))
+
+        plan = self._plan
+        if plan is None:
+            plan = self._get_plan()
+        table = plan.table_for(host)
+
         chosen_endpoint = None
+        chosen_path_vars = None
 
         # keep track of what is going on during routing
         # so we can correctly report the cause of routing
@@ -1032,60 +3182,76 @@ class WsgiApp:
         matching_method_spec_found = False
         matching_pred_found = False
         matching_path_specs = set()
-        unmatched_methods = set()
         matching_method_spec_path_spec_pairs = list()
         failed_predicates = list()
+        # results of preds with a pred_key, for the rest of this request
+        pred_memo = None
 
-        for endpoint in self._endpoint_table:
+        # the router engine only yields endpoints whose path_spec
+        # matched, in registration order
+        path_candidates = table.path_matcher.candidates(req.path)
+        for route, path_vars in path_candidates:
 
-            if _re.match(f"^{endpoint['path_spec']}$", req.path):
-                matching_path_spec_found = True
-                matching_path_specs.add(endpoint['path_spec'])
-            else:
-                continue
+            matching_path_spec_found = True
+            matching_path_specs.add(route.path_spec)
 
-            if (req.method in endpoint['method_spec']
-                or '*' in endpoint['method_spec']
-            ):
+            if route.any_method or req.method in route.methods:
                 matching_method_spec_found = True
             else:
-                unmatched_methods.update(endpoint['method_spec'])
                 continue
 
-            if endpoint['pred'] is None:
+            if route.pred is None:
                 # we've successfully routed to a chosen endpoint,
                 # so break out of the loop
-                chosen_endpoint = endpoint
+                chosen_endpoint = route
+                chosen_path_vars = path_vars
                 break
-            elif endpoint['pred'](req):
+
+            if route.pred_key is None and self._pred_profiler is None:
+                passed = route.pred(req)
+            else:
+                if pred_memo is None:
+                    pred_memo = {}
+                passed = self._run_pred(route, req, pred_memo)
+
+            if passed:
                 matching_pred_found = True
                 # we've successfully routed to a chosen endpoint,
                 # so break out of the loop
-                chosen_endpoint = endpoint
+                chosen_endpoint = route
+                chosen_path_vars = path_vars
                 break
             else:
                 matching_method_spec_path_spec_pairs.append(
-                    (endpoint['method_spec'], endpoint['path_spec'])
+                    (route.method_spec, route.path_spec)
                 )
-                failed_predicates.append(endpoint['pred'])
+                failed_predicates.append(route.pred)
                 continue
 
         if chosen_endpoint is None:
             if not matching_path_spec_found:
+                if not_found_cache is not None:
+                    not_found_cache.put(path_key, True)
                 raise NoMatchingPathError(
                     req.path,
-                    [
-                        endpoint['path_spec']
-                        for endpoint in self._endpoint_table
-                    ]
+                    table.list_path_specs
                 )
             elif not matching_method_spec_found:
-                raise NoMatchingMethodError(
-                    req.method,
-                    req.path,
-                    unmatched_methods,
-                    matching_path_specs
-                )
+                # no route on these path_specs allowed the method, so
+                # what they do allow was all worked out in advance
+                allow_answer = table.allow_answer(matching_path_specs)
+                if (allow_answer.options_route is not None
+                        and req.method == 'OPTIONS'):
+                    chosen_endpoint = allow_answer.options_route
+                    chosen_path_vars = {}
+                else:
+                    raise NoMatchingMethodError(
+                        req.method,
+                        req.path,
+                        allow_answer.allowed_methods,
+                        matching_path_specs,
+                        allow_answer.allow_header
+                    )
             elif not matching_pred_found:
                 raise NoMatchingPredError(
                     req.method,
@@ -1094,17 +3260,87 @@ class WsgiApp:
                     failed_predicates
                 )
 
-        return chosen_endpoint
+        if table.route_order is not None:
+            table.route_order.record(chosen_endpoint)
+
+        # a decision that ran no preds depends only on the method
+        # and path, so it is safe to remember for the next request
+        if (route_cache is not None
+                and chosen_endpoint.pred is None
+                and not failed_predicates):
+            route_cache.put(
+                route_key,
+                (chosen_endpoint, dict(chosen_path_vars))
+            )
+
+        return chosen_endpoint, chosen_path_vars
+
+    def _run_pred(self, route, req, pred_memo):
+        # run route's pred on req, unless its pred_key says the result
+        # is already known from earlier in this request or (if the
+        # pred cache is on) from an earlier request
+        pred = route.pred
+        pred_profiler = self._pred_profiler
+        memo_key = None
+        if route.pred_key is not None:
+            # the pred_key is part of the key, since endpoints sharing
+            # a pred may use different pred_keys whose values collide
+            memo_key = (pred, route.pred_key, route.pred_key(req))
+            try:
+                passed = pred_memo[memo_key]
+            except KeyError:
+                passed = None
+            if passed is None and self._pred_cache is not None:
+                passed = self._pred_cache.get(memo_key)
+                if passed is not None:
+                    pred_memo[memo_key] = passed
+            if passed is not None:
+                if pred_profiler is not None:
+                    pred_profiler.record_memo_hit(pred)
+                return passed
+
+        if pred_profiler is None:
+            passed = pred(req)
+        else:
+            start = _time.perf_counter()
+            passed = pred(req)
+            pred_profiler.record_call(
+                pred, passed, _time.perf_counter() - start)
+
+        if memo_key is not None:
+            pred_memo[memo_key] = passed
+            if self._pred_cache is not None:
+                self._pred_cache.put(memo_key, passed)
+
+        return passed
+
+    def _path_specs_lister(self, host):
+        # a callable listing the path_specs routing tried for host, for
+        # NoMatchingPathError to call if and when it is asked for them
+        def list_path_specs():
+            return self._get_plan().table_for(host).list_path_specs()
+        return list_path_specs
 
     def _choose_err_handler(self, e):
-        chosen_error_handler = None
-        for error_handler in self._err_handler_table:
-            if any(
-                isinstance(e, handled_exc)
-                for handled_exc in error_handler['exceptions_list']
-            ):
-                chosen_error_handler = error_handler
-                break
+        # which err handler matches depends only on the exception's
+        # class, so the choice is worked out once per class and then
+        # looked up. A class with no matching handler is cached too
+        exc_type = type(e)
+        plan = self._plan
+        if plan is None:
+            plan = self._get_plan()
+        err_handler_cache = plan.err_handler_cache
+        try:
+            return err_handler_cache[exc_type]
+        except KeyError:
+            pass
+
+        chosen_error_handler = plan.match_err_handler(exc_type)
+
+        # exception classes can be made on the fly, so keep this bounded
+        if len(err_handler_cache) >= _ERR_HANDLER_CACHE_MAXSIZE:
+            err_handler_cache.clear()
+        err_handler_cache[exc_type] = chosen_error_handler
 
         return chosen_error_handler
 
@@ -1113,7 +3349,9 @@ class WsgiApp:
         method_spec,
         path_spec,
         request_handler,
-        pred=None
+        pred=None,
+        pred_key=None,
+        host=None
     ):
         """
         Register an endpoint with the WsgiApp object.
@@ -1144,7 +3382,16 @@ class WsgiApp:
            specifies the structure of paths matching for this endpoint.
            Capture groups define parts of the path that will be available
            in the path_vars property of httpglue.Request object passed into
-           the endpoint's request handler
+           the endpoint's request handler. An httpglue.PathTemplate,
+           like PathTemplate('/widgets/{id:int}'), may be passed instead
+           of a regex; its placeholders' converted values are what end
+           up in path_vars. Regexes made only of literal chars, '.',
+           char classes (like [a-z], [^/], \\d or \\w) with greedy
+           quantifiers, and groups without quantifiers or alternation,
+           where nothing a quantified part can match could also start
+           what follows it (like '/widgets/(?P<id>\\d+)/parts/([^/]*)'),
+           are matched in time linear in the length of the path. Other
+           regexes are handled as the app's path_spec_policy says.
 
         :param request_handler: a callable object with the signature
            (app: httpglue.WsgiApp, req: httpglue.Request) -> httpglue.Response
@@ -1161,21 +3408,72 @@ class WsgiApp:
            that endpoint. If True, the request will match that endpoint.
            It is an error for the pred function to return anything other
            than True or False or to raise an exception.
+
+        :param pred_key: an optional callable object with the signature
+           (req: httpglue.Request) -> hashable, declaring that pred is
+           pure over the parts of the request pred_key returns, like
+           lambda req: req.headers.get('Accept'). pred's result is then
+           remembered for each distinct key, for the rest of the
+           request being routed and (see the pred_cache_size argument
+           of WsgiApp) across requests, rather than pred being called
+           again. Only give a pred_key for a pred whose result really
+           depends on nothing else. It is an error to give a pred_key
+           without a pred.
+
+        :param str host: an optional host, like 'api.example.com', or
+           wildcard host, like '*.example.com' (which matches any
+           subdomain of example.com, but not example.com itself), that
+           this endpoint is for. Requests are routed by host before
+           they are routed by path: a request whose Host header (or,
+           without one, whose host attribute) matches the host of
+           some endpoints, exactly or else by the longest matching
+           wildcard, is routed using only the endpoints registered for
+           that host. Every other request is routed using only the
+           endpoints registered without a host. Hosts are compared
+           case insensitively, and without any port.
+
+        :raises RuntimeError: if the WsgiApp has been frozen
         """
+        self._check_not_frozen()
         self._validate_method_spec(method_spec)
         self._validate_path_spec(path_spec)
         self._validate_req_handler(request_handler)
         if pred is not None:
             self._validate_pred(pred)
-        self._endpoint_table.append({
+        if pred_key is not None:
+            if pred is None:
+                raise ValueError(
+                    'a pred_key was given for an endpoint with no pred')
+            self._validate_pred_key(pred_key)
+        if host is not None:
+            host = self._validate_host(host)
+        self._add_endpoint({
             'path_spec': path_spec,
+            'path_regex': self._compile_path_spec(path_spec),
+            'is_literal': (
+                type(path_spec) is str
+                and _REGEX_META_CHARS.isdisjoint(path_spec)
+            ),
             'method_spec': method_spec,
             'pred': pred,
+            'pred_key': pred_key,
+            'host': host,
             'req_handler': request_handler
 
         })
         return request_handler
 
+    def _add_endpoint(self, endpoint):
+        # endpoint is an already validated _endpoint_table entry
+        self._endpoint_table.append(endpoint)
+        self._plan = None
+        if endpoint['host'] is not None:
+            self._routes_by_host = True
+        if self._route_cache is not None:
+            self._route_cache.clear()
+        if self._not_found_cache is not None:
+            self._not_found_cache.clear()
+
     def register_err_handler(self, excs_list, f):
         """
         Register an error handler with the WsgiApp object.
@@ -1204,15 +3502,470 @@ class WsgiApp:
            (app: httpglue.WsgiApp, e: Exception, req: httpglue.Request) ->
            httpglue.Response which is responsible for representing the
            functionality of the error handler and returning a response
+
+        :raises RuntimeError: if the WsgiApp has been frozen
         """
+        self._check_not_frozen()
         self._validate_excs_list(excs_list)
         self._validate_err_handler(f)
         self._err_handler_table.append({
             'exceptions_list': tuple(excs_list),
             'err_handler': f
         })
+        self._plan = None
         return f
 
+    def save_routes(self, file_path):
+        """
+        Save the WsgiApp's endpoints and err handlers to a route
+        snapshot file, for load_routes to register again later without
+        validating and compiling them all over.
+
+        An app with thousands of endpoints spends a noticeable part of
+        its start up registering them. Saving a snapshot when the app is
+        built or deployed, and loading it when the app starts, trades
+        that for reading one json file.
+
+        Request handlers, preds, pred_keys, err handlers and exception
+        types are saved by import path ('module:qualname'), so they must
+        all be module level functions and classes.
+
+        The snapshot holds a fingerprint of its contents, of the
+        signatures of the functions and the bases of the classes it
+        names, of httpglue's own source, and of the python version and
+        the path_spec_policy it was saved under, which is also
+        returned.
+
+        :param str file_path: where to write the snapshot
+
+        :raises ValueError: if a request handler, pred, pred_key, err
+           handler or exception type cannot be imported by name, or if
+           apps have been mounted in the WsgiApp (see mount), which
+           snapshots do not cover
+
+        :rtype str: the fingerprint of the snapshot
+        """
+        import json
+
+        if self._mount_table:
+            raise ValueError(
+                'route snapshots do not cover mounted apps; save the '
+                'routes of each app separately')
+
+        objects = {}
+
+        def import_path(obj):
+            path = _import_path(obj)
+            objects[path] = obj
+            return path
+
+        endpoints = []
+        for endpoint in self._endpoint_table:
+            path_spec = endpoint['path_spec']
+            is_template = isinstance(path_spec, PathTemplate)
+            endpoints.append({
+                'method_spec': list(endpoint['method_spec']),
+                'path_spec': str(path_spec),
+                'is_template': is_template,
+                'path_regex': (
+                    None if is_template else endpoint['path_regex'].pattern
+                ),
+                'is_literal': endpoint['is_literal'],
+                'pred': (
+                    import_path(endpoint['pred'])
+                    if endpoint['pred'] is not None else None
+                ),
+                'pred_key': (
+                    import_path(endpoint['pred_key'])
+                    if endpoint['pred_key'] is not None else None
+                ),
+                'host': endpoint['host'],
+                'req_handler': import_path(endpoint['req_handler'])
+            })
+
+        err_handlers = [
+            {
+                'exceptions_list': [
+                    import_path(exc)
+                    for exc in err_handler_entry['exceptions_list']
+                ],
+                'err_handler': import_path(err_handler_entry['err_handler'])
+            }
+            for err_handler_entry in self._err_handler_table
+        ]
+
+        routes = {'endpoints': endpoints, 'err_handlers': err_handlers}
+        fingerprint = _route_snapshot_fingerprint(
+            routes, objects, self.path_spec_policy)
+
+        with open(file_path, 'w') as f:
+            json.dump({'fingerprint': fingerprint, 'routes': routes}, f)
+
+        return fingerprint
+
+    def load_routes(self, file_path):
+        """
+        Register the endpoints and err handlers in a route snapshot
+        file made by save_routes, after any already registered.
+
+        When the snapshot's fingerprint matches, which it does unless
+        the file was edited, a function it names has had its signature
+        changed or a class it names its bases, or it was saved under a
+        different python version or path_spec_policy or by a different
+        httpglue, its endpoints are trusted as they were validated and
+        compiled when they were saved: nothing is checked again and no
+        path_spec is analyzed again, their handlers are only imported.
+        Otherwise every
+        endpoint and err handler goes through register_endpoint and
+        register_err_handler like any other.
+
+        Loading a snapshot imports every module it names, so only load
+        snapshots from places as trusted as your code.
+
+        This method returns whether the snapshot's fingerprint matched.
+
+        :param str file_path: the snapshot file to load
+
+        :raises RuntimeError: if the WsgiApp has been frozen
+
+        :rtype bool: whether the snapshot was trusted
+        """
+        import json
+
+        self._check_not_frozen()
+
+        with open(file_path) as f:
+            snapshot = json.load(f)
+
+        routes = snapshot['routes']
+
+        # everything the snapshot names is imported first, since the
+        # fingerprint covers what was imported as well
+        objects = {}
+
+        def import_object(import_path):
+            if import_path is None:
+                return None
+            obj = objects[import_path] = _import_object(import_path)
+            return obj
+
+        endpoints = [
+            (
+                endpoint,
+                import_object(endpoint['pred']),
+                import_object(endpoint['pred_key']),
+                import_object(endpoint['req_handler'])
+            )
+            for endpoint in routes['endpoints']
+        ]
+        err_handlers = [
+            (
+                [
+                    import_object(exc)
+                    for exc in err_handler_entry['exceptions_list']
+                ],
+                import_object(err_handler_entry['err_handler'])
+            )
+            for err_handler_entry in routes['err_handlers']
+        ]
+
+        trusted = snapshot.get('fingerprint') == _route_snapshot_fingerprint(
+            routes, objects, self.path_spec_policy)
+        if not trusted:
+            self.logger.warning(
+                'The route snapshot %s does not match its fingerprint '
+                'here, so its routes are being validated as they are '
+                'registered', file_path)
+
+        for endpoint, pred, pred_key, req_handler in endpoints:
+            path_spec = endpoint['path_spec']
+            if endpoint['is_template']:
+                path_spec = PathTemplate(path_spec)
+
+            if not trusted:
+                self.register_endpoint(
+                    endpoint['method_spec'],
+                    path_spec,
+                    req_handler,
+                    pred=pred,
+                    pred_key=pred_key,
+                    host=endpoint['host']
+                )
+                continue
+
+            self._add_endpoint({
+                'path_spec': path_spec,
+                'path_regex': (
+                    path_spec._regex if endpoint['is_template']
+                    else _re.compile(endpoint['path_regex'])
+                ),
+                'is_literal': endpoint['is_literal'],
+                'method_spec': endpoint['method_spec'],
+                'pred': pred,
+                'pred_key': pred_key,
+                'host': endpoint['host'],
+                'req_handler': req_handler
+            })
+
+        for excs_list, f in err_handlers:
+            if not trusted:
+                self.register_err_handler(excs_list, f)
+                continue
+
+            self._err_handler_table.append({
+                'exceptions_list': tuple(excs_list),
+                'err_handler': f
+            })
+            self._plan = None
+
+        return trusted
+
+    def mount(self, prefix, sub_app):
+        """
+        Mount another WsgiApp under a path prefix, handing it every
+        request whose path is that prefix, or starts with that prefix
+        followed by a '/'.
+
+        Mounted apps are found before routing, in a trie of path
+        segments, so a request for a mounted app never looks at this
+        app's endpoints, and a request for this app never looks at a
+        mounted app's. If prefixes are nested, like '/api' and
+        '/api/v2', the longest one matching a path wins.
+
+        The mounted app handles the request with its own endpoints, err
+        handlers, logger and default_fallback_err_res, as if it had
+        been given the request directly, except that the prefix is cut
+        off the front of the request's path first: a request for
+        '/v1/widgets/7' reaches the app mounted at '/v1' with the path
+        '/widgets/7', and a request for '/v1' itself with the path '/'.
+
+        This method returns the mounted app.
+
+        :param str prefix: the path prefix, like '/v1'. It must start
+           with a '/' and must not end with one.
+
+        :param httpglue.WsgiApp sub_app: the WsgiApp to mount
+
+        :raises RuntimeError: if the WsgiApp has been frozen
+
+        :rtype: httpglue.WsgiApp
+        """
+        self._check_not_frozen()
+
+        if not isinstance(prefix, str):
+            raise TypeError(
+                'expected prefix to be of type str. got %s' % type(prefix))
+        if (not prefix.startswith('/') or prefix.endswith('/')
+                or '//' in prefix):
+            raise ValueError(
+                'expected prefix to start with a \'/\', like \'/v1\', '
+                'and not to end with one or have empty segments. '
+                'got %r' % prefix)
+        if not isinstance(sub_app, WsgiApp):
+            raise TypeError(
+                'expected sub_app to be of type WsgiApp. got %s' %
+                type(sub_app))
+        if self._mounts_transitively(sub_app):
+            raise ValueError(
+                'a WsgiApp cannot be mounted in itself, or in an app '
+                'mounted in it')
+        if any(mount['prefix'] == prefix for mount in self._mount_table):
+            raise ValueError(
+                'a WsgiApp is already mounted at %r' % prefix)
+
+        self._mount_table.append({
+            'prefix': prefix,
+            'app': sub_app
+        })
+        self._plan = None
+        return sub_app
+
+    def _mounts_transitively(self, app):
+        # whether app is this app, or one of the apps mounted in app
+        # (or mounted in those, and so on) is
+        seen = set()
+        waiting = [app]
+        while waiting:
+            app = waiting.pop()
+            if app is self:
+                return True
+            if id(app) in seen:
+                continue
+            seen.add(id(app))
+            waiting.extend(mount['app'] for mount in app._mount_table)
+        return False
+
+    def freeze(self):
+        """
+        Freeze the WsgiApp, finishing all of its routing set up now
+        rather than while handling requests.
+
+        Call this once every endpoint and error handler has been
+        registered, before the app starts serving (and, under a
+        pre-forking wsgi server, before it forks). Freezing compiles the
+        endpoints and error handlers into the immutable structures that
+        routing reads, so that handling a request never builds, rebuilds
+        or checks whether it needs to rebuild any of them, and so that
+        the app can be shared between threads without a lock around
+        routing.
+
+        Once frozen, register_endpoint and register_err_handler raise a
+        RuntimeError. Freezing a frozen app does nothing. Every WsgiApp
+        mounted in this one (see mount) is frozen too.
+
+        This method returns the WsgiApp itself.
+
+        :raises ValueError: if the default_fallback_err_res has since
+           been given header values wsgi could not send
+
+        :rtype: httpglue.WsgiApp
+        """
+        if self._frozen:
+            return self
+
+        # the default_fallback_err_res is checked when the app is made,
+        # but it is mutable, so make sure it can still always be sent
+        for _, header_val in self.default_fallback_err_res.headers._pairs:
+            if _find_wsgi_forbidden_char(header_val) is not None:
+                raise ValueError(
+                    'wsgi has a special stipulation that header values '
+                    'must not contain control characters. Control '
+                    'characters %s were found in %s' %
+                    (str(set(header_val) & set(_WSGI_FORBIDDEN_CHARS)),
+                    header_val))
+
+        for mount in self._mount_table:
+            mount['app'].freeze()
+
+        plan = self._build_plan()
+        plan.prepare()
+        self._plan = plan
+        self._frozen = True
+        return self
+
+    def prepare_for_fork(self):
+        """
+        Get the WsgiApp ready to be shared by the worker processes a
+        pre-forking wsgi server forks from the process that made it.
+
+        This freezes the app (see freeze), which compiles its routing
+        and fills in what would otherwise be worked out lazily while
+        handling the first few requests, so that no worker builds its
+        own copy of any of it. Then it calls gc.freeze, which moves
+        every object alive in the process, the app's compiled routing,
+        handlers and modules included, out of the garbage collector's
+        reach. Otherwise, the first full collection in each worker
+        writes to every one of those objects, and each page of memory
+        it writes to stops being shared with the other workers.
+        gc.freeze is new in python 3.7; on python 3.6 the app is only
+        frozen.
+
+        Call this last thing before the server forks, after every
+        endpoint and err handler has been registered and everything
+        else the app needs at start up has been made. Pre-forking
+        servers usually have a hook for that, like gunicorn's pre_fork
+        (which runs before each fork; calling this again is cheap). For
+        the most sharing, the python docs also suggest calling
+        gc.disable() early in the process that forks, and gc.enable()
+        in each worker once it has been forked.
+
+        This method returns the WsgiApp itself.
+
+        :rtype: httpglue.WsgiApp
+        """
+        self.freeze()
+        if hasattr(_gc, 'freeze'):
+            _gc.freeze()
+        return self
+
+    @property
+    def frozen(self):
+        """
+        Whether freeze has been called on the WsgiApp.
+
+        :rtype: bool
+        """
+        return self._frozen
+
+    def _check_not_frozen(self):
+        if self._frozen:
+            raise RuntimeError(
+                'endpoints, err handlers and mounted apps cannot be '
+                'registered after the WsgiApp has been frozen')
+
+    def routing_stats(self):
+        """
+        Get counters describing the app's routing caches, for
+        observing how well they are working in a running app.
+
+        The returned dict has a 'route_cache' and a 'not_found_cache'
+        key. Each is None when that cache is turned off (see the
+        route_cache_size and not_found_cache_size arguments of WsgiApp),
+        or else a dict with the 'hits', 'misses', 'evictions', 'size'
+        and 'maxsize' of the cache.
+
+        It also has a 'route_order' key, which is None unless the
+        route_reorder_interval argument of WsgiApp turned adaptive
+        route ordering on and the app has endpoints with regex
+        path_specs. Otherwise it is a dict with the number of times
+        the order was changed ('reorders', summed over hosts, if
+        endpoints were registered for particular hosts), the number of
+        pairs of path_specs that might overlap and so keep their registration
+        order ('conflicts', None until the first reorder), and whether
+        the app had too many path_specs to work that out and gave up
+        reordering ('gave_up').
+
+        The 'preds' key is None unless the profile_preds argument of
+        WsgiApp is True. Otherwise it is a dict mapping each pred that
+        routing has consulted to a dict of how many times it was called
+        ('calls'), how many of those calls returned True ('passed'),
+        the total and the longest time its calls took ('total_seconds'
+        and 'max_seconds'), and how many calls its pred_key saved
+        ('memo_hits'). The 'pred_cache' key describes the cache of
+        pred results kept across requests, like the other caches.
+
+        :rtype dict: the routing stats
+        """
+        route_orders = [
+            table.route_order
+            for table in self._get_plan().tables()
+            if table.route_order is not None
+        ]
+        return {
+            'route_cache': (
+                self._route_cache.info()
+                if self._route_cache is not None else None
+            ),
+            'not_found_cache': (
+                self._not_found_cache.info()
+                if self._not_found_cache is not None else None
+            ),
+            'route_order': (
+                {
+                    'reorders': sum(
+                        route_order.reorders for route_order in route_orders),
+                    'conflicts': (
+                        None
+                        if any(route_order.conflicts is None
+                               for route_order in route_orders)
+                        else sum(route_order.conflicts
+                                 for route_order in route_orders)
+                    ),
+                    'gave_up': any(
+                        route_order.gave_up for route_order in route_orders)
+                }
+                if route_orders else None
+            ),
+            'preds': (
+                self._pred_profiler.info()
+                if self._pred_profiler is not None else None
+            ),
+            'pred_cache': (
+                self._pred_cache.info()
+                if self._pred_cache is not None else None
+            )
+        }
+
     def handle_request(self, req):
         """
         Handle a Request object in the WsgiApp, routing it to the right
@@ -1240,6 +3993,22 @@ class WsgiApp:
             raise TypeError(
                 f'expected req to be of type {type(Request)}. got {type(req)}')
 
+        plan = self._plan
+        if plan is None:
+            plan = self._get_plan()
+        if plan.mounts is not None:
+            mount = plan.mounts.find(req.path)
+            if mount is not None:
+                prefix, sub_app = mount
+                self.logger.debug(
+                    'Request "%s %s" handed to the app mounted at %s',
+                    req.method,
+                    req.path,
+                    prefix
+                )
+                req.path = req.path[len(prefix):] or '/'
+                return sub_app.handle_request(req)
+
         # these are defensive copies we need for later logging purposes,
         # since the req object may be mutated during the course of
         # being handled
@@ -1247,37 +4016,36 @@ class WsgiApp:
         incoming_req_path = req.path
 
         self.logger.debug(
-            'Request recieved (%s %s): %s',
+            'Request recieved (%s %s): %r',
             incoming_req_method,
             incoming_req_path,
-            repr(req)
+            req
         )
 
         try:
 
-            chosen_endpoint = self._choose_endpoint(req)
+            chosen_endpoint, path_vars = self._choose_endpoint(req)
 
-            # populate the path vars
-            req.path_vars = self._extract_path_vars(
-                chosen_endpoint['path_spec'],
-                incoming_req_path)
+            # populate the path vars from the same match
+            # routing used, rather than matching the path again
+            req.path_vars = path_vars
 
             self.logger.debug(
                 'Request "%s %s" routed to endpoint '
                 '%s %s%s',
                 incoming_req_method,
                 incoming_req_path,
-                chosen_endpoint['method_spec'],
-                chosen_endpoint['path_spec'],
+                chosen_endpoint.method_spec,
+                chosen_endpoint.path_spec,
                 (
-                    f' (pred={chosen_endpoint["pred"].__name__})'
-                    if chosen_endpoint['pred'] is not None
+                    f' (pred={chosen_endpoint.pred.__name__})'
+                    if chosen_endpoint.pred is not None
                     else ''
                 )
             )
 
             # attempt to actually handle the req, getting a res
-            req_handler = chosen_endpoint['req_handler']
+            req_handler = chosen_endpoint.req_handler
             res = req_handler(self, req)
 
             # attempt to validate and return the res
@@ -1286,10 +4054,10 @@ class WsgiApp:
             # default_fallback_err_res being returned
             if isinstance(res, Response):
                 self.logger.debug(
-                    'Response for (%s %s): %s',
+                    'Response for (%s %s): %r',
                     incoming_req_method,
                     incoming_req_path,
-                    repr(res)
+                    res
                 )
                 self.logger.info(
                     '%s %s %s',
@@ -1327,10 +4095,10 @@ class WsgiApp:
                         'returning default_fallback_err_response'
                     )
                     self.logger.debug(
-                        'Response for (%s %s): %s',
+                        'Response for (%s %s): %r',
                         incoming_req_method,
                         incoming_req_path,
-                        repr(self.default_fallback_err_res)
+                        self.default_fallback_err_res
                     )
                     self.logger.info(
                         '%s %s %s',
@@ -1345,11 +4113,11 @@ class WsgiApp:
                     '%s for exeption %s',
                     incoming_req_method,
                     incoming_req_path,
-                    list(chosen_error_handler['exceptions_list']),
+                    list(chosen_error_handler.exceptions_list),
                     type(e)
                 )
 
-                res = chosen_error_handler['err_handler'](self, e, req)
+                res = chosen_error_handler.err_handler(self, e, req)
 
                 # attempt to validate and return the res
                 # it is an unrecoverable error for the handler to not
@@ -1357,10 +4125,10 @@ class WsgiApp:
                 # default_fallback_err_res being returned
                 if isinstance(res, Response):
                     self.logger.debug(
-                        'Response for (%s %s): %s',
+                        'Response for (%s %s): %r',
                         incoming_req_method,
                         incoming_req_path,
-                        repr(res)
+                        res
                     )
                     self.logger.info(
                         '%s %s %s',
@@ -1376,10 +4144,10 @@ class WsgiApp:
                         'default_fallback_err_res', type(res)
                     )
                     self.logger.debug(
-                        'Response for (%s %s): %s',
+                        'Response for (%s %s): %r',
                         incoming_req_method,
                         incoming_req_path,
-                        repr(self.default_fallback_err_res)
+                        self.default_fallback_err_res
                     )
                     self.logger.info(
                         '%s %s %s',
@@ -1398,10 +4166,10 @@ class WsgiApp:
                     'returning default_fallback_err_response'
                 )
                 self.logger.debug(
-                    'Response for (%s %s): %s',
+                    'Response for (%s %s): %r',
                     incoming_req_method,
                     incoming_req_path,
-                    repr(self.default_fallback_err_res)
+                    self.default_fallback_err_res
                 )
                 self.logger.info(
                     '%s %s %s',
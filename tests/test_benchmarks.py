@@ -0,0 +1,73 @@
+# Copyright 2021, Joseph P McAnulty
+
+import unittest
+
+from benchmarks import fork_memory
+from benchmarks import headers
+from benchmarks import routing
+from benchmarks.route_tables import ROUTE_TABLE_SHAPES
+from benchmarks.route_tables import make_workload
+
+
+class TestRoutingBenchmark(unittest.TestCase):
+    # keeps the benchmarks from rotting; the numbers aren't checked
+
+    def test_workloads_route_to_their_endpoints(self):
+        for shape in ROUTE_TABLE_SHAPES:
+            with self.subTest(shape=shape):
+                routes, workload = make_workload(
+                    shape, 10, 50, miss_ratio=0)
+                app = routing.make_app(routes, 'linear')
+                for method, path, headers in workload:
+                    req = routing.Request(method, path, headers, b'')
+                    self.assertEqual(app.handle_request(req).status, 200)
+
+    def test_run_reports_every_combination(self):
+        results = routing.run(
+            ['literal', 'pred'], [5, 10], ['linear', 'combined_regex'],
+            n_requests=5, repeat=1)
+
+        self.assertEqual(len(results), 2 * 2 * 2 * len(routing.TARGETS))
+        for result in results:
+            self.assertLessEqual(result['p50_us'], result['p99_us'])
+            self.assertGreater(result['throughput_rps'], 0)
+
+        self.assertIn('pred routes', routing.format_scaling_curves(results))
+
+
+@unittest.skipUnless(fork_memory.supported(), 'needs os.fork and /proc')
+class TestForkMemoryBenchmark(unittest.TestCase):
+
+    def test_run_reports_every_mode(self):
+        results = fork_memory.run(
+            ['literal'], [10], fork_memory.MODES, n_requests=5, n_workers=2)
+
+        self.assertEqual(
+            [result['mode'] for result in results], fork_memory.MODES)
+        for result in results:
+            self.assertGreater(result['master_rss_kb'], 0)
+            self.assertGreater(result['mean_worker_uss_kb'], 0)
+            self.assertLessEqual(
+                result['mean_worker_uss_kb'], result['max_worker_uss_kb'])
+
+        self.assertIn('prepare_for_fork', fork_memory.format_table(results))
+
+
+class TestHeadersBenchmark(unittest.TestCase):
+
+    def test_run_reports_every_target(self):
+        results = headers.run([3, 30], n_requests=5, repeat=1)
+
+        self.assertEqual(
+            [(result['headers'], result['target']) for result in results],
+            [(count, target)
+             for count in [3, 30]
+             for target in ['headers_from_dict', 'headers_from_trusted',
+                            'wsgi_call', 'wsgi_call_reading_2']])
+        for result in results:
+            self.assertGreater(result['us_per_request'], 0)
+
+    def test_made_up_headers_make_up_the_numbers(self):
+        made = headers.make_headers(30)
+        self.assertEqual(len(made), 30)
+        self.assertEqual(len(dict(made)), 30)
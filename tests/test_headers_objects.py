@@ -1 +1,291 @@
-# Copyright 2021, Joseph P McAnulty
\ No newline at end of file
+# Copyright 2021, Joseph P McAnulty
+
+import timeit
+import unittest
+from unittest import mock
+
+import httpglue
+from httpglue import Headers
+
+
+class TestHeadersKeyNames(unittest.TestCase):
+
+    def test_keys_are_put_in_canonical_form(self):
+        for key in ['content-type', 'CONTENT-TYPE', 'Content-type',
+                    'cOnTeNt-TyPe']:
+            with self.subTest(key=key):
+                headers = Headers({key: 'text/plain'})
+                self.assertEqual(list(headers), ['Content-Type'])
+                self.assertEqual(headers[key], 'text/plain')
+
+    def test_canonical_keys_are_interned(self):
+        first = Headers({'x-made-up-' + 'header': 'a'})
+        second = Headers({'X-MADE-UP-' + 'HEADER': 'b'})
+        self.assertIs(list(first)[0], list(second)[0])
+
+    def test_header_name_table_is_bounded(self):
+        table = httpglue._HeaderNameTable(
+            httpglue._camel_dash_header_name, ['accept'], maxsize=2)
+
+        self.assertEqual(table.lookup('x-one'), 'X-One')
+        self.assertEqual(table.lookup('x-two'), 'X-Two')
+        self.assertEqual(table.lookup('x-three'), 'X-Three')
+        self.assertEqual(len(table.names), 3)
+        self.assertNotIn('x-three', table.names)
+        # the common names it started out with are never pushed out
+        self.assertEqual(table.lookup('accept'), 'Accept')
+
+    def test_names_read_out_of_requests_are_not_remembered(self):
+        tables = [
+            httpglue._HEADER_NAMES,
+            httpglue._ENVIRON_HEADER_NAMES,
+            httpglue._ENVIRON_KEYS
+        ]
+        sizes = [len(table.names) for table in tables]
+
+        environ = {'HTTP_X_MADE_UP_%d' % i: 'v' for i in range(10)}
+        environ_headers = httpglue._EnvironHeaders(environ)
+        self.assertIsNone(environ_headers.get('X-Only-Looked-Up'))
+        self.assertEqual(len(environ_headers), 10)
+
+        # only the name the application looked up is remembered
+        self.assertEqual(
+            [len(table.names) for table in tables],
+            [sizes[0] + 1, sizes[1], sizes[2] + 1])
+        self.assertIn('X-Only-Looked-Up', httpglue._HEADER_NAMES.names)
+
+    def test_environ_keys_translate_to_the_same_names(self):
+        for environ_key, name in [
+            ('HTTP_USER_AGENT', 'User-Agent'),
+            ('HTTP_X_FORWARDED_FOR', 'X-Forwarded-For'),
+            ('HTTP_X_MADE_UP', 'X-Made-Up'),
+        ]:
+            with self.subTest(environ_key=environ_key):
+                translated = httpglue._ENVIRON_HEADER_NAMES.lookup(
+                    environ_key)
+                self.assertEqual(translated, name)
+                self.assertIs(
+                    translated, list(Headers({name.lower(): ''}))[0])
+
+
+class TestHeadersFromTrusted(unittest.TestCase):
+
+    def test_the_pairs_are_taken_over_as_they_are(self):
+        pairs = [('Content-Type', 'text/plain'), ('X-Request-Id', '7')]
+        headers = Headers._from_trusted(pairs)
+
+        self.assertIs(headers._pairs, pairs)
+        self.assertEqual(headers, Headers(dict(pairs)))
+        self.assertEqual(headers['content-type'], 'text/plain')
+
+    def test_nothing_is_checked(self):
+        with mock.patch.object(Headers, '_validate_value') as validate:
+            Headers._from_trusted([('Accept', '*/*')])
+        validate.assert_not_called()
+
+
+class TestHeadersRepeatedNames(unittest.TestCase):
+
+    def test_added_headers_are_all_kept_in_order(self):
+        headers = Headers({'Content-Type': 'text/plain'})
+        headers.add('set-cookie', 'a=1')
+        headers.add('Set-Cookie', 'b=2')
+
+        self.assertEqual(headers.get_all('SET-COOKIE'), ['a=1', 'b=2'])
+        self.assertEqual(headers['Set-Cookie'], 'b=2')
+        self.assertEqual(len(headers), 2)
+        self.assertEqual(headers._pairs, [
+            ('Content-Type', 'text/plain'),
+            ('Set-Cookie', 'a=1'),
+            ('Set-Cookie', 'b=2')
+        ])
+        self.assertEqual(headers.get_all('X-Missing'), [])
+
+    def test_mapping_keys_only_differing_in_case_are_one_header(self):
+        headers = Headers({'content-type': 'a', 'Content-Type': 'b'})
+        self.assertEqual(len(headers), 1)
+        self.assertEqual(headers._pairs, [('Content-Type', 'b')])
+
+    def test_pairs_can_be_given_with_repeated_names(self):
+        headers = Headers([('Link', '</a>'), ('link', '</b>')])
+        self.assertEqual(headers.get_all('Link'), ['</a>', '</b>'])
+        self.assertEqual(
+            repr(headers), "Headers([('Link', '</a>'), ('Link', '</b>')])")
+        self.assertEqual(str(headers), 'Link: </a>\r\nLink: </b>')
+
+    def test_setting_a_header_replaces_every_value(self):
+        headers = Headers([
+            ('Set-Cookie', 'a=1'), ('Accept', '*/*'), ('Set-Cookie', 'b=2')])
+        headers['set-cookie'] = 'c=3'
+
+        self.assertEqual(headers._pairs, [
+            ('Set-Cookie', 'c=3'), ('Accept', '*/*')])
+        self.assertEqual(headers.get_all('Set-Cookie'), ['c=3'])
+
+    def test_removing_a_header_removes_every_value(self):
+        headers = Headers([
+            ('Set-Cookie', 'a=1'), ('Accept', '*/*'), ('Set-Cookie', 'b=2')])
+        del headers['Set-Cookie']
+        self.assertEqual(headers._pairs, [('Accept', '*/*')])
+
+        headers.add('Set-Cookie', 'a=1')
+        headers.add('Set-Cookie', 'b=2')
+        self.assertEqual(headers.pop('set-cookie'), 'b=2')
+        self.assertEqual(headers._pairs, [('Accept', '*/*')])
+
+    def test_repeated_values_count_when_comparing(self):
+        once = Headers({'Set-Cookie': 'b=2'})
+        twice = Headers([('Set-Cookie', 'a=1'), ('Set-Cookie', 'b=2')])
+        self.assertNotEqual(once, twice)
+        self.assertEqual(twice, twice.copy())
+
+    def test_copies_do_not_share_pairs(self):
+        headers = Headers({'Accept': '*/*'})
+        copied = headers.copy()
+        copied.add('Accept', 'text/html')
+        self.assertEqual(headers.get_all('Accept'), ['*/*'])
+
+
+class TestHeadersValidation(unittest.TestCase):
+
+    def test_invalid_keys_are_still_rejected(self):
+        headers = Headers()
+        for key in ['', 'Bad Key', 'Bad:Key', 'Bad\tKey', 'Bäd-Key']:
+            with self.subTest(key=key):
+                with self.assertRaises(ValueError):
+                    headers[key] = 'value'
+                with self.assertRaises(ValueError):
+                    headers.get(key)
+        with self.assertRaises(TypeError):
+            headers.get(b'Accept')
+        with self.assertRaises(TypeError):
+            headers.get(['Accept'])
+
+    def test_invalid_values_are_still_rejected(self):
+        headers = Headers()
+        for value in ['a\nb', 'a\x00b', 'a\x7fb', 'caf\u00e9']:
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    headers['X-Value'] = value
+        headers['X-Value'] = 'tabs\tand spaces are fine'
+
+    def test_invalid_keys_are_not_remembered(self):
+        with self.assertRaises(ValueError):
+            Headers({'Bad Key': 'value'})
+        self.assertNotIn('Bad Key', httpglue._HEADER_NAMES.names)
+
+
+def _set_difference_validate_and_convert(key):
+    # how Headers validated and converted keys before, to measure
+    # against
+    if set(key) - httpglue._VALID_RFC_2616_TOKEN_CHARS:
+        raise ValueError(key)
+    return httpglue._camel_dash_header_name(key)
+
+
+class TestHeadersValidationSpeed(unittest.TestCase):
+    # Microbenchmarks. They compare against the set difference
+    # validation Headers used to do, in the same process, rather than
+    # against absolute times, so that they hold on slow machines too
+
+    def fastest(self, f):
+        return min(timeit.repeat(f, number=2000, repeat=5))
+
+    def test_reading_a_header_is_faster_than_set_difference(self):
+        headers = Headers({'Authorization': 'Basic ZHVtbXk6ZHVtbXk='})
+        impl_dict = headers._impl_dict
+
+        def old_lookup():
+            impl_dict[_set_difference_validate_and_convert('Authorization')]
+
+        self.assertLess(
+            self.fastest(lambda: headers['Authorization']),
+            self.fastest(old_lookup))
+
+    def test_validating_a_value_is_faster_than_set_difference(self):
+        value = (
+            'Mozilla/5.0 (X11; Linux x86_64; rv:128.0) '
+            'Gecko/20100101 Firefox/128.0')
+        headers = Headers()
+
+        def old_validate():
+            if set(value) - httpglue._VALID_RFC_2616_TEXT_CHARS:
+                raise ValueError(value)
+
+        self.assertLess(
+            self.fastest(lambda: headers._validate_value(value)),
+            self.fastest(old_validate))
+
+
+class TestEnvironHeaders(unittest.TestCase):
+
+    def setUp(self):
+        self.environ = {
+            'REQUEST_METHOD': 'GET',
+            'HTTP_HOST': 'api.example.com',
+            'HTTP_AUTHORIZATION': 'Basic ZHVtbXk6ZHVtbXk=',
+            'HTTP_X_FORWARDED_FOR': '203.0.113.7',
+            'HTTP_X-Odd-Spelling': 'odd',
+            'CONTENT_TYPE': 'text/plain',
+            'CONTENT_LENGTH': 13
+        }
+        self.headers = httpglue._EnvironHeaders(self.environ)
+        self.eager_headers = Headers({
+            'Host': 'api.example.com',
+            'Authorization': 'Basic ZHVtbXk6ZHVtbXk=',
+            'X-Forwarded-For': '203.0.113.7',
+            'X-Odd-Spelling': 'odd',
+            'Content-Type': 'text/plain',
+            'Content-Length': '13'
+        })
+
+    def test_looking_up_present_headers_reads_only_them(self):
+        self.assertEqual(
+            self.headers['authorization'], 'Basic ZHVtbXk6ZHVtbXk=')
+        self.assertEqual(self.headers.get('Host'), 'api.example.com')
+        self.assertEqual(self.headers['Content-Length'], '13')
+        self.assertIn('X-Forwarded-For', self.headers)
+        self.assertIsNone(self.headers._materialized)
+
+    def test_looking_up_missing_headers_reads_none(self):
+        del self.environ['HTTP_X-Odd-Spelling']
+
+        self.assertIsNone(self.headers.get('X-Missing'))
+        self.assertNotIn('X-Missing', self.headers)
+        with self.assertRaises(KeyError):
+            self.headers['X-Missing']
+        self.assertIsNone(self.headers._materialized)
+
+    def test_headers_elsewhere_in_the_environ_are_still_found(self):
+        self.assertEqual(self.headers['X-Odd-Spelling'], 'odd')
+        self.assertIsNone(self.headers.get('X-Missing'))
+        self.assertNotIn('X-Missing', self.headers)
+        with self.assertRaises(KeyError):
+            self.headers['X-Missing']
+
+    def test_it_equals_the_headers_copied_out_of_the_environ(self):
+        self.assertEqual(self.headers, self.eager_headers)
+        self.assertEqual(self.eager_headers, self.headers)
+        self.assertEqual(dict(self.headers.items()),
+                         dict(self.eager_headers.items()))
+        self.assertEqual(len(self.headers), 6)
+
+    def test_changes_do_not_reach_the_environ(self):
+        self.headers['X-New'] = 'new'
+        self.headers.add('X-New', 'newer')
+        del self.headers['Host']
+
+        self.assertEqual(self.headers.get_all('X-New'), ['new', 'newer'])
+        self.assertNotIn('Host', self.headers)
+        self.assertNotIn('HTTP_X_NEW', self.environ)
+        self.assertEqual(self.environ['HTTP_HOST'], 'api.example.com')
+
+    def test_invalid_values_are_rejected_when_read(self):
+        self.environ['HTTP_X_BAD'] = 'bad\x00value'
+        headers = httpglue._EnvironHeaders(self.environ)
+
+        self.assertEqual(headers['Host'], 'api.example.com')
+        with self.assertRaises(ValueError):
+            headers['X-Bad']
+        with self.assertRaises(ValueError):
+            list(headers.items())
@@ -0,0 +1,99 @@
+# Copyright 2021, Joseph P McAnulty
+
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import httpglue
+
+
+# Modules httpglue only needs for work done outside of serving
+# requests, like checking signatures while registering endpoints, so
+# it imports them when that work is first done rather than up front.
+LAZILY_IMPORTED_MODULES = ['inspect', 'json', 'hashlib', 'importlib']
+
+HTTPGLUE_DIR = os.path.dirname(os.path.abspath(httpglue.__file__))
+
+PROBE = '''
+import sys
+before = set(sys.modules)
+import httpglue
+print(' '.join(sorted(set(sys.modules) - before)))
+'''
+
+
+# -X importtime is new in python 3.7, and PYTHONPYCACHEPREFIX, which
+# keeps the bytecode these tests write out of the source tree, in 3.8
+@unittest.skipIf(
+    sys.version_info < (3, 8), 'needs python 3.8 or newer to measure')
+class TestImportTime(unittest.TestCase):
+
+    def setUp(self):
+        pycache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(pycache_dir.cleanup)
+        self.env = dict(os.environ)
+        self.env.pop('PYTHONDONTWRITEBYTECODE', None)
+        self.env['PYTHONPYCACHEPREFIX'] = pycache_dir.name
+        self.env['PYTHONPATH'] = HTTPGLUE_DIR
+        # the first import writes the bytecode the rest read, like
+        # every import after a deploy does
+        self.import_httpglue()
+        self.import_lazily_imported_modules()
+
+    def run_python(self, code):
+        return subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            env=self.env,
+            cwd=HTTPGLUE_DIR,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            check=True
+        )
+
+    def import_httpglue(self):
+        return self.run_python(PROBE)
+
+    def import_lazily_imported_modules(self):
+        return self.run_python(
+            'import ' + ', '.join(LAZILY_IMPORTED_MODULES))
+
+    def cumulative_import_time_us(self, importtime_output, modules):
+        # the total time the given modules took to import, counting
+        # the modules they imported in turn
+        total = 0
+        for line in importtime_output.splitlines():
+            if not line.startswith('import time:'):
+                continue
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if name.strip() in modules:
+                total += int(cumulative)
+        return total
+
+    def test_heavy_modules_are_imported_lazily(self):
+        newly_imported = self.import_httpglue().stdout.split()
+        self.assertIn('httpglue', newly_imported)
+        for module in LAZILY_IMPORTED_MODULES:
+            with self.subTest(module=module):
+                self.assertNotIn(module, newly_imported)
+
+    def test_import_time_is_less_than_that_of_the_lazy_imports(self):
+        # compared with the modules httpglue puts off importing, in the
+        # same way on the same machine, rather than with a fixed time,
+        # so that it holds on slow machines too. httpglue takes about
+        # two thirds as long as they do; a heavy import creeping back
+        # in would make it take longer
+        def fastest(import_modules, modules):
+            return min(
+                self.cumulative_import_time_us(
+                    import_modules().stderr, modules)
+                for _ in range(3)
+            )
+
+        httpglue_us = fastest(self.import_httpglue, ['httpglue'])
+        lazy_imports_us = fastest(
+            self.import_lazily_imported_modules, LAZILY_IMPORTED_MODULES)
+        self.assertGreater(httpglue_us, 0)
+        self.assertLess(httpglue_us, lazy_imports_us)
@@ -1,6 +1,9 @@
 # Copyright 2021, Joseph P McAnulty
 import datetime
+import timeit
+import tracemalloc
 import unittest
+from unittest import mock
 
 from httpglue import Request, Headers
 
@@ -35,6 +38,18 @@ class TestRequestInstantiation(unittest.TestCase):
         self.assertEqual(req.query_str, 'some_key=some_val')
         self.assertEqual(req.start_time, start_time)
 
+    def test_headers_objects_are_kept_as_they_are(self):
+        headers = Headers({'Accept': '*/*'})
+
+        req = Request(
+            method='GET',
+            path='/something',
+            headers=headers,
+            body=b''
+        )
+
+        self.assertIs(req.headers, headers)
+
     def test_successful_instantiation_with_implicit_headers_coercion(self):
         start_time = datetime.datetime.now()
 
@@ -700,4 +715,125 @@ class TestRequestMutation(unittest.TestCase):
             serialized_then_deserialized_req.query_str)
         self.assertEqual(
             self.req.start_time,
-            serialized_then_deserialized_req.start_time)
\ No newline at end of file
+            serialized_then_deserialized_req.start_time)
+
+
+class TestRequestFromTrusted(unittest.TestCase):
+
+    def test_attributes_are_taken_as_they_are(self):
+        headers = Headers({'Accept': '*/*'})
+        path_vars = {}
+        start_time = datetime.datetime.now()
+
+        req = Request._from_trusted(
+            method='GET',
+            path='/something',
+            headers=headers,
+            body=b'',
+            host='localhost',
+            port=80,
+            proto='http',
+            http_version='HTTP/1.1',
+            path_vars=path_vars,
+            query_str='next=/a',
+            start_time=start_time
+        )
+
+        self.assertIs(req.headers, headers)
+        self.assertIs(req.path_vars, path_vars)
+        self.assertEqual(req.path, '/something')
+        self.assertEqual(req.query_str, 'next=/a')
+        self.assertEqual(req.start_time, start_time)
+
+    def test_nothing_is_checked(self):
+        with mock.patch('httpglue._find_invalid_token_char') as find:
+            Request._from_trusted(
+                'GET', '/', Headers(), b'', None, None, 'http', None, {},
+                '', None)
+        find.assert_not_called()
+
+    def test_setters_still_check_afterwards(self):
+        req = Request._from_trusted(
+            'GET', '/', Headers(), b'', None, None, 'http', None, {}, '',
+            None)
+        with self.assertRaises(TypeError):
+            req.port = '80'
+
+
+def _make_request():
+    return Request(
+        method='GET',
+        path='/something',
+        headers=Headers(),
+        body=b'',
+        host='localhost',
+        port=80,
+        proto='http',
+        http_version='HTTP/1.1',
+        path_vars={},
+        query_str='some_key=some_val',
+        start_time=None
+    )
+
+
+class _DictRequest:
+    # a Request as it was before __slots__, with its attributes kept
+    # in an instance dict, to measure against
+
+    def __init__(self, req):
+        for name in Request.__slots__:
+            setattr(self, name, getattr(req, name))
+
+
+class TestRequestSizeAndSpeed(unittest.TestCase):
+    # Microbenchmarks. They compare against Requests as they were, in
+    # the same process, rather than against absolute sizes and times,
+    # so that they hold on other machines and python versions too
+
+    def allocated_per_object(self, make, n=1000):
+        tracemalloc.start()
+        try:
+            before = tracemalloc.take_snapshot()
+            objects = [make() for _ in range(n)]
+            after = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+        allocated = sum(
+            stat.size_diff for stat in after.compare_to(before, 'filename'))
+        del objects
+        return allocated / n
+
+    def fastest(self, f):
+        return min(timeit.repeat(f, number=2000, repeat=5))
+
+    def test_requests_have_no_instance_dict(self):
+        req = _make_request()
+        self.assertFalse(hasattr(req, '__dict__'))
+        with self.assertRaises(AttributeError):
+            req.not_an_attribute = 1
+
+    def test_requests_take_less_memory_than_with_an_instance_dict(self):
+        # the attribute values are shared, so only the objects count
+        req = _make_request()
+        self.assertLess(
+            self.allocated_per_object(lambda: Request._from_trusted(
+                req.method, req.path, req.headers, req.body, req.host,
+                req.port, req.proto, req.http_version, req.path_vars,
+                req.query_str, req.start_time)),
+            self.allocated_per_object(lambda: _DictRequest(req)))
+
+    def test_trusted_construction_is_faster_than_checked(self):
+        headers = Headers()
+        path_vars = {}
+
+        def checked():
+            Request(
+                'GET', '/something', headers, b'', 'localhost', 80,
+                'http', 'HTTP/1.1', path_vars, 'some_key=some_val', None)
+
+        def trusted():
+            Request._from_trusted(
+                'GET', '/something', headers, b'', 'localhost', 80,
+                'http', 'HTTP/1.1', path_vars, 'some_key=some_val', None)
+
+        self.assertLess(self.fastest(trusted), self.fastest(checked))
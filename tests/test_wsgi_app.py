@@ -2,14 +2,21 @@
 
 import datetime
 import io
+import json
 import logging
+import os
+import re
+import sys
+import tempfile
 import unittest
 from unittest import mock
 
+import httpglue
 from httpglue import Request
 from httpglue import Response
 from httpglue import Headers
 from httpglue import WsgiApp
+from httpglue import PathTemplate
 from httpglue import NoMatchingMethodError
 from httpglue import NoMatchingPathError
 from httpglue import NoMatchingPredError
@@ -33,6 +40,22 @@ class ErrHandlerMock(mock.Mock):
         return super().__call__(app, e, req)
 
 
+# an app that logs nowhere, for the tests that build
+# their own apps with particular options
+def make_quiet_app(**app_options):
+    dummy_logger = logging.getLogger('dummy')
+    dummy_logger.addHandler(logging.NullHandler())
+    return WsgiApp(
+        logger=dummy_logger,
+        default_fallback_err_res=Response(500, {}, b''),
+        **app_options
+    )
+
+
+def ok_req_handler(app, req):
+    return Response(200, {}, b'')
+
+
 class TestBasicAppInstantiation(unittest.TestCase):
     
     def test_successful_instantiation_of_app(self):
@@ -173,7 +196,14 @@ class TestAppEndpointAndErrHandlerRegistry(unittest.TestCase):
                 '/dummy_path$',  # must not end with $
                 self.dummy_req_handler
             )
-        
+
+        with self.assertRaises(ValueError):
+            self.app.register_endpoint(
+                ['GET'],
+                '/dummy_path/(\\d*',  # not a valid regex
+                self.dummy_req_handler
+            )
+
 
     def test_endpoint_registry_fails_with_bad_req_handler(self):
         def dummy_req_handler_w_bad_signature(x, y, z=None):
@@ -228,6 +258,8 @@ class TestAppEndpointAndErrHandlerRegistry(unittest.TestCase):
             )
 
 class TestAppRouting(unittest.TestCase):
+    app_options = {}
+
     def setUp(self):
         # Define a complex app that allows us to
         # thoroughly test all routing paths
@@ -241,7 +273,8 @@ class TestAppRouting(unittest.TestCase):
                 status=500,
                 headers={},
                 body=b''
-            )
+            ),
+            **self.app_options
         )
 
         self.plain_route_1_handler = RequestHandlerMock()
@@ -578,6 +611,1635 @@ class TestAppRouting(unittest.TestCase):
 
         self.assertEqual(res, self.app.default_fallback_err_res)
 
+class TestAppRoutingWithCombinedRegexEngine(TestAppRouting):
+    # runs every TestAppRouting test again against the
+    # combined_regex router engine
+    app_options = {'router_engine': 'combined_regex'}
+
+
+class TestAppRoutingWithRoutingCaches(TestAppRouting):
+    # runs every TestAppRouting test again with the routing caches on
+    app_options = {'route_cache_size': 2, 'not_found_cache_size': 2}
+
+
+def reference_route(app, req):
+    # the original, unoptimized routing algorithm: try every
+    # endpoint's path_spec in registration order with re.match.
+    # Router engines and fast lanes must always agree with this
+    matching_path_specs = set()
+    unmatched_methods = set()
+    pairs = []
+    failed_predicates = []
+    for position, endpoint in enumerate(app._endpoint_table):
+        path_match = re.match(f"^{endpoint['path_spec']}$", req.path)
+        if not path_match:
+            continue
+        matching_path_specs.add(endpoint['path_spec'])
+        if not (req.method in endpoint['method_spec']
+                or '*' in endpoint['method_spec']):
+            unmatched_methods.update(endpoint['method_spec'])
+            continue
+        if endpoint['pred'] is None or endpoint['pred'](req):
+            path_vars = dict(enumerate(path_match.groups()))
+            path_vars.update(path_match.groupdict())
+            return app._get_plan().routes[position], path_vars
+        pairs.append((endpoint['method_spec'], endpoint['path_spec']))
+        failed_predicates.append(endpoint['pred'])
+
+    if not matching_path_specs:
+        raise NoMatchingPathError(
+            req.path, [e['path_spec'] for e in app._endpoint_table])
+    elif not pairs:
+        raise NoMatchingMethodError(
+            req.method, req.path, unmatched_methods, matching_path_specs)
+    else:
+        raise NoMatchingPredError(
+            req.method, req.path, pairs, failed_predicates)
+
+
+class TestRouterEngineEquivalence(unittest.TestCase):
+    # every router engine must route exactly like the original
+    # linear scan does, including the diagnostics in routing errors
+
+    path_specs = [
+        ('GET', r'/widgets'),
+        ('POST', r'/widgets'),
+        ('GET', r'/widgets/(?P<id>\d+)'),
+        ('PUT', r'/widgets/(?P<id>\d+)'),
+        ('GET', r'/gadgets/(?P<id>[a-z]+)/(\d*)'),
+        ('GET', r'/echo/(\w+)/\1'),  # backreference, can't be merged
+        ('GET', r'/cond/(x)?(?(1)y|z)'),  # conditional, can't be merged
+        ('DELETE', r'/(?P<id>[^/]*)'),
+        ('*', r'/any/.*'),
+        ('GET', r'/pred/(?P<id>\d+)'),
+        ('GET', r'/pred/(.*)'),
+        # literal path_specs shadowed by earlier regex endpoints
+        ('GET', r'/widgets/42'),
+        ('DELETE', r'/health'),
+        ('GET', r'/health'),
+        ('GET', r'/pred/1'),
+        ('*', r'/any/literal'),
+        # a regex endpoint registered after a literal one it overlaps
+        ('PATCH', r'/health|/metrics'),
+        ('GET', r'/metrics'),
+    ]
+
+    requests = [
+        ('GET', '/widgets'),
+        ('POST', '/widgets'),
+        ('DELETE', '/widgets'),
+        ('PATCH', '/widgets'),
+        ('GET', '/widgets/12'),
+        ('PUT', '/widgets/12'),
+        ('PATCH', '/widgets/12'),
+        ('GET', '/widgets/42'),
+        ('GET', '/gadgets/abc/'),
+        ('GET', '/gadgets/abc/42'),
+        ('GET', '/echo/hi/hi'),
+        ('GET', '/echo/hi/ho'),
+        ('GET', '/cond/xy'),
+        ('GET', '/cond/z'),
+        ('DELETE', '/whatever'),
+        ('OPTIONS', '/any/thing/at/all'),
+        ('OPTIONS', '/any/literal'),
+        ('GET', '/pred/7'),
+        ('GET', '/pred/seven'),
+        ('GET', '/pred/1'),
+        ('GET', '/pred/1234567'),
+        ('GET', '/health'),
+        ('DELETE', '/health'),
+        ('PATCH', '/health'),
+        ('POST', '/health'),
+        ('GET', '/health\n'),
+        ('GET', '/metrics'),
+        ('PATCH', '/metrics'),
+        ('PUT', '/metrics'),
+        ('GET', '/nowhere/at/all'),
+        ('GET', ''),
+    ]
+
+    def make_app(self, router_engine, **app_options):
+        app = make_quiet_app(router_engine=router_engine, **app_options)
+
+        def only_small_ids(req):
+            return len(req.path) < 8
+
+        for method, path_spec in self.path_specs:
+            app.register_endpoint(
+                [method], path_spec, ok_req_handler,
+                pred=only_small_ids if path_spec.startswith('/pred') else None
+            )
+        return app
+
+    def route(self, app, method, path, choose_endpoint=None):
+        req = Request(method=method, path=path, headers={}, body=b'')
+        try:
+            if choose_endpoint is None:
+                endpoint, path_vars = app._choose_endpoint(req)
+            else:
+                endpoint, path_vars = choose_endpoint(app, req)
+        except Exception as e:
+            return type(e), {
+                name: getattr(e, name)
+                for name in [
+                    'method',
+                    'path',
+                    'path_specs',
+                    'allowed_methods',
+                    'allow_header',
+                    'matching_path_specs',
+                    'matching_method_spec_path_spec_pairs'
+                ]
+                if hasattr(e, name)
+            }
+        return endpoint.path_spec, endpoint.method_spec, path_vars
+
+    def assert_routes_like_reference(self, app):
+        for method, path in self.requests:
+            with self.subTest(method=method, path=path):
+                self.assertEqual(
+                    self.route(app, method, path),
+                    self.route(app, method, path, reference_route)
+                )
+                # and again, now that any lazily built
+                # routing state is warmed up
+                self.assertEqual(
+                    self.route(app, method, path),
+                    self.route(app, method, path, reference_route)
+                )
+
+    def test_linear_engine_routes_like_reference(self):
+        self.assert_routes_like_reference(self.make_app('linear'))
+
+    def test_combined_regex_engine_routes_like_reference(self):
+        self.assert_routes_like_reference(self.make_app('combined_regex'))
+
+    def test_combined_regex_engine_routes_like_reference_across_blocks(self):
+        for max_alternatives in [1, 2, 3]:
+            with self.subTest(max_alternatives=max_alternatives):
+                with mock.patch.object(
+                    httpglue._CombinedRegexPathMatcher,
+                    '_max_alternatives', max_alternatives
+                ):
+                    self.assert_routes_like_reference(
+                        self.make_app('combined_regex'))
+
+    def test_adaptive_route_order_routes_like_reference(self):
+        for router_engine in ['linear', 'combined_regex']:
+            with self.subTest(router_engine=router_engine):
+                app = self.make_app(router_engine, route_reorder_interval=1)
+                # skew the traffic towards late endpoints, then check
+                # again under whatever order that led to
+                for _ in range(5):
+                    for method, path in reversed(self.requests[10:]):
+                        self.route(app, method, path)
+                    self.assert_routes_like_reference(app)
+
+    def test_route_cache_routes_like_reference(self):
+        for route_cache_size in [1, 5, 1000]:
+            with self.subTest(route_cache_size=route_cache_size):
+                self.assert_routes_like_reference(self.make_app(
+                    'linear', route_cache_size=route_cache_size))
+
+    def test_not_found_cache_routes_like_reference(self):
+        for not_found_cache_size in [1, 1000]:
+            with self.subTest(not_found_cache_size=not_found_cache_size):
+                self.assert_routes_like_reference(self.make_app(
+                    'linear', not_found_cache_size=not_found_cache_size))
+
+    def test_frozen_app_routes_like_reference(self):
+        for router_engine in ['linear', 'combined_regex']:
+            with self.subTest(router_engine=router_engine):
+                self.assert_routes_like_reference(
+                    self.make_app(router_engine).freeze())
+
+    def test_literal_path_specs_use_the_fast_lane(self):
+        app = self.make_app('linear')
+        self.route(app, 'GET', '/health')
+
+        with mock.patch.object(
+            app._get_plan().default_table.path_matcher._linear,
+            'candidates',
+            side_effect=AssertionError('regex table was scanned')
+        ):
+            self.assertEqual(
+                self.route(app, 'GET', '/health')[:2],
+                (r'/health', ['GET'])
+            )
+
+    def test_path_vars_from_the_fast_lane_are_not_shared(self):
+        app = self.make_app('linear')
+        first = self.route(app, 'GET', '/widgets/42')[2]
+        first['id'] = 'changed by a handler'
+
+        self.assertEqual(
+            self.route(app, 'GET', '/widgets/42')[2],
+            {0: '42', 'id': '42'}
+        )
+
+    def test_engine_is_rebuilt_after_late_registration(self):
+        app = self.make_app('combined_regex')
+        self.assertEqual(
+            self.route(app, 'GET', '/late/arrival')[0], NoMatchingPathError)
+
+        app.register_endpoint(
+            ['GET'], '/late/arrival', lambda app, req: Response(200, {}, b''))
+
+        self.assertEqual(
+            self.route(app, 'GET', '/late/arrival')[0], '/late/arrival')
+
+    def test_unknown_router_engine_is_rejected(self):
+        with self.assertRaises(ValueError):
+            WsgiApp(
+                logger=logging.getLogger('dummy'),
+                default_fallback_err_res=Response(500, {}, b''),
+                router_engine='quantum'
+            )
+
+
+class TestAppRouteCache(unittest.TestCase):
+    def setUp(self):
+        dummy_logger = logging.getLogger('dummy')
+        dummy_logger.addHandler(logging.NullHandler())
+        self.app = WsgiApp(
+            logger=dummy_logger,
+            default_fallback_err_res=Response(500, {}, b''),
+            route_cache_size=2
+        )
+
+        def req_handler(app, req):
+            return Response(200, {}, b'')
+
+        self.req_handler = req_handler
+        self.app.register_endpoint(
+            ['GET'], r'/widgets/(?P<id>\d+)', req_handler)
+        self.app.register_endpoint(
+            ['GET'], r'/gadgets', req_handler, pred=lambda req: True)
+
+    def route(self, method, path):
+        req = Request(method=method, path=path, headers={}, body=b'')
+        return self.app._choose_endpoint(req)
+
+    def route_cache_stats(self):
+        return self.app.routing_stats()['route_cache']
+
+    def test_route_cache_is_off_by_default(self):
+        app = WsgiApp(
+            logger=logging.getLogger('dummy'),
+            default_fallback_err_res=Response(500, {}, b'')
+        )
+        stats = app.routing_stats()
+        self.assertIsNone(stats['route_cache'])
+        self.assertIsNone(stats['not_found_cache'])
+        self.assertIsNone(stats['route_order'])
+        self.assertIsNone(stats['preds'])
+
+    def test_route_cache_counts_hits_and_misses(self):
+        self.route('GET', '/widgets/1')
+        self.route('GET', '/widgets/1')
+        self.route('GET', '/widgets/1')
+
+        self.assertEqual(self.route_cache_stats(), {
+            'hits': 2,
+            'misses': 1,
+            'evictions': 0,
+            'size': 1,
+            'maxsize': 2
+        })
+
+    def test_route_cache_evicts_least_recently_used(self):
+        self.route('GET', '/widgets/1')
+        self.route('GET', '/widgets/2')
+        self.route('GET', '/widgets/1')
+        self.route('GET', '/widgets/3')  # evicts /widgets/2
+
+        self.assertEqual(self.route_cache_stats()['evictions'], 1)
+        self.assertEqual(
+            list(self.app._route_cache._entries),
+            [('GET', '/widgets/1'), ('GET', '/widgets/3')]
+        )
+
+    def test_route_cache_hands_out_copies_of_path_vars(self):
+        endpoint, path_vars = self.route('GET', '/widgets/1')
+        path_vars['id'] = 'changed by a handler'
+
+        endpoint, path_vars = self.route('GET', '/widgets/1')
+        self.assertEqual(path_vars, {0: '1', 'id': '1'})
+
+    def test_decisions_involving_preds_are_not_cached(self):
+        self.route('GET', '/gadgets')
+        self.route('GET', '/gadgets')
+
+        self.assertEqual(self.route_cache_stats()['size'], 0)
+        self.assertEqual(self.route_cache_stats()['hits'], 0)
+
+    def test_route_cache_is_invalidated_by_registering_endpoints(self):
+        self.route('GET', '/widgets/1')
+        self.assertEqual(self.route_cache_stats()['size'], 1)
+
+        def shadowing_handler(app, req):
+            return Response(200, {}, b'')
+
+        self.app.register_endpoint(['GET'], r'/widgets/1', shadowing_handler)
+        self.assertEqual(self.route_cache_stats()['size'], 0)
+
+        # the earlier endpoint still wins, it was registered first
+        endpoint, path_vars = self.route('GET', '/widgets/1')
+        self.assertEqual(endpoint.path_spec, r'/widgets/(?P<id>\d+)')
+
+    def test_bad_route_cache_sizes_are_rejected(self):
+        with self.assertRaises(TypeError):
+            WsgiApp(
+                logger=logging.getLogger('dummy'),
+                default_fallback_err_res=Response(500, {}, b''),
+                route_cache_size='big'
+            )
+
+        with self.assertRaises(ValueError):
+            WsgiApp(
+                logger=logging.getLogger('dummy'),
+                default_fallback_err_res=Response(500, {}, b''),
+                route_cache_size=-1
+            )
+
+
+class TestAppNotFoundCache(unittest.TestCase):
+    def setUp(self):
+        dummy_logger = logging.getLogger('dummy')
+        dummy_logger.addHandler(logging.NullHandler())
+        self.app = WsgiApp(
+            logger=dummy_logger,
+            default_fallback_err_res=Response(500, {}, b''),
+            not_found_cache_size=2
+        )
+
+        def req_handler(app, req):
+            return Response(200, {}, b'')
+
+        self.req_handler = req_handler
+        self.app.register_endpoint(
+            ['GET'], r'/widgets/(?P<id>\d+)', req_handler)
+
+        self.not_found_handler = ErrHandlerMock()
+        self.not_found_handler.return_value = Response(404, {}, b'')
+        self.app.register_err_handler(
+            [NoMatchingPathError], self.not_found_handler)
+
+    def route(self, method, path):
+        req = Request(method=method, path=path, headers={}, body=b'')
+        return self.app._choose_endpoint(req)
+
+    def not_found_cache_stats(self):
+        return self.app.routing_stats()['not_found_cache']
+
+    def test_repeated_unroutable_paths_skip_the_path_specs(self):
+        with self.assertRaises(NoMatchingPathError):
+            self.route('GET', '/wp-login.php')
+
+        with mock.patch.object(self.app, '_plan', new=None), \
+                mock.patch.object(
+                    self.app, '_get_plan',
+                    side_effect=AssertionError('path_specs were tried')):
+            with self.assertRaises(NoMatchingPathError) as cm:
+                self.route('GET', '/wp-login.php')
+
+        self.assertEqual(cm.exception.path, '/wp-login.php')
+        self.assertEqual(
+            cm.exception.path_specs, [r'/widgets/(?P<id>\d+)'])
+        self.assertEqual(self.not_found_cache_stats()['hits'], 1)
+
+    def test_only_paths_matching_no_path_spec_are_cached(self):
+        with self.assertRaises(NoMatchingMethodError):
+            self.route('PUT', '/widgets/1')
+
+        self.assertEqual(self.not_found_cache_stats()['size'], 0)
+
+    def test_not_found_cache_is_invalidated_by_registering_endpoints(self):
+        with self.assertRaises(NoMatchingPathError):
+            self.route('GET', '/gadgets')
+
+        self.app.register_endpoint(['GET'], r'/gadgets', self.req_handler)
+
+        endpoint, path_vars = self.route('GET', '/gadgets')
+        self.assertEqual(endpoint.path_spec, r'/gadgets')
+
+    def test_404s_still_go_through_the_err_handler(self):
+        for _ in range(3):
+            req = Request(method='GET', path='/.env', headers={}, body=b'')
+            res = self.app.handle_request(req)
+
+            self.assertEqual(res.status, 404)
+            self.not_found_handler.assert_called_with(self.app, mock.ANY, req)
+
+        self.assertEqual(self.not_found_cache_stats()['hits'], 2)
+
+    def test_path_specs_of_no_matching_path_error_are_built_lazily(self):
+        list_path_specs = mock.Mock(return_value=['/a', '/b'])
+        e = NoMatchingPathError('/c', list_path_specs)
+
+        list_path_specs.assert_not_called()
+        self.assertEqual(e.path_specs, ['/a', '/b'])
+        self.assertEqual(e.path_specs, ['/a', '/b'])
+        list_path_specs.assert_called_once_with()
+
+        self.assertEqual(
+            NoMatchingPathError('/c', ['/a']).path_specs, ['/a'])
+
+
+class TestAppRoutingWithPathTemplates(unittest.TestCase):
+    def setUp(self):
+        dummy_logger = logging.getLogger('dummy')
+        dummy_logger.addHandler(logging.NullHandler())
+        self.app = WsgiApp(
+            logger=dummy_logger,
+            default_fallback_err_res=Response(500, {}, b'')
+        )
+
+        def req_handler(app, req):
+            return Response(200, {}, b'')
+
+        self.req_handler = req_handler
+
+    def route(self, method, path):
+        req = Request(method=method, path=path, headers={}, body=b'')
+        endpoint, path_vars = self.app._choose_endpoint(req)
+        return endpoint.path_spec, path_vars
+
+    def test_placeholders_are_converted_into_path_vars(self):
+        self.app.register_endpoint(
+            ['GET'], PathTemplate('/widgets/{id:int}/parts/{part}'),
+            self.req_handler)
+
+        self.assertEqual(
+            self.route('GET', '/widgets/42/parts/gear'),
+            (
+                PathTemplate('/widgets/{id:int}/parts/{part}'),
+                {'id': 42, 'part': 'gear'}
+            )
+        )
+
+    def test_paths_not_fitting_the_template_do_not_match(self):
+        self.app.register_endpoint(
+            ['GET'], PathTemplate('/widgets/{id:int}'), self.req_handler)
+
+        for path in ['/widgets/abc', '/widgets/', '/widgets/4/5',
+                     '/widgets/4\n', 'widgets/4', '/widgets/\u0663']:
+            with self.subTest(path=path):
+                with self.assertRaises(NoMatchingPathError):
+                    self.route('GET', path)
+
+    @unittest.skipUnless(
+        hasattr(sys, 'get_int_max_str_digits'),
+        'int() only limits the digits it parses from python 3.11')
+    def test_ints_too_long_to_convert_do_not_match(self):
+        self.app.register_endpoint(
+            ['GET'], PathTemplate('/n/{id:int}'), self.req_handler)
+        self.app.register_endpoint(
+            ['GET'], PathTemplate('/n/{name}'), self.req_handler)
+        path = '/n/' + '9' * (sys.get_int_max_str_digits() + 1)
+
+        self.assertEqual(
+            self.route('GET', path),
+            (PathTemplate('/n/{name}'), {'name': path[3:]}))
+        self.assertEqual(
+            list(httpglue._LinearPathMatcher(
+                self.app._get_plan().routes).candidates(path)),
+            [(self.app._get_plan().routes[1], {'name': path[3:]})])
+
+        app = WsgiApp(
+            logger=self.app.logger,
+            default_fallback_err_res=Response(500, {}, b''))
+        app.register_endpoint(
+            ['GET'], PathTemplate('/n/{id:int}'), self.req_handler)
+        app.register_err_handler(
+            [NoMatchingPathError], lambda app, e, req: Response(404, {}, b''))
+        req = Request(method='GET', path=path, headers={}, body=b'')
+        self.assertEqual(app.handle_request(req).status, 404)
+
+    def test_registration_order_is_kept_between_templates_and_regexes(self):
+        self.app.register_endpoint(
+            ['GET'], PathTemplate('/a/{x}'), self.req_handler)
+        self.app.register_endpoint(
+            ['GET'], PathTemplate('/a/b'), self.req_handler)
+        self.app.register_endpoint(
+            ['GET'], r'/c/(\d+)', self.req_handler)
+        self.app.register_endpoint(
+            ['GET'], PathTemplate('/c/{n:int}'), self.req_handler)
+        self.app.register_endpoint(
+            ['POST'], PathTemplate('/d/{n:int}'), self.req_handler)
+        self.app.register_endpoint(
+            ['GET'], r'/d/(\d+)', self.req_handler)
+
+        self.assertEqual(
+            self.route('GET', '/a/b'), (PathTemplate('/a/{x}'), {'x': 'b'}))
+        self.assertEqual(
+            self.route('GET', '/c/3'), (r'/c/(\d+)', {0: '3'}))
+        self.assertEqual(
+            self.route('GET', '/d/3'), (r'/d/(\d+)', {0: '3'}))
+        self.assertEqual(
+            self.route('POST', '/d/3'), (PathTemplate('/d/{n:int}'), {'n': 3}))
+
+        # and the same decisions the plain linear scan would make
+        for method, path in [('GET', '/a/b'), ('GET', '/c/3'),
+                             ('GET', '/d/3'), ('POST', '/d/3')]:
+            endpoint, path_vars = next(
+                (endpoint, path_vars)
+                for endpoint, path_vars
+                in httpglue._LinearPathMatcher(
+                    self.app._get_plan().routes).candidates(path)
+                if method in endpoint.method_spec
+            )
+            self.assertEqual(
+                self.route(method, path), (endpoint.path_spec, path_vars))
+
+    def test_routing_errors_report_templates(self):
+        self.app.register_endpoint(
+            ['GET'], PathTemplate('/widgets/{id:int}'), self.req_handler)
+
+        with self.assertRaises(NoMatchingMethodError) as cm:
+            self.route('PUT', '/widgets/7')
+
+        self.assertEqual(cm.exception.allowed_methods, {'GET'})
+        self.assertEqual(
+            cm.exception.matching_path_specs,
+            {PathTemplate('/widgets/{id:int}')})
+
+    def test_bad_templates_are_rejected(self):
+        with self.assertRaises(TypeError):
+            PathTemplate(None)
+
+        for template in ['widgets', '/w/{id:float}', '/w/{id}/{id}',
+                         '/w/x{id}', '/w/{1d}']:
+            with self.subTest(template=template):
+                with self.assertRaises(ValueError):
+                    PathTemplate(template)
+
+
+class TestAppErrHandlerChoice(unittest.TestCase):
+    def setUp(self):
+        dummy_logger = logging.getLogger('dummy')
+        dummy_logger.addHandler(logging.NullHandler())
+        self.app = WsgiApp(
+            logger=dummy_logger,
+            default_fallback_err_res=Response(500, {}, b'')
+        )
+
+        def err_handler(app, e, req):
+            return Response(500, {}, b'')
+
+        self.err_handler = err_handler
+
+    def test_first_registered_matching_err_handler_is_chosen(self):
+        self.app.register_err_handler([KeyError], self.err_handler)
+        self.app.register_err_handler([LookupError], self.err_handler)
+        self.app.register_err_handler(
+            [ValueError, IndexError], self.err_handler)
+
+        for e, position in [
+            (KeyError(), 0),
+            (IndexError(), 1),  # a LookupError, registered before
+            (ValueError(), 2),
+            (UnicodeError(), 2),
+            (TypeError(), None)
+        ]:
+            with self.subTest(e=e):
+                # and the same again, from the cache this time
+                for _ in range(2):
+                    chosen = self.app._choose_err_handler(e)
+                    self.assertIs(
+                        chosen,
+                        None if position is None
+                        else self.app._get_plan().err_handlers[position]
+                    )
+
+    def test_choice_is_cached_per_exception_class(self):
+        self.app.register_err_handler([LookupError], self.err_handler)
+        self.app._choose_err_handler(KeyError('a'))
+
+        plan = self.app._get_plan()
+        self.assertEqual(
+            plan.err_handler_cache,
+            {KeyError: plan.err_handlers[0]}
+        )
+
+        expected_entry = plan.err_handlers[0]
+        with mock.patch.object(plan, 'err_handlers', new=None):
+            # would raise a TypeError, if the table was walked
+            self.assertIs(
+                self.app._choose_err_handler(KeyError('b')),
+                expected_entry
+            )
+
+    def test_registering_an_err_handler_invalidates_the_cache(self):
+        self.assertIsNone(self.app._choose_err_handler(KeyError()))
+
+        self.app.register_err_handler([KeyError], self.err_handler)
+
+        chosen = self.app._choose_err_handler(KeyError())
+        self.assertIsNotNone(chosen)
+        self.assertIs(chosen.err_handler, self.err_handler)
+
+
+class TestAppFreeze(unittest.TestCase):
+    def setUp(self):
+        dummy_logger = logging.getLogger('dummy')
+        dummy_logger.addHandler(logging.NullHandler())
+        self.app = WsgiApp(
+            logger=dummy_logger,
+            default_fallback_err_res=Response(500, {}, b'')
+        )
+
+        def req_handler(app, req):
+            return Response(200, {}, b'')
+
+        def err_handler(app, e, req):
+            return Response(404, {}, b'')
+
+        self.req_handler = req_handler
+        self.err_handler = err_handler
+        self.app.register_endpoint(['GET'], r'/widgets', req_handler)
+        self.app.register_endpoint(
+            ['GET'], PathTemplate('/widgets/{id:int}'), req_handler)
+        self.app.register_err_handler(
+            [NoMatchingPathError], err_handler)
+
+    def test_freeze_returns_the_app_and_sets_frozen(self):
+        self.assertFalse(self.app.frozen)
+        self.assertIs(self.app.freeze(), self.app)
+        self.assertTrue(self.app.frozen)
+
+        # freezing again changes nothing
+        plan = self.app._plan
+        self.app.freeze()
+        self.assertIs(self.app._plan, plan)
+
+    def test_registering_after_freeze_is_an_error(self):
+        self.app.freeze()
+
+        with self.assertRaises(RuntimeError):
+            self.app.register_endpoint(['GET'], r'/gadgets', self.req_handler)
+        with self.assertRaises(RuntimeError):
+            self.app.register_err_handler([KeyError], self.err_handler)
+
+        self.assertEqual(len(self.app._endpoint_table), 2)
+        self.assertEqual(len(self.app._err_handler_table), 1)
+
+    def test_frozen_app_handles_requests(self):
+        self.app.freeze()
+
+        for path, status in [
+                ('/widgets', 200), ('/widgets/3', 200), ('/gadgets', 404)]:
+            with self.subTest(path=path):
+                req = Request(method='GET', path=path, headers={}, body=b'')
+                self.assertEqual(self.app.handle_request(req).status, status)
+
+    def test_freeze_finishes_the_routing_set_up(self):
+        self.app.freeze()
+
+        lane = self.app._plan.default_table.path_matcher
+        self.assertIn('/widgets', lane._literal_candidates)
+
+        plan = self.app._plan
+        req = Request(method='GET', path='/widgets/3', headers={}, body=b'')
+        self.app.handle_request(req)
+        self.assertIs(self.app._plan, plan)
+
+    def test_freeze_checks_the_default_fallback_err_res(self):
+        self.app.default_fallback_err_res.headers['X-Bad'] = 'a\tb'
+
+        with self.assertRaises(ValueError):
+            self.app.freeze()
+        self.assertFalse(self.app.frozen)
+
+    def test_freeze_chooses_err_handlers_up_front(self):
+        self.app.freeze()
+
+        err_handler_cache = self.app._plan.err_handler_cache
+        self.assertIs(
+            err_handler_cache[NoMatchingPathError].err_handler,
+            self.err_handler)
+        self.assertIsNone(err_handler_cache[NoMatchingMethodError])
+
+    def test_prepare_for_fork_freezes_the_app_and_the_gc(self):
+        with mock.patch('httpglue._gc.freeze') as gc_freeze:
+            self.assertIs(self.app.prepare_for_fork(), self.app)
+        self.assertTrue(self.app.frozen)
+        gc_freeze.assert_called_once_with()
+
+    def test_prepare_for_fork_works_without_gc_freeze(self):
+        # like on python 3.6, which has no gc.freeze
+        with mock.patch('httpglue._gc', spec=[]):
+            self.assertIs(self.app.prepare_for_fork(), self.app)
+        self.assertTrue(self.app.frozen)
+
+
+class TestAppAdaptiveRouteOrder(unittest.TestCase):
+    def make_app(self, path_specs, **app_options):
+        app = make_quiet_app(**app_options)
+
+        for path_spec in path_specs:
+            app.register_endpoint(['GET'], path_spec, ok_req_handler)
+        return app
+
+    def route(self, app, path):
+        req = Request(method='GET', path=path, headers={}, body=b'')
+        endpoint, path_vars = app._choose_endpoint(req)
+        return endpoint.path_spec, path_vars
+
+    def engine_order(self, app):
+        return [
+            route.path_spec
+            for route in app._get_plan().default_table.path_matcher._engine.routes
+        ]
+
+    def test_literal_affixes(self):
+        for path_spec, affixes in [
+            (r'/widgets/(\d+)', ('/widgets/', '')),
+            (r'/widgets/(\d+)\.json', ('/widgets/', '.json')),
+            (r'/a\.b/(.*)/c', ('/a.b/', '/c')),
+            (r'/ab?c', ('/a', 'c')),
+            (r'/ab*', ('/a', '')),
+            (r'/ab{2}', ('/a', '')),
+            (r'/x\d', ('/x', '')),
+            (r'/back\\', ('/back\\', '/back\\')),
+            (r'/health|/metrics', ('', '')),
+            (r'(/a)', ('', '')),
+        ]:
+            with self.subTest(path_spec=path_spec):
+                self.assertEqual(
+                    httpglue._literal_affixes(re.compile(f'^{path_spec}$')),
+                    affixes
+                )
+
+    def test_hot_endpoints_move_ahead_of_disjoint_ones(self):
+        path_specs = [fr'/r{i}/(\d+)' for i in range(20)]
+        app = self.make_app(path_specs, route_reorder_interval=10)
+
+        for _ in range(10):
+            self.route(app, '/r19/7')
+
+        self.assertEqual(self.engine_order(app)[0], r'/r19/(\d+)')
+        self.assertEqual(self.engine_order(app)[1:], path_specs[:-1])
+        self.assertEqual(app.routing_stats()['route_order'], {
+            'reorders': 1, 'conflicts': 0, 'gave_up': False})
+        self.assertEqual(self.route(app, '/r19/7'), (r'/r19/(\d+)', {0: '7'}))
+        self.assertEqual(self.route(app, '/r0/7'), (r'/r0/(\d+)', {0: '7'}))
+
+    def test_endpoints_that_may_overlap_keep_registration_order(self):
+        path_specs = [
+            r'/items/(.*)',
+            r'/other/(\d+)',
+            r'/items/(\d+)',  # shadowed by the first endpoint
+            r'/(\w+)/(\d+)\.json',
+            r'/items/(\d+)\.json'
+        ]
+        app = self.make_app(path_specs, route_reorder_interval=5)
+
+        for _ in range(20):
+            self.assertEqual(
+                self.route(app, '/items/5.json'),
+                (r'/items/(.*)', {0: '5.json'}))
+            self.route(app, '/other/5')
+
+        order = self.engine_order(app)
+        self.assertEqual(order[0], r'/other/(\d+)')
+        self.assertLess(
+            order.index(r'/items/(.*)'), order.index(r'/items/(\d+)'))
+        self.assertLess(
+            order.index(r'/items/(.*)'), order.index(r'/(\w+)/(\d+)\.json'))
+        self.assertLess(
+            order.index(r'/(\w+)/(\d+)\.json'),
+            order.index(r'/items/(\d+)\.json'))
+
+    def test_templates_and_literals_are_left_alone(self):
+        app = self.make_app(
+            [r'/a', PathTemplate('/b/{x}')], route_reorder_interval=1)
+
+        self.assertIsNone(app.routing_stats()['route_order'])
+        self.assertEqual(
+            self.route(app, '/b/1'), (PathTemplate('/b/{x}'), {'x': '1'}))
+
+    def test_too_many_path_specs_to_compare_gives_up(self):
+        path_specs = [fr'/r{i}/(\d+)' for i in range(5)]
+        app = self.make_app(path_specs, route_reorder_interval=1)
+
+        with mock.patch.object(httpglue, '_ROUTE_ORDER_MAX_COMPARISONS', 1):
+            for _ in range(3):
+                self.route(app, '/r4/1')
+
+        self.assertTrue(app.routing_stats()['route_order']['gave_up'])
+        self.assertEqual(self.engine_order(app), path_specs)
+
+    def test_bad_route_reorder_intervals_are_rejected(self):
+        with self.assertRaises(TypeError):
+            WsgiApp(
+                logger=logging.getLogger('dummy'),
+                default_fallback_err_res=Response(500, {}, b''),
+                route_reorder_interval=1.5
+            )
+
+        with self.assertRaises(ValueError):
+            WsgiApp(
+                logger=logging.getLogger('dummy'),
+                default_fallback_err_res=Response(500, {}, b''),
+                route_reorder_interval=-1
+            )
+
+
+class TestAppPredProfilingAndMemoization(unittest.TestCase):
+    def make_app(self, **app_options):
+        self.app = make_quiet_app(**app_options)
+
+        self.accepts_json = mock.Mock(
+            side_effect=lambda req: req.headers.get('Accept') == 'json')
+
+        def accepts_json(req):
+            return self.accepts_json(req)
+
+        def is_admin(req):
+            return req.headers.get('X-Admin') == 'yes'
+
+        self.accepts_json_pred = accepts_json
+        self.is_admin_pred = is_admin
+
+        # several endpoints sharing one pred, the way content
+        # negotiation or versioning preds usually get used
+        for path_spec in [r'/widgets/(\d+)', r'/widgets/(\w+)', r'/(.*)']:
+            self.app.register_endpoint(
+                ['GET'], path_spec, ok_req_handler,
+                pred=accepts_json, pred_key=accept_header)
+        self.app.register_endpoint(
+            ['GET'], r'/widgets/(\d+)', ok_req_handler, pred=is_admin)
+        return self.app
+
+    def route(self, path, headers):
+        req = Request(method='GET', path=path, headers=headers, body=b'')
+        try:
+            endpoint, path_vars = self.app._choose_endpoint(req)
+        except NoMatchingPredError:
+            return None
+        return endpoint.path_spec
+
+    def test_pred_results_are_memoized_within_a_request(self):
+        self.make_app(pred_cache_size=0)
+
+        self.assertIsNone(self.route('/widgets/1', {'Accept': 'xml'}))
+        self.assertEqual(self.accepts_json.call_count, 1)
+
+        self.assertIsNone(self.route('/widgets/1', {'Accept': 'xml'}))
+        self.assertEqual(self.accepts_json.call_count, 2)
+
+    def test_pred_results_are_memoized_across_requests(self):
+        self.make_app(pred_cache_size=4)
+
+        for _ in range(3):
+            self.assertEqual(
+                self.route('/widgets/1', {'Accept': 'json'}),
+                r'/widgets/(\d+)')
+            self.assertIsNone(self.route('/widgets/1', {'Accept': 'xml'}))
+        self.assertEqual(self.accepts_json.call_count, 2)
+
+        self.assertEqual(
+            self.app.routing_stats()['pred_cache']['size'], 2)
+
+    def test_pred_results_are_memoized_per_pred_key(self):
+        self.make_app(pred_cache_size=4)
+        # one pred shared by endpoints with different pred_keys, whose
+        # values happen to be equal
+        self.app.register_endpoint(
+            ['GET'], r'/tenants/(\w+)', ok_req_handler,
+            pred=self.accepts_json_pred, pred_key=tenant_path_var)
+
+        self.assertEqual(
+            self.route('/widgets/1', {'Accept': 'json'}), r'/widgets/(\d+)')
+        # not the answer cached for the Accept value 'json'
+        self.assertIsNone(self.route('/tenants/json', {'Accept': 'xml'}))
+        self.assertEqual(self.accepts_json.call_count, 3)
+
+    def test_preds_without_a_pred_key_always_run(self):
+        self.make_app()
+
+        for _ in range(2):
+            self.assertEqual(
+                self.route('/widgets/1', {'Accept': 'xml', 'X-Admin': 'yes'}),
+                r'/widgets/(\d+)')
+
+    def test_preds_are_profiled(self):
+        self.make_app(profile_preds=True, pred_cache_size=0)
+
+        self.route('/widgets/1', {'Accept': 'xml', 'X-Admin': 'yes'})
+        self.route('/widgets/1', {'Accept': 'json'})
+
+        preds = self.app.routing_stats()['preds']
+        self.assertEqual(
+            set(preds), {self.accepts_json_pred, self.is_admin_pred})
+
+        accepts_json_stats = preds[self.accepts_json_pred]
+        self.assertEqual(accepts_json_stats['calls'], 2)
+        self.assertEqual(accepts_json_stats['passed'], 1)
+        # the other two endpoints sharing it in the first request
+        self.assertEqual(accepts_json_stats['memo_hits'], 2)
+        self.assertGreaterEqual(
+            accepts_json_stats['total_seconds'],
+            accepts_json_stats['max_seconds'])
+        self.assertGreater(accepts_json_stats['max_seconds'], 0)
+
+        self.assertEqual(preds[self.is_admin_pred]['calls'], 1)
+        self.assertEqual(preds[self.is_admin_pred]['passed'], 1)
+
+    def test_pred_key_needs_a_pred(self):
+        self.make_app()
+
+        with self.assertRaises(ValueError):
+            self.app.register_endpoint(
+                ['GET'], r'/a', ok_req_handler, pred_key=accept_header)
+
+    def test_bad_pred_keys_are_rejected(self):
+        self.make_app()
+
+        with self.assertRaises(ValueError):
+            self.app.register_endpoint(
+                ['GET'], r'/a', ok_req_handler,
+                pred=self.is_admin_pred, pred_key=lambda: None)
+
+    def test_bad_pred_options_are_rejected(self):
+        for app_options, error in [
+            ({'profile_preds': 1}, TypeError),
+            ({'pred_cache_size': '1'}, TypeError),
+            ({'pred_cache_size': -1}, ValueError),
+        ]:
+            with self.subTest(app_options=app_options):
+                with self.assertRaises(error):
+                    self.make_app(**app_options)
+
+
+def accept_header(req):
+    return req.headers.get('Accept')
+
+
+def tenant_path_var(req):
+    return req.path.rsplit('/', 1)[-1]
+
+
+class TestAppLinearTimePathSpecs(unittest.TestCase):
+    safe_path_specs = [
+        r'/widgets',
+        r'/widgets/(\d+)',
+        r'/widgets/(?P<id>\d+)/parts/([^/]*)',
+        r'/files/([^/.]+)\.json',
+        r'/w/(\w+)\.(\w+)',
+        r'/a{2,3}b?',
+        r'/x/(.*)',
+        r'/[a-z0-9_-]+/[A-Z]{2}',
+        r'/\d?x',
+    ]
+
+    unsafe_path_specs = [
+        r'/echo/(\w+)/\1',
+        r'/(a|b)',
+        r'/x/(.*)/y',
+        r'/files/([^/]+)\.json',  # [^/]+ could also take the '.'
+        r'/a?a',
+        r'/(?:ab)+',
+        r'/a+?',
+        r'/(\w+)(\w+)x',
+        r'/\d+\w',
+        r'/(?i:a)',
+        r'/[]a]',
+    ]
+
+    paths = [
+        '/widgets', '/widgets/', '/widgets/12', '/widgets/12\n',
+        '/widgets/12/parts/', '/widgets/12/parts/gear',
+        '/widgets/12/parts/gear/x', '/files/report.json', '/files/.json',
+        '/w/abc.def', '/w/abc.', '/aa', '/aaab', '/aaaab', '/x/', '/x/y/z',
+        '/x/y\n', '/ab-c_1/GB', '/ab/G', '/5x', '/x', '/\u0663\u0663',
+    ]
+
+    def make_app(self, **app_options):
+        self.logger = mock.Mock(spec=logging.Logger)
+        self.app = WsgiApp(
+            logger=self.logger,
+            default_fallback_err_res=Response(500, {}, b''),
+            **app_options
+        )
+        return self.app
+
+    def test_safe_path_specs_are_recognized(self):
+        for path_spec in self.safe_path_specs:
+            with self.subTest(path_spec=path_spec):
+                self.assertIsNotNone(
+                    httpglue._linear_time_pattern(path_spec))
+
+    def test_unsafe_path_specs_are_recognized(self):
+        for path_spec in self.unsafe_path_specs:
+            with self.subTest(path_spec=path_spec):
+                self.assertIsNone(httpglue._linear_time_pattern(path_spec))
+
+    def test_linear_time_patterns_match_like_the_original(self):
+        for path_spec in self.safe_path_specs:
+            original = re.compile(f'^{path_spec}$')
+            linear = re.compile(
+                f'^{httpglue._linear_time_pattern(path_spec)}$')
+            self.assertEqual(linear.groupindex, original.groupindex)
+            for path in self.paths:
+                with self.subTest(path_spec=path_spec, path=path):
+                    original_match = original.match(path)
+                    linear_match = linear.match(path)
+                    self.assertEqual(
+                        original_match and original_match.groups(),
+                        linear_match and linear_match.groups()
+                    )
+
+    @unittest.skipUnless(
+        httpglue._HAS_POSSESSIVE_QUANTIFIERS,
+        'possessive quantifiers need python 3.11')
+    def test_safe_path_specs_never_backtrack(self):
+        self.make_app()
+        self.app.register_endpoint(
+            ['GET'], r'/widgets/(?P<id>\d+)', ok_req_handler)
+
+        self.assertEqual(
+            self.app._endpoint_table[0]['path_regex'].pattern,
+            r'^/widgets/(?P<id>\d++)$')
+        # the path_spec itself is left as it was registered
+        self.assertEqual(
+            self.app._endpoint_table[0]['path_spec'], r'/widgets/(?P<id>\d+)')
+
+    def test_unsafe_path_specs_are_warned_about_by_default(self):
+        self.make_app()
+        self.app.register_endpoint(
+            ['GET'], r'/widgets/(\d+)', ok_req_handler)
+        self.logger.warning.assert_not_called()
+
+        self.app.register_endpoint(['GET'], r'/(a|b)', ok_req_handler)
+        self.logger.warning.assert_called_once()
+        self.assertEqual(len(self.app._endpoint_table), 2)
+
+    def test_unsafe_path_specs_are_rejected_when_strict(self):
+        self.make_app(path_spec_policy='strict')
+        self.app.register_endpoint(
+            ['GET'], r'/widgets/(\d+)', ok_req_handler)
+
+        with self.assertRaises(ValueError):
+            self.app.register_endpoint(['GET'], r'/(a|b)', ok_req_handler)
+        self.assertEqual(len(self.app._endpoint_table), 1)
+
+    def test_unsafe_path_specs_are_accepted_when_permissive(self):
+        self.make_app(path_spec_policy='permissive')
+        self.app.register_endpoint(['GET'], r'/(a|b)', ok_req_handler)
+
+        self.logger.warning.assert_not_called()
+        req = Request(method='GET', path='/b', headers={}, body=b'')
+        self.assertEqual(self.app.handle_request(req).status, 200)
+
+    def test_bad_path_spec_policies_are_rejected(self):
+        with self.assertRaises(ValueError):
+            self.make_app(path_spec_policy='lenient')
+
+
+class TestAppAllowAndOptions(unittest.TestCase):
+    def make_app(self, **app_options):
+        app = make_quiet_app(**app_options)
+
+        def options_handler(app, req):
+            return Response(200, {'Allow': 'custom'}, b'')
+
+        def not_found_handler(app, e, req):
+            return Response(404, {}, b'')
+
+        def method_not_allowed_handler(app, e, req):
+            return Response(405, {'Allow': e.allow_header}, b'')
+
+        app.register_endpoint(['GET', 'POST'], r'/widgets', ok_req_handler)
+        app.register_endpoint(['DELETE'], r'/widgets', ok_req_handler)
+        app.register_endpoint(['PUT'], r'/widgets/(\d+)', ok_req_handler)
+        app.register_endpoint(['PATCH'], r'/widgets/(\w+)', ok_req_handler)
+        app.register_endpoint(['OPTIONS'], r'/custom', options_handler)
+        app.register_endpoint(['GET'], r'/custom', ok_req_handler)
+        app.register_err_handler([NoMatchingPathError], not_found_handler)
+        app.register_err_handler(
+            [NoMatchingMethodError], method_not_allowed_handler)
+        return app
+
+    def handle(self, app, method, path):
+        req = Request(method=method, path=path, headers={}, body=b'')
+        return app.handle_request(req)
+
+    def test_405s_carry_a_precomputed_allow_header(self):
+        app = self.make_app()
+
+        res = self.handle(app, 'PUT', '/widgets')
+        self.assertEqual(res.status, 405)
+        self.assertEqual(res.headers['Allow'], 'DELETE, GET, POST')
+
+        # the same answer object is used for every such request
+        req = Request(method='PUT', path='/widgets', headers={}, body=b'')
+        errors = []
+        for _ in range(2):
+            with self.assertRaises(NoMatchingMethodError) as cm:
+                app._choose_endpoint(req)
+            errors.append(cm.exception)
+        self.assertIs(errors[0].allow_header, errors[1].allow_header)
+        self.assertIs(errors[0].allowed_methods, errors[1].allowed_methods)
+
+    def test_allow_answers_are_bounded_without_changing_them_in_place(self):
+        table = self.make_app()._get_plan().default_table
+        first_allow_answers = table.allow_answers
+        with mock.patch('httpglue._ALLOW_ANSWER_CACHE_MAXSIZE', 1):
+            table.allow_answer([r'/widgets/(\d+)', r'/widgets/(\w+)'])
+            self.assertIs(table.allow_answers, first_allow_answers)
+            answer = table.allow_answer([r'/widgets', r'/custom'])
+
+        # another thread still reading the old dict sees it unchanged
+        self.assertIsNot(table.allow_answers, first_allow_answers)
+        self.assertEqual(
+            len(first_allow_answers), len(table.single_allow_answers) + 1)
+        expected_allow_answers = dict(table.single_allow_answers)
+        expected_allow_answers[frozenset([r'/widgets', r'/custom'])] = answer
+        self.assertEqual(table.allow_answers, expected_allow_answers)
+
+    def test_allow_header_covers_every_matching_path_spec(self):
+        app = self.make_app()
+
+        with self.assertRaises(NoMatchingMethodError) as cm:
+            app._choose_endpoint(
+                Request(method='GET', path='/widgets/7', headers={}, body=b''))
+
+        self.assertEqual(cm.exception.allowed_methods, {'PUT', 'PATCH'})
+        self.assertEqual(cm.exception.allow_header, 'PATCH, PUT')
+
+    def test_allow_header_is_worked_out_when_not_given(self):
+        e = NoMatchingMethodError('GET', '/a', {'PUT', 'POST'}, {'/a'})
+        self.assertEqual(e.allow_header, 'POST, PUT')
+
+    def test_options_is_left_to_the_app_by_default(self):
+        app = self.make_app()
+
+        res = self.handle(app, 'OPTIONS', '/widgets')
+        self.assertEqual(res.status, 405)
+        self.assertEqual(res.headers['Allow'], 'DELETE, GET, POST')
+
+    def test_auto_options_answers_options_requests(self):
+        app = self.make_app(auto_options=True)
+
+        res = self.handle(app, 'OPTIONS', '/widgets')
+        self.assertEqual(res.status, 204)
+        self.assertEqual(res.headers['Allow'], 'DELETE, GET, OPTIONS, POST')
+        self.assertEqual(res.body, b'')
+
+        res = self.handle(app, 'OPTIONS', '/widgets/7')
+        self.assertEqual(res.status, 204)
+        self.assertEqual(res.headers['Allow'], 'OPTIONS, PATCH, PUT')
+
+        # and the 405s agree that OPTIONS is allowed
+        res = self.handle(app, 'PUT', '/widgets')
+        self.assertEqual(res.status, 405)
+        self.assertEqual(res.headers['Allow'], 'DELETE, GET, OPTIONS, POST')
+
+    def test_auto_options_leaves_registered_options_endpoints_alone(self):
+        app = self.make_app(auto_options=True)
+
+        res = self.handle(app, 'OPTIONS', '/custom')
+        self.assertEqual(res.status, 200)
+        self.assertEqual(res.headers['Allow'], 'custom')
+
+    def test_auto_options_does_not_answer_unroutable_paths(self):
+        app = self.make_app(auto_options=True)
+
+        self.assertEqual(self.handle(app, 'OPTIONS', '/nowhere').status, 404)
+
+    def test_auto_options_works_with_the_route_cache_and_freeze(self):
+        app = self.make_app(auto_options=True, route_cache_size=4).freeze()
+
+        for _ in range(2):
+            res = self.handle(app, 'OPTIONS', '/widgets')
+            self.assertEqual(res.status, 204)
+            self.assertEqual(
+                res.headers['Allow'], 'DELETE, GET, OPTIONS, POST')
+
+    def test_bad_auto_options_values_are_rejected(self):
+        with self.assertRaises(TypeError):
+            WsgiApp(
+                logger=logging.getLogger('dummy'),
+                default_fallback_err_res=Response(500, {}, b''),
+                auto_options='yes'
+            )
+
+
+class TestAppVirtualHosts(unittest.TestCase):
+    def make_app(self, **app_options):
+        app = make_quiet_app(**app_options)
+
+        def make_handler(name):
+            def req_handler(app, req):
+                return Response(200, {}, name.encode())
+            return req_handler
+
+        def not_found_handler(app, e, req):
+            return Response(404, {}, b'')
+
+        def method_not_allowed_handler(app, e, req):
+            return Response(405, {'Allow': e.allow_header}, b'')
+
+        app.register_endpoint(['GET'], r'/', make_handler('default'))
+        app.register_endpoint(['GET'], r'/status', make_handler('default'))
+        app.register_endpoint(
+            ['GET', 'POST'], r'/', make_handler('api'),
+            host='api.example.com')
+        app.register_endpoint(
+            ['GET'], r'/', make_handler('tenant'), host='*.example.com')
+        app.register_endpoint(
+            ['GET'], r'/', make_handler('eu tenant'),
+            host='*.eu.example.com')
+        app.register_err_handler([NoMatchingPathError], not_found_handler)
+        app.register_err_handler(
+            [NoMatchingMethodError], method_not_allowed_handler)
+        return app
+
+    def handle(self, app, method, path, host_header=None, host=None):
+        headers = {} if host_header is None else {'Host': host_header}
+        req = Request(
+            method=method, path=path, headers=headers, body=b'', host=host)
+        return app.handle_request(req)
+
+    def test_exact_hosts_beat_wildcards_and_default(self):
+        app = self.make_app()
+        self.assertEqual(
+            self.handle(app, 'GET', '/', 'api.example.com').body, b'api')
+        self.assertEqual(
+            self.handle(app, 'GET', '/', 'acme.example.com').body, b'tenant')
+        self.assertEqual(
+            self.handle(app, 'GET', '/', 'acme.eu.example.com').body,
+            b'eu tenant')
+        self.assertEqual(
+            self.handle(app, 'GET', '/', 'example.com').body, b'default')
+        self.assertEqual(
+            self.handle(app, 'GET', '/', 'other.org').body, b'default')
+        self.assertEqual(self.handle(app, 'GET', '/').body, b'default')
+
+    def test_host_tables_are_isolated(self):
+        app = self.make_app()
+        self.assertEqual(
+            self.handle(app, 'GET', '/status', 'api.example.com').status, 404)
+        self.assertEqual(
+            self.handle(app, 'GET', '/status', 'other.org').status, 200)
+
+    def test_hosts_are_compared_without_case_port_or_trailing_dot(self):
+        app = self.make_app()
+        for host_header in [
+            'API.Example.com', 'api.example.com:8080', 'api.example.com.'
+        ]:
+            with self.subTest(host_header=host_header):
+                self.assertEqual(
+                    self.handle(app, 'GET', '/', host_header).body, b'api')
+
+    def test_request_host_is_used_without_a_host_header(self):
+        app = self.make_app()
+        self.assertEqual(
+            self.handle(app, 'GET', '/', host='api.example.com').body,
+            b'api')
+        self.assertEqual(
+            self.handle(
+                app, 'GET', '/', 'acme.example.com', host='api.example.com'
+            ).body,
+            b'tenant')
+
+    def test_405s_only_list_the_methods_of_the_requests_host(self):
+        app = self.make_app()
+        res = self.handle(app, 'DELETE', '/', 'api.example.com')
+        self.assertEqual(res.status, 405)
+        self.assertEqual(res.headers['Allow'], 'GET, POST')
+
+        res = self.handle(app, 'DELETE', '/', 'other.org')
+        self.assertEqual(res.status, 405)
+        self.assertEqual(res.headers['Allow'], 'GET')
+
+    def test_routing_caches_tell_hosts_apart(self):
+        app = self.make_app(route_cache_size=16, not_found_cache_size=16)
+        for _ in range(2):
+            self.assertEqual(
+                self.handle(app, 'GET', '/', 'api.example.com').body, b'api')
+            self.assertEqual(
+                self.handle(app, 'GET', '/', 'other.org').body, b'default')
+            self.assertEqual(
+                self.handle(
+                    app, 'GET', '/status', 'api.example.com').status, 404)
+            self.assertEqual(
+                self.handle(app, 'GET', '/status', 'other.org').status, 200)
+
+    def test_frozen_apps_route_by_host(self):
+        app = self.make_app().freeze()
+        self.assertEqual(
+            self.handle(app, 'GET', '/', 'api.example.com').body, b'api')
+        self.assertEqual(
+            self.handle(app, 'GET', '/', 'other.org').body, b'default')
+
+    def test_apps_without_hosts_ignore_the_host_header(self):
+        app = WsgiApp(
+            logger=logging.getLogger('dummy'),
+            default_fallback_err_res=Response(500, {}, b''),
+            route_cache_size=16
+        )
+        app.register_endpoint(
+            ['GET'], r'/', lambda app, req: Response(200, {}, b''))
+        for host_header in ['a.example.com', 'b.example.com']:
+            self.handle(app, 'GET', '/', host_header)
+        self.assertEqual(app.routing_stats()['route_cache']['size'], 1)
+
+    def test_adaptive_route_order_works_with_hosts(self):
+        app = self.make_app(route_reorder_interval=2)
+
+        def make_handler(name):
+            def req_handler(app, req):
+                return Response(200, {}, name.encode())
+            return req_handler
+
+        # regex routes, so that they go through the reordered engines,
+        # registered after the host routes of make_app
+        app.register_endpoint(
+            ['GET'], r'/items/\d+', make_handler('api item'),
+            host='api.example.com')
+        app.register_endpoint(
+            ['GET'], r'/items/\w+', make_handler('item'))
+        app.register_endpoint(
+            ['GET'], r'/users/\w+', make_handler('user'))
+        for _ in range(5):
+            self.assertEqual(
+                self.handle(app, 'GET', '/items/1', 'api.example.com').body,
+                b'api item')
+            self.assertEqual(
+                self.handle(app, 'GET', '/users/x', 'other.org').body,
+                b'user')
+            self.assertEqual(
+                self.handle(app, 'GET', '/items/x', 'other.org').body,
+                b'item')
+
+    def test_bad_hosts_are_rejected(self):
+        app = self.make_app()
+
+        with self.assertRaises(TypeError):
+            app.register_endpoint(
+                ['GET'], r'/', ok_req_handler, host=b'a.com')
+        for host in [
+            '', '*', '*.', 'a.*.com', 'a.com:8080', 'a.com/x', 'http://a.com'
+        ]:
+            with self.subTest(host=host):
+                with self.assertRaises(ValueError):
+                    app.register_endpoint(
+                        ['GET'], r'/', ok_req_handler, host=host)
+
+
+class TestAppMounts(unittest.TestCase):
+    def make_app(self, name, **app_options):
+        app = make_quiet_app(**app_options)
+
+        def req_handler(app, req):
+            return Response(200, {}, f'{name} {req.path}'.encode())
+
+        def not_found_handler(app, e, req):
+            return Response(404, {}, name.encode())
+
+        app.register_endpoint(['GET'], r'/', req_handler)
+        app.register_endpoint(['GET'], r'/widgets/(?P<id>\d+)', req_handler)
+        app.register_err_handler([NoMatchingPathError], not_found_handler)
+        return app
+
+    def setUp(self):
+        self.app = self.make_app('root')
+        self.v1 = self.app.mount('/v1', self.make_app('v1'))
+        self.v2 = self.app.mount('/v2', self.make_app('v2'))
+        self.v2_beta = self.app.mount('/v2/beta', self.make_app('v2 beta'))
+
+    def handle(self, path):
+        req = Request(method='GET', path=path, headers={}, body=b'')
+        return self.app.handle_request(req)
+
+    def test_requests_reach_the_app_mounted_at_their_prefix(self):
+        self.assertEqual(self.handle('/v1/widgets/7').body, b'v1 /widgets/7')
+        self.assertEqual(self.handle('/v2/widgets/7').body, b'v2 /widgets/7')
+        self.assertEqual(self.handle('/widgets/7').body, b'root /widgets/7')
+
+    def test_the_prefix_itself_becomes_the_root_path(self):
+        self.assertEqual(self.handle('/v1').body, b'v1 /')
+        self.assertEqual(self.handle('/v1/').body, b'v1 /')
+
+    def test_the_longest_mounted_prefix_wins(self):
+        self.assertEqual(
+            self.handle('/v2/beta/widgets/7').body, b'v2 beta /widgets/7')
+        self.assertEqual(
+            self.handle('/v2/betas/widgets/7').status, 404)
+
+    def test_prefixes_only_match_whole_segments(self):
+        res = self.handle('/v10/widgets/7')
+        self.assertEqual(res.status, 404)
+        self.assertEqual(res.body, b'root')
+
+    def test_mounted_apps_use_their_own_err_handlers(self):
+        res = self.handle('/v1/gadgets')
+        self.assertEqual(res.status, 404)
+        self.assertEqual(res.body, b'v1')
+
+    def test_mounted_apps_can_mount_apps(self):
+        self.v1.mount('/admin', self.make_app('v1 admin'))
+        self.assertEqual(self.handle('/v1/admin').body, b'v1 admin /')
+
+    def test_freezing_freezes_mounted_apps(self):
+        self.app.freeze()
+        self.assertTrue(self.v1.frozen)
+        self.assertTrue(self.v2_beta.frozen)
+        self.assertEqual(self.handle('/v1/widgets/7').body, b'v1 /widgets/7')
+        with self.assertRaises(RuntimeError):
+            self.app.mount('/v3', self.make_app('v3'))
+
+    def test_wsgi_paths_with_a_question_mark_get_the_fallback_res(self):
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': '/v1/x?y',
+            'wsgi.input': io.BytesIO(b''),
+            'SERVER_NAME': 'dummy_host',
+            'SERVER_PORT': 8000,
+            'wsgi.url_scheme': 'http',
+        }
+        start_response = mock.Mock()
+
+        res = self.app(environ, start_response)
+
+        self.assertEqual(start_response.call_args[0][0], '500 ')
+        self.assertEqual(res, [b''])
+
+    def test_bad_mounts_are_rejected(self):
+        with self.assertRaises(TypeError):
+            self.app.mount(b'/v3', self.make_app('v3'))
+        with self.assertRaises(TypeError):
+            self.app.mount('/v3', object())
+        for prefix in ['', '/', 'v3', '/v3/', '/v3//beta']:
+            with self.subTest(prefix=prefix):
+                with self.assertRaises(ValueError):
+                    self.app.mount(prefix, self.make_app('v3'))
+        with self.assertRaises(ValueError):
+            self.app.mount('/v1', self.make_app('v1 again'))
+        with self.assertRaises(ValueError):
+            self.app.mount('/self', self.app)
+
+    def test_mount_cycles_are_rejected(self):
+        self.v1.mount('/admin', self.make_app('v1 admin'))
+        v1_admin = self.v1._mount_table[0]['app']
+        for app, mounted_app in [
+            (self.v1, self.app),
+            (v1_admin, self.app),
+            (v1_admin, self.v1)
+        ]:
+            with self.subTest(app=app, mounted_app=mounted_app):
+                with self.assertRaises(ValueError):
+                    app.mount('/cycle', mounted_app)
+        # the same app mounted in two places is fine
+        self.v2.mount('/admin', v1_admin)
+        self.app.freeze()
+        self.assertTrue(v1_admin.frozen)
+
+
+def snapshot_req_handler(app, req):
+    return Response(200, {}, repr(sorted(req.path_vars.items())).encode())
+
+
+def snapshot_pred(req):
+    return req.headers.get('Accept') == 'text/plain'
+
+
+def snapshot_not_found_handler(app, e, req):
+    return Response(404, {}, b'')
+
+
+class TestAppRouteSnapshots(unittest.TestCase):
+    def setUp(self):
+        self.app = make_quiet_app()
+        self.app.register_endpoint(
+            ['GET'], r'/widgets/(?P<id>\d+)', snapshot_req_handler)
+        self.app.register_endpoint(
+            ['GET', 'POST'], PathTemplate('/gadgets/{id:int}'),
+            snapshot_req_handler)
+        self.app.register_endpoint(
+            ['GET'], r'/text', snapshot_req_handler,
+            pred=snapshot_pred, pred_key=accept_header)
+        self.app.register_endpoint(
+            ['GET'], r'/', snapshot_req_handler, host='api.example.com')
+        self.app.register_err_handler(
+            [NoMatchingPathError], snapshot_not_found_handler)
+
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.snapshot_path = os.path.join(tmp_dir.name, 'routes.json')
+
+    def handle(self, app, method, path, headers=None):
+        req = Request(
+            method=method, path=path, headers=headers or {}, body=b'')
+        return app.handle_request(req)
+
+    def assertRoutesAlike(self, app):
+        for method, path, headers in [
+            ('GET', '/widgets/7', {}),
+            ('POST', '/gadgets/7', {}),
+            ('GET', '/text', {'Accept': 'text/plain'}),
+            ('GET', '/', {'Host': 'api.example.com'}),
+            ('GET', '/', {}),
+            ('GET', '/nowhere', {})
+        ]:
+            with self.subTest(method=method, path=path, headers=headers):
+                expected = self.handle(self.app, method, path, headers)
+                actual = self.handle(app, method, path, headers)
+                self.assertEqual(actual.status, expected.status)
+                self.assertEqual(actual.body, expected.body)
+
+    def test_loaded_snapshots_route_like_the_saved_app(self):
+        fingerprint = self.app.save_routes(self.snapshot_path)
+        self.assertEqual(len(fingerprint), 64)
+
+        app = make_quiet_app()
+        with mock.patch.object(
+            app, '_validate_req_handler'
+        ) as validate_req_handler, mock.patch.object(
+            app, '_compile_path_spec'
+        ) as compile_path_spec:
+            self.assertTrue(app.load_routes(self.snapshot_path))
+        validate_req_handler.assert_not_called()
+        compile_path_spec.assert_not_called()
+
+        self.assertRoutesAlike(app)
+        self.assertEqual(
+            [endpoint['path_spec'] for endpoint in app._endpoint_table],
+            [endpoint['path_spec'] for endpoint in self.app._endpoint_table])
+
+    def test_snapshots_that_do_not_match_are_validated(self):
+        self.app.save_routes(self.snapshot_path)
+        with open(self.snapshot_path) as f:
+            snapshot = json.load(f)
+        snapshot['routes']['endpoints'][0]['path_spec'] = r'/widgets/(\w+)'
+        with open(self.snapshot_path, 'w') as f:
+            json.dump(snapshot, f)
+
+        app = make_quiet_app()
+        with mock.patch.object(
+            app, '_validate_req_handler', wraps=app._validate_req_handler
+        ) as validate_req_handler:
+            self.assertFalse(app.load_routes(self.snapshot_path))
+        self.assertEqual(validate_req_handler.call_count, 4)
+        self.assertEqual(
+            self.handle(app, 'GET', '/widgets/abc').status, 200)
+
+    def test_snapshots_saved_under_another_policy_are_validated(self):
+        self.app.save_routes(self.snapshot_path)
+        app = make_quiet_app(path_spec_policy='strict')
+        self.assertFalse(app.load_routes(self.snapshot_path))
+        self.assertRoutesAlike(app)
+
+    def test_snapshots_of_changed_handlers_are_validated(self):
+        self.app.save_routes(self.snapshot_path)
+
+        def changed_not_found_handler(app, e, req, extra=None):
+            return Response(404, {}, b'')
+
+        # the changed handler is no longer a valid err handler, which
+        # only validating the snapshot's routes finds out
+        app = make_quiet_app()
+        with mock.patch.object(
+            sys.modules[__name__], 'snapshot_not_found_handler',
+            changed_not_found_handler
+        ):
+            with self.assertRaises(ValueError):
+                app.load_routes(self.snapshot_path)
+
+    def test_snapshots_saved_by_another_httpglue_are_validated(self):
+        self.app.save_routes(self.snapshot_path)
+        other_httpglue_path = os.path.join(
+            os.path.dirname(self.snapshot_path), 'httpglue.py')
+        with open(other_httpglue_path, 'w') as f:
+            f.write('# another version of httpglue\n')
+
+        app = make_quiet_app()
+        with mock.patch('httpglue.__file__', other_httpglue_path):
+            self.assertFalse(app.load_routes(self.snapshot_path))
+        self.assertRoutesAlike(app)
+
+    def test_handlers_must_be_importable_by_name(self):
+        self.app.register_endpoint(
+            ['GET'], r'/local', lambda app, req: Response(200, {}, b''))
+        with self.assertRaises(ValueError):
+            self.app.save_routes(self.snapshot_path)
+        self.assertFalse(os.path.exists(self.snapshot_path))
+
+    def test_mounted_apps_are_not_saved(self):
+        self.app.mount('/v1', make_quiet_app())
+        with self.assertRaises(ValueError):
+            self.app.save_routes(self.snapshot_path)
+
+    def test_frozen_apps_cannot_load_snapshots(self):
+        self.app.save_routes(self.snapshot_path)
+        app = make_quiet_app().freeze()
+        with self.assertRaises(RuntimeError):
+            app.load_routes(self.snapshot_path)
+
+
 class TestAppPathVarExtractionIntoRequestObject(unittest.TestCase):
     def test_req_ojects_correctly_get_path_vars_populated(self):
         # define a simple app
@@ -807,3 +2469,74 @@ class TestAppWSGIMappingToRequestObject(unittest.TestCase):
         self.assertEqual(
             res[0],
             self.app.default_fallback_err_res.body)
+
+    def test_req_headers_can_be_sent_back_as_res_headers(self):
+        self.app.handle_request.return_value = None
+        self.app.handle_request.side_effect = (
+            lambda req: Response(200, req.headers, b''))
+
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'HTTP_X_A': '1',
+            'wsgi.input': io.BytesIO(b''),
+            'SERVER_NAME': 'dummy_host',
+            'SERVER_PORT': 8000,
+            'wsgi.url_scheme': 'http',
+        }
+        start_response = mock.Mock()
+
+        self.app(environ, start_response)
+
+        start_response.assert_called_once_with('200 ', [('X-A', '1')])
+
+    def test_repeated_res_headers_are_all_sent(self):
+        res_headers = Headers({'Content-Type': 'text/plain'})
+        res_headers.add('Set-Cookie', 'a=1')
+        res_headers.add('Set-Cookie', 'b=2')
+        self.app.handle_request.return_value = Response(
+            200, res_headers, b'')
+
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'wsgi.input': io.BytesIO(b''),
+            'SERVER_NAME': 'dummy_host',
+            'SERVER_PORT': 8000,
+            'wsgi.url_scheme': 'http',
+        }
+        start_response = mock.Mock()
+
+        self.app(environ, start_response)
+
+        wsgi_res_headers = start_response.call_args_list[0][0][1]
+        self.assertEqual(wsgi_res_headers, [
+            ('Content-Type', 'text/plain'),
+            ('Set-Cookie', 'a=1'),
+            ('Set-Cookie', 'b=2')
+        ])
+        # the server may add to the list, which must not change the
+        # Response's headers
+        wsgi_res_headers.append(('Date', 'Mon, 05 Oct 2026 00:00:00 GMT'))
+        self.assertNotIn('Date', res_headers)
+
+    def test_repeated_res_headers_are_all_checked_for_control_chars(self):
+        res_headers = Headers({'Set-Cookie': 'a=1'})
+        res_headers.add('Set-Cookie', 'b=\t2')
+        res_headers.add('Set-Cookie', 'c=3')
+        self.app.handle_request.return_value = Response(
+            200, res_headers, b'')
+
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'wsgi.input': io.BytesIO(b''),
+            'SERVER_NAME': 'dummy_host',
+            'SERVER_PORT': 8000,
+            'wsgi.url_scheme': 'http',
+        }
+        start_response = mock.Mock()
+
+        self.app(environ, start_response)
+
+        start_response_args = start_response.call_args_list[0][0]
+        self.assertEqual(
+            start_response_args[0],
+            str(self.app.default_fallback_err_res.status) + ' ')